@@ -5,6 +5,16 @@ from flask_cors import CORS
 import json
 from redis.cluster import RedisCluster
 import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from query_index import DEFAULT_LIMIT, MAX_LIMIT, lookup_prefix
+from product_rollups import product_rollup_key
+from query_normalizer import clean_product_id
+from replica_reads import ReplicaReader
+from keyspace import INTERNAL_PREFIXES
+from admission import AdmissionController
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,14 +26,25 @@ CORS(app)  # Enable CORS for Chrome extension
 # Redis cluster connection
 rc = None
 
+# Read-only routes can be served by replicas (REDIS_READ_STRATEGY)
+replica_reader = ReplicaReader.from_env()
+
+# Per-route concurrency caps and cost-weighted per-client token buckets (429 + Retry-After)
+admission = AdmissionController.from_env(lambda: rc)
+admission.install(app)
+
 def connect_to_redis():
     """Connect to Redis cluster"""
     global rc
     startup_nodes = [{"host": "localhost", "port": 7001}]
     try:
-        rc = RedisCluster(startup_nodes=startup_nodes, decode_responses=True, socket_timeout=5)
+        rc = RedisCluster(startup_nodes=startup_nodes, decode_responses=True, socket_timeout=5,
+                          **replica_reader.cluster_options())
         rc.ping()
         logger.info("✅ Connected to Redis cluster")
+        if replica_reader.enabled:
+            logger.info(f"📖 [REPLICAS] Reads use the '{replica_reader.strategy}' strategy "
+                        f"(max lag {replica_reader.max_lag:g}s)")
         return True
     except Exception as e:
         logger.error(f"❌ Failed to connect to Redis: {e}")
@@ -60,7 +81,7 @@ def get_metrics(search_query, product_id):
         logger.info(f"Querying Redis for key: {key}")
         
         # Get data from Redis
-        data = rc.get(key)
+        data = replica_reader.get(rc, key)
         
         if data:
             metrics = json.loads(data)
@@ -93,11 +114,12 @@ def get_search_metrics(search_query):
     """Get all metrics for a specific search query"""
     try:
         pattern = f"{search_query}:*"
-        keys = list(rc.scan_iter(match=pattern, count=100))
+        keys = replica_reader.scan_keys(rc, match=pattern, count=100)
         
         results = []
-        for key in keys:
-            data = rc.get(key)
+        # Batch the GETs per node instead of one round trip per key
+        values = replica_reader.mget(rc, keys)
+        for key, data in zip(keys, values):
             if data:
                 product_id = key.split(':', 1)[1]  # Everything after first colon
                 metrics = json.loads(data)
@@ -122,16 +144,81 @@ def get_search_metrics(search_query):
             "error": str(e)
         }), 500
 
+@app.route('/queries', methods=['GET'])
+def list_queries():
+    """List known search queries starting with a prefix (lexicographic index)"""
+    try:
+        prefix = request.args.get('prefix', '')
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            offset = max(int(request.args.get('offset', 0)), 0)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "limit and offset must be integers"
+            }), 400
+        
+        queries = lookup_prefix(rc, prefix, limit, offset) if limit > 0 else []
+        logger.info(f"Found {len(queries)} queries for prefix: {prefix}")
+        return jsonify({
+            "success": True,
+            "prefix": prefix,
+            "total_queries": len(queries),
+            "offset": offset,
+            "queries": queries
+        })
+        
+    except Exception as e:
+        logger.error(f"Error listing queries: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/product/<path:product_id>', methods=['GET'])
+def get_product_rollup(product_id):
+    """Get totals, viewer-weighted rates and top queries for one product"""
+    try:
+        clean_id = clean_product_id(product_id)
+        data = replica_reader.get(rc, product_rollup_key(clean_id))
+        
+        if data:
+            logger.info(f"Found rollup for product {clean_id}")
+            return jsonify({
+                "success": True,
+                "product_id": clean_id,
+                "rollup": json.loads(data),
+                "found": True
+            })
+        else:
+            logger.info(f"No rollup found for product {clean_id}")
+            return jsonify({
+                "success": True,
+                "product_id": clean_id,
+                "rollup": None,
+                "found": False,
+                "message": "No rollup found for this product"
+            })
+        
+    except Exception as e:
+        logger.error(f"Error querying product rollup: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/stats', methods=['GET'])
 def get_stats():
     """Get cluster statistics"""
     try:
-        total_keys = rc.dbsize()
+        total_keys = replica_reader.dbsize(rc)
         
         # Sample some search queries
-        sample_keys = list(rc.scan_iter(count=1000))
+        sample_keys = replica_reader.scan_keys(rc, count=1000)
         search_queries = set()
         for key in sample_keys:
+            if key.startswith(INTERNAL_PREFIXES):
+                continue
             query = key.split(':')[0]
             search_queries.add(query)
         
@@ -149,6 +236,14 @@ def get_stats():
             "error": str(e)
         }), 500
 
+@app.route('/stats/reads', methods=['GET'])
+def get_read_stats():
+    """Read strategy, replica health and per-node read counters"""
+    return jsonify({
+        "success": True,
+        "reads": replica_reader.stats()
+    })
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
@@ -163,12 +258,16 @@ if __name__ == '__main__':
     # Connect to Redis
     if connect_to_redis():
         print("✅ Redis connection established")
+        print(f"🚦 Admission control: {admission.describe()}")
         print("🌐 Starting Flask server on http://localhost:5000")
         print("📋 Available endpoints:")
         print("   GET /health                                    - Health check")
         print("   GET /metrics/<search_query>/<product_id>      - Get specific metrics")
         print("   GET /search/<search_query>                    - Get all products for query")
+        print("   GET /queries?prefix=<prefix>&limit=<n>       - List known queries by prefix")
+        print("   GET /product/<product_id>                     - Course totals and top queries")
         print("   GET /stats                                    - Cluster statistics")
+        print("   GET /stats/reads                              - Per-node read counters")
         print()
         print("🔗 Chrome extension can now connect to this API")
         
@@ -2,10 +2,29 @@
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+import atexit
 import json
-import redis
+import math
 import logging
 import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from explanation_store import ExplanationCodec, explanation_key, footprint_report
+from explanation_policy import FREQ_KEY, META_KEYS, ExplanationCachePolicy
+from explanation_backends import BackendNotConfigured, SingleFlight, generate_explanation, load_backend
+from query_normalizer import QueryCanonicalizer, clean_product_id
+from query_index import DEFAULT_LIMIT, MAX_LIMIT, QUERY_INDEX_KEY, lookup_prefix, parse_member
+from fuzzy_index import DEFAULT_MIN_SCORE, load_fuzzy_index
+from dataset_version import read_dataset_version
+from product_rollups import product_rollup_key
+from metric_history import decode_series, history_key, series_points, week_over_week
+from metrics_snapshot import open_snapshot_from_env
+from redis_scripts import ScriptLibrary, delete_matching, search_ranked
+from redis_guard import CircuitBreaker, CircuitOpenError, GuardedRedis, HealthMonitor, StaleCache
+from admission import AdmissionController
+from write_behind import WriteBehindQueue, WriteQueueFull
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,47 +32,205 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Chrome extension
+# Keep /search results in ranking order instead of sorting them by product id
+app.json.sort_keys = False
 
 # Redis connection
 r = None
 
+# Fails Redis calls fast once Redis is erroring or too slow (half-open probes close it again)
+redis_breaker = CircuitBreaker.from_env()
+# Last good answers of the read routes, served while the breaker is open (REDIS_STALE_READS=1)
+stale_cache = StaleCache.from_env()
+
+# Memory-mapped metrics snapshot; serves /metrics and /search when METRICS_BACKEND=snapshot
+metrics_snapshot = open_snapshot_from_env()
+
+# Lua scripts for the bounded multi-step lookups (loaded on connect)
+redis_scripts = ScriptLibrary()
+
+# Compresses cached AI explanations and tracks their size
+explanation_codec = ExplanationCodec()
+# Bounds the AI explanation cache (entry/byte budget, LFU eviction, adaptive TTLs)
+explanation_policy = ExplanationCachePolicy.from_env()
+
+# Folds query variants ("Machine-Learning ", "machine learning") onto one cache key
+query_canonicalizer = QueryCanonicalizer.from_env()
+
+# Trigram index over the known queries, loaded from Redis and loaded again once a
+# data load restamps the dataset (the stamp is checked every FUZZY_INDEX_RECHECK seconds)
+fuzzy_index = None
+fuzzy_index_stamp = None
+fuzzy_index_checked = 0.0
+FUZZY_INDEX_RECHECK = 60
+
+# Model backend for server-side generation (AI_BACKEND=openai|stub|module:Class)
+explanation_backend = None
+# Concurrent generate requests for the same cache key share one upstream call
+generation_flights = SingleFlight()
+
 def connect_to_redis():
     """Connect to Redis"""
     global r
+    if redis_breaker.rejecting():
+        # Don't wait out another connect timeout while the breaker is open
+        return False
     try:
-        r = redis.Redis(host='localhost', port=6379, decode_responses=True, socket_timeout=5)
+        r = GuardedRedis(host='localhost', port=6379, decode_responses=True, socket_timeout=5,
+                         breaker=redis_breaker)
         r.ping()
         logger.info("✅ Connected to Redis")
+        redis_scripts.load(r)
+        if explanation_codec.load_dictionaries(r):
+            logger.info(f"🧠 [AI-CACHE] Using compression dictionary {explanation_codec.active_id}")
+        get_fuzzy_index()
         return True
     except Exception as e:
         logger.error(f"❌ Failed to connect to Redis: {e}")
         return False
 
+def probe_redis():
+    """Background health probe: PING + DBSIZE through the circuit breaker"""
+    if r is None and not connect_to_redis():
+        return {'redis_connected': False, 'total_keys': 0}
+    r.ping()
+    return {'redis_connected': True, 'total_keys': r.dbsize()}
+
+# /health reads the state this keeps fresh instead of probing Redis per call
+health_monitor = HealthMonitor.from_env(probe_redis)
+
+# Routes that answer without Redis; the metric routes too when serving from the snapshot
+REDIS_FREE_ENDPOINTS = {'health', 'resolve_query'}
+SNAPSHOT_ENDPOINTS = {'get_metrics', 'get_search_data'}
+# Routes that can fall back to their last good answer while the breaker is open
+STALE_ENDPOINTS = {'get_metrics', 'get_search_data', 'get_product_rollup', 'get_trend'}
+
+def redis_unavailable():
+    """Fast 503 while the breaker is open"""
+    retry_after = max(math.ceil(redis_breaker.retry_after()), 1)
+    response = jsonify({
+        'error': 'Redis temporarily unavailable',
+        'circuit': redis_breaker.state,
+        'retry_after': retry_after
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+def remember_response(payload):
+    stale_cache.remember(request.full_path, payload)
+
+def stale_response():
+    """Last good answer for this URL (flagged stale), or a fast 503"""
+    payload, age = stale_cache.get(request.full_path)
+    if payload is None:
+        return redis_unavailable()
+    logger.info(f"⚡ [BREAKER] Serving stale copy of {request.full_path} ({age}s old)")
+    return jsonify({**payload, 'stale': True, 'stale_age_seconds': age})
+
+@app.before_request
+def fail_fast_while_breaker_open():
+    if not redis_breaker.rejecting() or request.endpoint in REDIS_FREE_ENDPOINTS:
+        return None
+    if metrics_snapshot is not None and request.endpoint in SNAPSHOT_ENDPOINTS:
+        return None
+    if stale_cache.enabled and request.endpoint in STALE_ENDPOINTS:
+        return None
+    return redis_unavailable()
+
+# Per-route concurrency caps and cost-weighted per-client token buckets (429 + Retry-After)
+admission = AdmissionController.from_env(lambda: r, redis_scripts)
+admission.install(app)
+
+def get_fuzzy_index():
+    """The loader-built trigram index, reloaded after a data load (None if it was never built)"""
+    global fuzzy_index, fuzzy_index_stamp, fuzzy_index_checked
+    if r is None:
+        return fuzzy_index
+    now = time.monotonic()
+    if fuzzy_index is not None and now - fuzzy_index_checked < FUZZY_INDEX_RECHECK:
+        return fuzzy_index
+    fuzzy_index_checked = now
+    try:
+        # Loaders stamp the dataset after rebuilding the index
+        stamp = read_dataset_version(r).get('loaded_at')
+        if fuzzy_index is None or stamp != fuzzy_index_stamp:
+            index = load_fuzzy_index(r)
+            if index is not None:
+                fuzzy_index, fuzzy_index_stamp = index, stamp
+                logger.info(f"🔎 [FUZZY] Loaded trigram index over {len(fuzzy_index):,} queries")
+    except Exception as e:
+        logger.error(f"🔎 [FUZZY] Could not load trigram index: {e}")
+    return fuzzy_index
+
+def fuzzy_requested():
+    return request.args.get('fuzzy', '').lower() in ('1', 'true', 'yes')
+
+def read_first_metrics(keys):
+    """(index, metrics) for the first of several query:productId keys that has data
+
+    On Redis the whole fallback chain is one script call; (None, None) if no key matched.
+    """
+    if metrics_snapshot is not None:
+        for index, key in enumerate(keys):
+            metrics = metrics_snapshot.get_key(key)
+            if metrics:
+                return index, metrics
+        return None, None
+    index, value = redis_scripts.lookup_fallback(r, keys)
+    return (index, json.loads(value)) if value else (None, None)
+
+def read_query_results(queries, limit=0):
+    """(index, {product_id: metrics}) for the first of several query variants with products
+
+    Products are ranked by viewers (the dict keeps that order); limit > 0 keeps
+    only the most viewed.
+    """
+    if metrics_snapshot is not None:
+        for index, query in enumerate(queries):
+            results = metrics_snapshot.search(query)
+            if results:
+                ranked = sorted(results.items(), key=lambda item: -item[1]['viewers'])
+                return index, dict(ranked[:limit] if limit > 0 else ranked)
+        return None, {}
+    
+    index, rows = search_ranked(r, [f"{query}:*" for query in queries], limit)
+    results = {}
+    for key, value in rows:
+        try:
+            # Parse the key to get product_id
+            parts = key.split(':', 1)
+            if len(parts) == 2:
+                product_id = parts[1]
+                results[product_id] = json.loads(value)
+        except Exception as e:
+            logger.error(f"Error processing key {key}: {e}")
+            continue
+    return index, results
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
     logger.info(f"🏥 [HEALTH] Health check requested from {request.remote_addr}")
     logger.info(f"🏥 [HEALTH] Request headers: {dict(request.headers)}")
     try:
-        if r is None:
-            connect_to_redis()
-        
-        redis_connected = False
-        total_keys = 0
-        
-        if r:
-            try:
-                r.ping()
-                redis_connected = True
-                total_keys = r.dbsize()
-            except:
-                redis_connected = False
+        # Cached by the background probe; no Redis round trip per call
+        state = health_monitor.current()
+        redis_connected = state['redis_connected']
+        total_keys = state.get('total_keys', 0)
         
         response_data = {
-            'status': 'healthy' if redis_connected else 'unhealthy',
+            # Metrics stay available from the snapshot even if Redis is down
+            'status': 'healthy' if redis_connected or metrics_snapshot is not None else 'unhealthy',
             'redis_connected': redis_connected,
-            'total_keys': total_keys
+            'total_keys': total_keys,
+            'metrics_backend': 'snapshot' if metrics_snapshot is not None else 'redis',
+            'checked_at': int(health_monitor.checked_at),
+            'circuit': redis_breaker.stats(),
+            'stale_reads': stale_cache.stats(),
+            'admission': admission.stats()
         }
+        if metrics_snapshot is not None:
+            response_data['snapshot_rows'] = metrics_snapshot.rows
         logger.info(f"🏥 [HEALTH] Responding with: {response_data}")
         return jsonify(response_data)
     except Exception as e:
@@ -63,45 +240,104 @@ def health():
 @app.route('/search/<query>')
 def get_search_data(query):
     """Get all data for a specific search query (case-insensitive)"""
+    try:
+        if metrics_snapshot is None and r is None:
+            connect_to_redis()
+        
+        try:
+            limit = max(int(request.args.get('limit', 0)), 0)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        
+        # Original query, then lowercase for case-insensitive search, then (if the
+        # caller allows it) the closest known query - all tried in one lookup
+        logger.info(f"🔍 [SEARCH] Searching for query: {query}")
+        variants = [query] if query == query.lower() else [query, query.lower()]
+        matches = []
+        if fuzzy_requested() and get_fuzzy_index() is not None:
+            matches = fuzzy_index.search(query, limit=1)
+        used, results = read_query_results(variants + [match['query'] for match in matches], limit)
+        
+        fuzzy_match = None
+        if used == 1 and len(variants) == 2:
+            logger.info(f"🔍 [SEARCH] Matched lowercase query: {query.lower()}")
+        elif used is not None and used >= len(variants):
+            fuzzy_match = matches[used - len(variants)]
+            logger.info(f"🔍 [SEARCH] Fuzzy match '{fuzzy_match['query']}' ({fuzzy_match['score']})")
+        
+        logger.info(f"🔍 [SEARCH] Found {len(results)} products")
+        response_data = {
+            'query': query,
+            'results': results,
+            'count': len(results)
+        }
+        if fuzzy_match:
+            response_data['fuzzy_match'] = fuzzy_match
+        remember_response(response_data)
+        return jsonify(response_data)
+    
+    except CircuitOpenError:
+        return stale_response()
+    except Exception as e:
+        logger.error(f"Search failed for query '{query}': {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/queries')
+def list_queries():
+    """List known search queries starting with a prefix (lexicographic index)"""
     try:
         if r is None:
             connect_to_redis()
         
-        # Try both original and lowercase query patterns for case-insensitive search
-        original_pattern = f"{query}:*"
-        lowercase_pattern = f"{query.lower()}:*"
+        prefix = request.args.get('prefix', '')
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+            offset = max(int(request.args.get('offset', 0)), 0)
+        except ValueError:
+            return jsonify({'error': 'limit and offset must be integers'}), 400
         
-        logger.info(f"🔍 [SEARCH] Searching with patterns: {original_pattern}")
-        keys = r.keys(original_pattern)
+        queries = lookup_prefix(r, prefix, limit, offset) if limit > 0 else []
+        logger.info(f"🔤 [QUERIES] {len(queries)} queries for prefix '{prefix}'")
+        return jsonify({
+            'prefix': prefix,
+            'queries': queries,
+            'count': len(queries),
+            'offset': offset
+        })
+    
+    except Exception as e:
+        logger.error(f"🔤 [QUERIES] Prefix lookup failed for '{request.args.get('prefix', '')}': {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/queries/resolve/<query>')
+def resolve_query(query):
+    """Closest known queries to an unknown one, from the in-memory trigram index"""
+    try:
+        if r is None:
+            connect_to_redis()
         
-        # If no results and query isn't already lowercase, try lowercase pattern
-        if not keys and query != query.lower():
-            logger.info(f"🔍 [SEARCH] Trying lowercase pattern: {lowercase_pattern}")
-            keys = r.keys(lowercase_pattern)
+        if get_fuzzy_index() is None:
+            return jsonify({'error': 'Fuzzy index not built; rerun the data loader'}), 503
         
-        logger.info(f"🔍 [SEARCH] Found {len(keys)} keys")
-        results = {}
-        for key in keys:
-            try:
-                value = r.get(key)
-                if value:
-                    # Parse the key to get product_id
-                    parts = key.split(':', 1)
-                    if len(parts) == 2:
-                        product_id = parts[1]
-                        results[product_id] = json.loads(value)
-            except Exception as e:
-                logger.error(f"Error processing key {key}: {e}")
-                continue
+        try:
+            limit = min(int(request.args.get('limit', 5)), MAX_LIMIT)
+            min_score = float(request.args.get('min_score', DEFAULT_MIN_SCORE))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer and min_score a number'}), 400
         
+        started = time.perf_counter()
+        matches = fuzzy_index.search(query, limit=limit, min_score=min_score)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"🔎 [FUZZY] {len(matches)} matches for '{query}' in {elapsed_ms:.2f}ms")
         return jsonify({
             'query': query,
-            'results': results,
-            'count': len(results)
+            'matches': matches,
+            'count': len(matches),
+            'elapsed_ms': round(elapsed_ms, 3)
         })
     
     except Exception as e:
-        logger.error(f"Search failed for query '{query}': {e}")
+        logger.error(f"🔎 [FUZZY] Resolve failed for '{query}': {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/metrics/<query>/<product_id>')
@@ -110,32 +346,41 @@ def get_metrics(query, product_id):
     logger.info(f"📊 [METRICS] Request from {request.remote_addr} for {query}:{product_id}")
     logger.info(f"📊 [METRICS] Request headers: {dict(request.headers)}")
     try:
-        if r is None:
+        if metrics_snapshot is None and r is None:
             connect_to_redis()
         
-        # Try both original and lowercase query for case-insensitive lookup
+        # Original key, then lowercase for case-insensitive lookup, then (if the
+        # caller allows it) the closest known queries - all tried in one lookup
         original_key = f"{query}:{product_id}"
         lowercase_key = f"{query.lower()}:{product_id}"
+        candidate_keys = [original_key] if query == query.lower() else [original_key, lowercase_key]
+        variant_count = len(candidate_keys)
         
-        logger.info(f"📊 [METRICS] Looking up Redis key: {original_key}")
-        value = r.get(original_key)
+        matches = []
+        if fuzzy_requested() and get_fuzzy_index() is not None:
+            matches = fuzzy_index.search(query)
+            candidate_keys += [f"{match['query']}:{product_id}" for match in matches]
         
-        # If not found and original query wasn't lowercase, try lowercase
-        if not value and query != query.lower():
-            logger.info(f"📊 [METRICS] Trying lowercase key: {lowercase_key}")
-            value = r.get(lowercase_key)
+        logger.info(f"📊 [METRICS] Looking up keys: {candidate_keys}")
+        used, metrics = read_first_metrics(candidate_keys)
+        used_key = candidate_keys[used] if used is not None else None
         
-        if value:
-            metrics = json.loads(value)
-            # Determine which key was used
-            used_key = original_key if r.get(original_key) else lowercase_key
+        fuzzy_match = None
+        if used is not None and used >= variant_count:
+            fuzzy_match = matches[used - variant_count]
+            logger.info(f"📊 [METRICS] Fuzzy match '{fuzzy_match['query']}' ({fuzzy_match['score']})")
+        
+        if metrics:
             response_data = {
                 'query': query,
                 'product_id': product_id,
                 'metrics': metrics,
                 'redis_key_used': used_key
             }
+            if fuzzy_match:
+                response_data['fuzzy_match'] = fuzzy_match
             logger.info(f"📊 [METRICS] Found data using key: {used_key}")
+            remember_response(response_data)
             return jsonify(response_data)
         else:
             logger.info(f"📊 [METRICS] No data found for keys: {original_key} or {lowercase_key}")
@@ -147,10 +392,122 @@ def get_metrics(query, product_id):
                 'tried_keys': [original_key, lowercase_key]
             }), 404
             
+    except CircuitOpenError:
+        return stale_response()
     except Exception as e:
         logger.error(f"📊 [METRICS] Lookup failed for {query}:{product_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/product/<product_id>')
+def get_product_rollup(product_id):
+    """Totals, viewer-weighted rates and top queries for one course (one GET)"""
+    logger.info(f"📦 [PRODUCT] Request from {request.remote_addr} for product: {product_id}")
+    try:
+        if r is None:
+            connect_to_redis()
+        
+        # Cards carry ids like "course~ABC123"; rollups are keyed by the bare id
+        clean_id = clean_product_id(product_id)
+        value = r.get(product_rollup_key(clean_id))
+        if value:
+            logger.info(f"📦 [PRODUCT] Found rollup for: {clean_id}")
+            rollup = json.loads(value)
+            remember_response(rollup)
+            return jsonify(rollup)
+        
+        logger.info(f"📦 [PRODUCT] No rollup found for: {clean_id}")
+        return jsonify({
+            'product_id': clean_id,
+            'error': 'No rollup found for this product'
+        }), 404
+    
+    except CircuitOpenError:
+        return stale_response()
+    except Exception as e:
+        logger.error(f"📦 [PRODUCT] Lookup failed for {product_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Default and largest ?days= for /trend
+DEFAULT_TREND_DAYS = 28
+MAX_TREND_DAYS = 366
+
+@app.route('/trend/<query>/<product_id>')
+def get_trend(query, product_id):
+    """Daily metrics of the last N days and the week-over-week change (one read)"""
+    logger.info(f"📈 [TREND] Request from {request.remote_addr} for {query}:{product_id}")
+    try:
+        if r is None:
+            connect_to_redis()
+        
+        try:
+            days = min(max(int(request.args.get('days', DEFAULT_TREND_DAYS)), 1), MAX_TREND_DAYS)
+        except ValueError:
+            return jsonify({'error': 'days must be an integer'}), 400
+        
+        # Original query, then lowercase - both series fetched in one MGET
+        clean_id = clean_product_id(product_id)
+        keys = [history_key(query, clean_id)]
+        if query != query.lower():
+            keys.append(history_key(query.lower(), clean_id))
+        used_key, blob = next(((key, value) for key, value in zip(keys, r.mget(keys)) if value), (None, None))
+        
+        if blob is None:
+            logger.info(f"📈 [TREND] No history for {query}:{clean_id}")
+            return jsonify({
+                'query': query,
+                'product_id': clean_id,
+                'series': [],
+                'message': 'No history for this combination'
+            }), 404
+        
+        entries = decode_series(blob)
+        points = series_points(entries, days)
+        response_data = {
+            'query': query,
+            'product_id': clean_id,
+            'days': days,
+            'redis_key_used': used_key,
+            'series': points,
+            'week_over_week': week_over_week(entries)
+        }
+        logger.info(f"📈 [TREND] {len(points)} days for {used_key}")
+        remember_response(response_data)
+        return jsonify(response_data)
+    
+    except CircuitOpenError:
+        return stale_response()
+    except Exception as e:
+        logger.error(f"📈 [TREND] Lookup failed for {query}:{product_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def flush_explanation_writes(batch):
+    """Write-behind flush: one pipeline for the whole batch"""
+    if r is None and not connect_to_redis():
+        raise ConnectionError('Redis unavailable')
+    explanation_policy.record_writes(r, batch)
+
+# Acknowledges POST /ai-explanation at once and writes in pipelined batches (AI_WRITE_BEHIND=1)
+explanation_writes = WriteBehindQueue.from_env(flush_explanation_writes)
+if explanation_writes is not None:
+    explanation_writes.start()
+    atexit.register(explanation_writes.close)
+
+def lookup_explanation(cache_key):
+    """Stored explanation bytes: a still-queued write first (read-your-writes), then Redis"""
+    if explanation_writes is not None:
+        queued = explanation_writes.get(cache_key)
+        if queued is not None:
+            return queued
+    return explanation_policy.lookup(r, cache_key)
+
+def store_explanation(cache_key, cache_entry):
+    """Queue the write when write-behind is on, else write through"""
+    stored = explanation_codec.encode(cache_entry)
+    if explanation_writes is not None:
+        explanation_writes.put(cache_key, stored)
+    else:
+        explanation_policy.record_write(r, cache_key, stored)
+
 @app.route('/ai-explanation/<key>')
 def get_ai_explanation(key):
     """Get cached AI explanation"""
@@ -160,12 +517,14 @@ def get_ai_explanation(key):
             connect_to_redis()
         
         # Use a different prefix for AI explanations to separate from metrics
-        redis_key = f"ai_explanation:{key}"
+        cache_key = query_canonicalizer.canonical_key(key)
+        redis_key = explanation_key(cache_key)
         logger.info(f"🧠 [AI-CACHE] Looking up Redis key: {redis_key}")
         
-        value = r.get(redis_key)
-        if value:
-            explanation_data = json.loads(value)
+        value = lookup_explanation(cache_key)
+        explanation_data = explanation_codec.decode(value, r) if value else None
+        query_canonicalizer.record_lookup(key, cache_key, explanation_data)
+        if explanation_data:
             logger.info(f"🧠 [AI-CACHE] Found cached AI explanation for: {key}")
             return jsonify(explanation_data)
         else:
@@ -187,7 +546,7 @@ def save_ai_explanation():
         if not data or 'key' not in data or 'data' not in data:
             return jsonify({'error': 'Missing key or data in request body'}), 400
         
-        cache_key = data['key']
+        cache_key = query_canonicalizer.canonical_key(data['key'])
         explanation_data = data['data']
         
         # Add metadata
@@ -199,52 +558,185 @@ def save_ai_explanation():
             'title': data.get('title', '')
         }
         
-        redis_key = f"ai_explanation:{cache_key}"
+        redis_key = explanation_key(cache_key)
         logger.info(f"🧠 [AI-CACHE] Saving explanation to Redis key: {redis_key}")
         
-        # Store with expiration (30 days)
-        r.setex(redis_key, 30 * 24 * 60 * 60, json.dumps(cache_entry))
+        # Store compressed; the policy picks the TTL and enforces the cache budget
+        store_explanation(cache_key, cache_entry)
         
         logger.info(f"🧠 [AI-CACHE] Successfully cached AI explanation for: {cache_key}")
         return jsonify({
             'success': True,
             'key': cache_key,
             'redis_key': redis_key,
+            'queued': explanation_writes is not None,
             'message': 'AI explanation cached successfully'
         })
         
+    except WriteQueueFull as e:
+        logger.warning(f"🧠 [AI-CACHE] Write queue full, asking the client to retry: {e}")
+        response = jsonify({'error': 'Explanation write queue is full', 'retry_after': 1})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         logger.error(f"🧠 [AI-CACHE] Failed to save explanation: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/stats')
-def get_stats():
-    """Get overall statistics"""
+# Upper bound on keys per batch lookup (a results page has ~20 cards)
+MAX_BATCH_KEYS = 200
+
+@app.route('/ai-explanation/batch', methods=['POST'])
+def batch_ai_explanations():
+    """Look up cached AI explanations for a whole results page in one round trip"""
     try:
         if r is None:
             connect_to_redis()
         
-        total_keys = r.dbsize()
+        data = request.get_json()
+        if not data or not isinstance(data.get('keys'), list):
+            return jsonify({'error': 'Missing keys list in request body'}), 400
         
-        # Get some sample queries
-        sample_keys = r.keys('*')[:20]  # Get more samples
-        queries = set()
-        products = set()
-        ai_explanations = 0
+        # Drop duplicates but keep the page order
+        keys = list(dict.fromkeys(str(key) for key in data['keys']))
+        if len(keys) > MAX_BATCH_KEYS:
+            return jsonify({'error': f'Too many keys (max {MAX_BATCH_KEYS})'}), 400
         
-        for key in sample_keys:
-            if key.startswith('ai_explanation:'):
-                ai_explanations += 1
+        # Variants of the same query share one canonical entry; answer under the
+        # keys the client asked for
+        canonical = {key: query_canonicalizer.canonical_key(key) for key in keys}
+        unique_keys = list(dict.fromkeys(canonical.values()))
+        # Still-queued writes answer for themselves; Redis is asked for the rest
+        stored = explanation_writes.get_many(unique_keys) if explanation_writes is not None else {}
+        remaining = [key for key in unique_keys if key not in stored]
+        if remaining:
+            stored.update(zip(remaining, explanation_policy.lookup_many(r, remaining)))
+        decoded = {}
+        for cache_key, value in stored.items():
+            if value is None:
+                continue
+            try:
+                decoded[cache_key] = explanation_codec.decode(value, r)
+            except Exception as e:
+                logger.error(f"🧠 [AI-CACHE] Could not decode cached explanation {cache_key}: {e}")
+        
+        hits = {}
+        misses = []
+        for key in keys:
+            entry = decoded.get(canonical[key])
+            query_canonicalizer.record_lookup(key, canonical[key], entry)
+            if entry is None:
+                misses.append(key)
             else:
-                parts = key.split(':', 1)
-                if len(parts) == 2:
-                    queries.add(parts[0])
-                    products.add(parts[1])
+                hits[key] = entry
+        
+        logger.info(f"🧠 [AI-CACHE] Batch lookup: {len(hits)} hits, {len(misses)} misses")
+        return jsonify({
+            'hits': hits,
+            'misses': misses,
+            'hit_count': len(hits),
+            'miss_count': len(misses)
+        })
+        
+    except Exception as e:
+        logger.error(f"🧠 [AI-CACHE] Batch lookup failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def get_explanation_backend():
+    """Create the configured model backend on first use"""
+    global explanation_backend
+    if explanation_backend is None:
+        explanation_backend = load_backend()
+        logger.info(f"🧠 [AI-GEN] Using {type(explanation_backend).__name__} for explanation generation")
+    return explanation_backend
+
+@app.route('/ai-explanation/generate', methods=['POST'])
+def generate_ai_explanation():
+    """Return a cached AI explanation or generate one, coalescing concurrent requests"""
+    try:
+        if r is None:
+            connect_to_redis()
+        
+        data = request.get_json()
+        if not data or 'query' not in data or 'productDetails' not in data:
+            return jsonify({'error': 'Missing query or productDetails in request body'}), 400
+        
+        search_query = data['query']
+        product_details = data['productDetails']
+        product_id = product_details.get('productId', '')
+        requested_key = data.get('key') or f"{search_query.lower()}:{product_id}"
+        cache_key = query_canonicalizer.canonical_key(requested_key)
+        
+        checked_at = time.monotonic()
+        value = lookup_explanation(cache_key)
+        cached = explanation_codec.decode(value, r) if value else None
+        query_canonicalizer.record_lookup(requested_key, cache_key, cached)
+        if cached:
+            logger.info(f"🧠 [AI-GEN] Cache hit for: {cache_key}")
+            return jsonify({**cached, 'cached': True, 'cacheType': 'redis'})
+        
+        def recheck():
+            # A flight for this key finished after our lookup: its entry is in the cache now
+            value = lookup_explanation(cache_key)
+            cached = explanation_codec.decode(value, r) if value else None
+            return {**cached, 'cached': True, 'cacheType': 'redis'} if cached else None
+        
+        def generate():
+            result = generate_explanation(
+                get_explanation_backend(), data.get('rawExplanation'), product_details, search_query
+            )
+            cache_entry = {
+                **result,
+                'cached_at': int(time.time()),
+                'query': search_query,
+                'productId': product_id,
+                'title': product_details.get('title', '')
+            }
+            try:
+                store_explanation(cache_key, cache_entry)
+            except WriteQueueFull:
+                # The explanation is already paid for; write it through
+                explanation_policy.record_write(r, cache_key, explanation_codec.encode(cache_entry))
+            return result
+        
+        logger.info(f"🧠 [AI-GEN] Cache miss, generating explanation for: {cache_key}")
+        result, shared = generation_flights.do(cache_key, generate, recheck=recheck, since=checked_at)
+        if shared:
+            logger.info(f"🧠 [AI-GEN] Joined in-flight generation for: {cache_key}")
+        return jsonify({**result, 'coalesced': shared})
+        
+    except BackendNotConfigured as e:
+        # Tells the extension to generate the explanation itself
+        logger.warning(f"🧠 [AI-GEN] {e}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"🧠 [AI-GEN] Generation failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Queries listed by /stats
+STATS_SAMPLE = 5
+
+@app.route('/stats')
+def get_stats():
+    """Get overall statistics"""
+    try:
+        if r is None:
+            connect_to_redis()
+        
+        # The query index answers for the metric keys; no keyspace walk
+        pipe = r.pipeline(transaction=False)
+        pipe.dbsize()
+        pipe.zrange(QUERY_INDEX_KEY, 0, STATS_SAMPLE - 1)
+        pipe.zcard(QUERY_INDEX_KEY)
+        pipe.zcard(FREQ_KEY)
+        total_keys, members, indexed_queries, ai_explanations = pipe.execute()
+        sample = [parse_member(member) for member in members]
         
         return jsonify({
             'total_records': total_keys,
-            'sample_queries': list(queries)[:5],
-            'unique_products_sample': len(products),
+            'sample_queries': [entry['query'] for entry in sample],
+            # Per-query product counts of the sampled queries
+            'unique_products_sample': sum(entry['products'] for entry in sample),
+            'indexed_queries': indexed_queries,
             'cached_ai_explanations': ai_explanations
         })
         
@@ -252,6 +744,31 @@ def get_stats():
         logger.error(f"Stats failed: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Entries read (and decompressed) per /ai-explanation/stats footprint report
+FOOTPRINT_SAMPLE = 200
+
+@app.route('/ai-explanation/stats')
+def ai_cache_stats():
+    """Report cache size, budget usage and key canonicalization hit rates"""
+    try:
+        if r is None:
+            connect_to_redis()
+        
+        # Sizes come from a fixed sample scaled to the policy's entry count, so
+        # the report does not walk (and decompress) the whole cache
+        policy_stats = explanation_policy.stats(r)
+        return jsonify({
+            'session': explanation_codec.session_stats(),
+            'cache': footprint_report(r, explanation_codec, FOOTPRINT_SAMPLE, policy_stats['entries']),
+            'policy': policy_stats,
+            'keys': query_canonicalizer.stats(),
+            'write_behind': explanation_writes.stats() if explanation_writes is not None else None
+        })
+        
+    except Exception as e:
+        logger.error(f"🧠 [AI-CACHE] Failed to build cache report: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/ai-explanation/flush')
 def flush_ai_cache():
     """Clear all AI explanation cache entries"""
@@ -259,13 +776,13 @@ def flush_ai_cache():
         if r is None:
             connect_to_redis()
         
-        # Get all AI explanation keys
-        ai_keys = r.keys('ai_explanation:*')
-        deleted_count = 0
+        # Queued writes would re-create entries after the flush
+        if explanation_writes is not None:
+            explanation_writes.clear()
         
-        if ai_keys:
-            # Delete all AI explanation keys
-            deleted_count = r.delete(*ai_keys)
+        # Scan and unlink every AI explanation key page by page, plus the policy metadata
+        deleted_count = delete_matching(r, 'ai_explanation:*', META_KEYS)
+        if deleted_count:
             logger.info(f"🧠 [AI-CACHE] Flushed {deleted_count} AI explanation cache entries")
         
         return jsonify({
@@ -282,18 +799,42 @@ def main():
     logger.info("🚀 Starting Redis API Bridge Server")
     logger.info("=" * 35)
     
+    if metrics_snapshot is not None:
+        logger.info(f"📦 Serving /metrics and /search from snapshot {metrics_snapshot.path} "
+                    f"({metrics_snapshot.rows:,} rows)")
+    
     if not connect_to_redis():
-        logger.error("❌ Failed to connect to Redis. Make sure Redis is running:")
-        logger.error("   docker compose -f docker-compose-simple.yml up -d")
-        return
+        if metrics_snapshot is None:
+            logger.error("❌ Failed to connect to Redis. Make sure Redis is running:")
+            logger.error("   docker compose -f docker-compose-simple.yml up -d")
+            return
+        logger.warning("⚠️  Redis unavailable: serving metrics only, AI explanation endpoints will fail")
+    
+    health_monitor.start()
+    logger.info(f"⚡ Circuit breaker: opens after {redis_breaker.failure_threshold} failed or "
+                f">{redis_breaker.latency_threshold * 1000:.0f}ms calls, probes after "
+                f"{redis_breaker.reset_timeout:g}s; stale reads {'on' if stale_cache.enabled else 'off'}")
+    if explanation_writes is not None:
+        logger.info(f"🧠 [WRITE-BEHIND] Explanation writes flushed in batches of {explanation_writes.max_batch} "
+                    f"or every {explanation_writes.flush_interval * 1000:.0f}ms "
+                    f"(queue bound {explanation_writes.max_pending:,})")
+    logger.info(f"🚦 Admission control: {admission.describe()}")
     
     logger.info("🌐 API Server starting on http://localhost:5001")
     logger.info("📋 Available endpoints:")
     logger.info("   GET /health - Health check")
-    logger.info("   GET /search/<query> - Get all data for a search query")
+    logger.info("   GET /search/<query>?limit=<n> - Get all data for a search query (most viewed first)")
     logger.info("   GET /metrics/<query>/<product_id> - Get specific metrics")
+    logger.info("   GET /queries?prefix=<prefix>&limit=<n> - List known queries by prefix")
+    logger.info("   GET /queries/resolve/<query> - Closest known queries (fuzzy match)")
+    logger.info("   GET /product/<product_id> - Course totals and top queries")
+    logger.info("   GET /trend/<query>/<product_id>?days=<n> - Daily metric history and week-over-week change")
+    logger.info("   (add ?fuzzy=1 to /search and /metrics to fall back to the closest known query)")
     logger.info("   GET /ai-explanation/<key> - Get cached AI explanation")
     logger.info("   POST /ai-explanation - Save AI explanation to cache")
+    logger.info("   POST /ai-explanation/batch - Look up cached AI explanations for many keys")
+    logger.info("   POST /ai-explanation/generate - Generate (or reuse) an AI explanation")
+    logger.info("   GET /ai-explanation/stats - AI explanation cache size report")
     logger.info("   GET /ai-explanation/flush - Clear all AI explanation cache")
     logger.info("   GET /stats - Overall statistics")
     
@@ -5,9 +5,16 @@ from flask_cors import CORS
 import json
 import redis
 import logging
-import ssl
-import tempfile
+import time
 import os
+import sys
+from werkzeug.serving import WSGIRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from query_index import QUERY_INDEX_KEY, parse_member
+from redis_scripts import ScriptLibrary, search_ranked
+from admission import AdmissionController
+from tls_certs import load_or_create_certificate, server_context
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,10 +22,19 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Chrome extension
+# Keep /search results in ranking order instead of sorting them by product id
+app.json.sort_keys = False
 
 # Redis connection
 r = None
 
+# Lua scripts (the admission token bucket); loaded on connect
+redis_scripts = ScriptLibrary()
+
+# Per-route concurrency caps and cost-weighted per-client token buckets (429 + Retry-After)
+admission = AdmissionController.from_env(lambda: r, redis_scripts)
+admission.install(app)
+
 def connect_to_redis():
     """Connect to Redis"""
     global r
@@ -26,6 +42,7 @@ def connect_to_redis():
         r = redis.Redis(host='localhost', port=6379, decode_responses=True, socket_timeout=5)
         r.ping()
         logger.info("✅ Connected to Redis")
+        redis_scripts.load(r)
         return True
     except Exception as e:
         logger.error(f"❌ Failed to connect to Redis: {e}")
@@ -65,20 +82,17 @@ def get_search_data(query):
         if r is None:
             connect_to_redis()
         
-        # Find all keys that start with the query
-        pattern = f"{query}:*"
-        keys = r.keys(pattern)
+        # Scan and fetch all keys that start with the query, most viewed first
+        _, rows = search_ranked(r, [f"{query}:*"])
         
         results = {}
-        for key in keys:
+        for key, value in rows:
             try:
-                value = r.get(key)
-                if value:
-                    # Parse the key to get product_id
-                    parts = key.split(':', 1)
-                    if len(parts) == 2:
-                        product_id = parts[1]
-                        results[product_id] = json.loads(value)
+                # Parse the key to get product_id
+                parts = key.split(':', 1)
+                if len(parts) == 2:
+                    product_id = parts[1]
+                    results[product_id] = json.loads(value)
             except Exception as e:
                 logger.error(f"Error processing key {key}: {e}")
                 continue
@@ -129,86 +143,27 @@ def get_stats():
         if r is None:
             connect_to_redis()
         
-        total_keys = r.dbsize()
-        
-        # Get some sample queries
-        sample_keys = r.keys('*')[:10]
-        queries = set()
-        products = set()
-        
-        for key in sample_keys:
-            parts = key.split(':', 1)
-            if len(parts) == 2:
-                queries.add(parts[0])
-                products.add(parts[1])
+        # The query index answers for the metric keys; no keyspace walk
+        pipe = r.pipeline(transaction=False)
+        pipe.dbsize()
+        pipe.zrange(QUERY_INDEX_KEY, 0, 4)
+        total_keys, members = pipe.execute()
+        sample = [parse_member(member) for member in members]
         
         return jsonify({
             'total_records': total_keys,
-            'sample_queries': list(queries)[:5],
-            'unique_products_sample': len(products)
+            'sample_queries': [entry['query'] for entry in sample],
+            # Per-query product counts of the sampled queries
+            'unique_products_sample': sum(entry['products'] for entry in sample)
         })
         
     except Exception as e:
         logger.error(f"Stats failed: {e}")
         return jsonify({'error': str(e)}), 500
 
-def create_self_signed_cert():
-    """Create a self-signed certificate for HTTPS"""
-    from cryptography import x509
-    from cryptography.x509.oid import NameOID
-    from cryptography.hazmat.primitives import hashes
-    from cryptography.hazmat.primitives.asymmetric import rsa
-    from cryptography.hazmat.primitives import serialization
-    import datetime
-    
-    # Generate a key
-    key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-    )
-    
-    # Various details about who we are. For a self-signed certificate the
-    # subject and issuer are always the same.
-    subject = issuer = x509.Name([
-        x509.NameAttribute(NameOID.COMMON_NAME, u"localhost"),
-    ])
-    
-    cert = x509.CertificateBuilder().subject_name(
-        subject
-    ).issuer_name(
-        issuer
-    ).public_key(
-        key.public_key()
-    ).serial_number(
-        x509.random_serial_number()
-    ).not_valid_before(
-        datetime.datetime.utcnow()
-    ).not_valid_after(
-        # Our certificate will be valid for 10 days
-        datetime.datetime.utcnow() + datetime.timedelta(days=10)
-    ).add_extension(
-        x509.SubjectAlternativeName([
-            x509.DNSName(u"localhost"),
-            x509.IPAddress(ipaddress.IPv4Address(u"127.0.0.1")),
-        ]),
-        critical=False,
-    ).sign(key, hashes.SHA256())
-    
-    # Write our certificate out to disk.
-    cert_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pem')
-    key_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pem')
-    
-    with open(cert_file.name, "wb") as f:
-        f.write(cert.public_bytes(serialization.Encoding.PEM))
-    
-    with open(key_file.name, "wb") as f:
-        f.write(key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        ))
-    
-    return cert_file.name, key_file.name
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 so the extension reuses one TLS connection instead of handshaking per request"""
+    protocol_version = 'HTTP/1.1'
 
 def main():
     logger.info("🚀 Starting HTTPS Redis API Bridge Server")
@@ -218,14 +173,17 @@ def main():
         logger.error("❌ Failed to connect to Redis. Make sure Redis is running:")
         logger.error("   docker compose -f docker-compose-simple.yml up -d")
         return
+    logger.info(f"🚦 Admission control: {admission.describe()}")
     
     try:
-        # Try to create self-signed cert
-        import ipaddress
-        cert_file, key_file = create_self_signed_cert()
-        
-        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-        context.load_cert_chain(cert_file, key_file)
+        # Reuse the cached self-signed cert (created on first start or near expiry)
+        started = time.perf_counter()
+        cert_file, key_file, cert_info = load_or_create_certificate()
+        context = server_context(cert_file, key_file)
+        action = 'Created' if cert_info['created'] else 'Loaded'
+        logger.info(f"🔐 {action} {cert_info['key_type'].upper()} certificate {cert_file} "
+                    f"in {(time.perf_counter() - started) * 1000:.1f}ms (expires {cert_info['expires']})")
+        logger.info(f"   SHA-256 fingerprint {cert_info['fingerprint']}")
         
         logger.info("🔒 HTTPS API Server starting on https://localhost:5443")
         logger.info("📋 Available endpoints:")
@@ -234,9 +192,11 @@ def main():
         logger.info("   GET /metrics/<query>/<product_id> - Get specific metrics")
         logger.info("   GET /stats - Overall statistics")
         logger.info("")
-        logger.info("⚠️  You'll need to accept the self-signed certificate in your browser")
+        if cert_info['created']:
+            logger.info("⚠️  You'll need to accept the self-signed certificate in your browser")
         
-        app.run(host='0.0.0.0', port=5443, debug=False, ssl_context=context)
+        app.run(host='0.0.0.0', port=5443, debug=False, ssl_context=context, threaded=True,
+                request_handler=KeepAliveRequestHandler)
         
     except ImportError:
         logger.error("❌ Missing cryptography package. Install with: pip install cryptography")
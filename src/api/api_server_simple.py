@@ -5,6 +5,14 @@ from flask_cors import CORS
 import json
 import redis
 import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from metrics_snapshot import open_snapshot_from_env
+from query_index import QUERY_INDEX_KEY, parse_member
+from redis_scripts import ScriptLibrary, search_ranked
+from admission import AdmissionController
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,10 +20,22 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Chrome extension
+# Keep /search results in ranking order instead of sorting them by product id
+app.json.sort_keys = False
 
 # Redis connection
 r = None
 
+# Lua scripts (the admission token bucket); loaded on connect
+redis_scripts = ScriptLibrary()
+
+# Per-route concurrency caps and cost-weighted per-client token buckets (429 + Retry-After)
+admission = AdmissionController.from_env(lambda: r, redis_scripts)
+admission.install(app)
+
+# Memory-mapped metrics snapshot, used instead of Redis when METRICS_BACKEND=snapshot
+metrics_snapshot = open_snapshot_from_env()
+
 def connect_to_redis():
     """Connect to Redis"""
     global r
@@ -23,6 +43,7 @@ def connect_to_redis():
         r = redis.Redis(host='localhost', port=6379, decode_responses=True, socket_timeout=5)
         r.ping()
         logger.info("✅ Connected to Redis")
+        redis_scripts.load(r)
         return True
     except Exception as e:
         logger.error(f"❌ Failed to connect to Redis: {e}")
@@ -32,6 +53,14 @@ def connect_to_redis():
 def health():
     """Health check endpoint"""
     try:
+        if metrics_snapshot is not None:
+            return jsonify({
+                'status': 'healthy',
+                'metrics_backend': 'snapshot',
+                'redis_connected': False,
+                'total_keys': metrics_snapshot.rows
+            })
+        
         if r is None:
             connect_to_redis()
         
@@ -59,23 +88,28 @@ def health():
 def get_search_data(query):
     """Get all data for a specific search query"""
     try:
+        if metrics_snapshot is not None:
+            results = dict(sorted(metrics_snapshot.search(query).items(), key=lambda item: -item[1]['viewers']))
+            return jsonify({
+                'query': query,
+                'results': results,
+                'count': len(results)
+            })
+        
         if r is None:
             connect_to_redis()
         
-        # Find all keys that start with the query
-        pattern = f"{query}:*"
-        keys = r.keys(pattern)
+        # Scan and fetch all keys that start with the query, most viewed first
+        _, rows = search_ranked(r, [f"{query}:*"])
         
         results = {}
-        for key in keys:
+        for key, value in rows:
             try:
-                value = r.get(key)
-                if value:
-                    # Parse the key to get product_id
-                    parts = key.split(':', 1)
-                    if len(parts) == 2:
-                        product_id = parts[1]
-                        results[product_id] = json.loads(value)
+                # Parse the key to get product_id
+                parts = key.split(':', 1)
+                if len(parts) == 2:
+                    product_id = parts[1]
+                    results[product_id] = json.loads(value)
             except Exception as e:
                 logger.error(f"Error processing key {key}: {e}")
                 continue
@@ -94,14 +128,17 @@ def get_search_data(query):
 def get_metrics(query, product_id):
     """Get metrics for specific query + product combination"""
     try:
-        if r is None:
-            connect_to_redis()
-        
-        key = f"{query}:{product_id}"
-        value = r.get(key)
+        if metrics_snapshot is not None:
+            metrics = metrics_snapshot.get(query, product_id)
+        else:
+            if r is None:
+                connect_to_redis()
+            
+            key = f"{query}:{product_id}"
+            value = r.get(key)
+            metrics = json.loads(value) if value else None
         
-        if value:
-            metrics = json.loads(value)
+        if metrics:
             return jsonify({
                 'query': query,
                 'product_id': product_id,
@@ -123,26 +160,30 @@ def get_metrics(query, product_id):
 def get_stats():
     """Get overall statistics"""
     try:
+        if metrics_snapshot is not None:
+            stats = metrics_snapshot.stats()
+            return jsonify({
+                'total_records': stats['rows'],
+                'sample_queries': metrics_snapshot.sample_queries(5),
+                'unique_products_sample': stats['products'],
+                'snapshot': stats
+            })
+        
         if r is None:
             connect_to_redis()
         
-        total_keys = r.dbsize()
-        
-        # Get some sample queries
-        sample_keys = r.keys('*')[:10]
-        queries = set()
-        products = set()
-        
-        for key in sample_keys:
-            parts = key.split(':', 1)
-            if len(parts) == 2:
-                queries.add(parts[0])
-                products.add(parts[1])
+        # The query index answers for the metric keys; no keyspace walk
+        pipe = r.pipeline(transaction=False)
+        pipe.dbsize()
+        pipe.zrange(QUERY_INDEX_KEY, 0, 4)
+        total_keys, members = pipe.execute()
+        sample = [parse_member(member) for member in members]
         
         return jsonify({
             'total_records': total_keys,
-            'sample_queries': list(queries)[:5],
-            'unique_products_sample': len(products)
+            'sample_queries': [entry['query'] for entry in sample],
+            # Per-query product counts of the sampled queries
+            'unique_products_sample': sum(entry['products'] for entry in sample)
         })
         
     except Exception as e:
@@ -153,10 +194,14 @@ def main():
     logger.info("🚀 Starting Redis API Bridge Server")
     logger.info("=" * 35)
     
-    if not connect_to_redis():
+    if metrics_snapshot is not None:
+        logger.info(f"📦 Serving metrics from snapshot {metrics_snapshot.path} "
+                    f"({metrics_snapshot.rows:,} rows, no Redis needed)")
+    elif not connect_to_redis():
         logger.error("❌ Failed to connect to Redis. Make sure Redis is running:")
         logger.error("   docker compose -f docker-compose-simple.yml up -d")
         return
+    logger.info(f"🚦 Admission control: {admission.describe()}")
     
     logger.info("🌐 API Server starting on http://localhost:5001")
     logger.info("📋 Available endpoints:")
@@ -97,8 +97,272 @@ const REDIS_API_BASE = 'http://localhost:8080';
 const OPENAI_API_KEY = 'YOUR_OPENAI_API_KEY_HERE'; // Replace with your actual API key
 const OPENAI_API_BASE = 'https://api.openai.com/v1';
 
-// Cache for OpenAI explanations to avoid repeated API calls
-const explanationCache = new Map();
+// Two-tier cache: a bounded in-memory LRU in front of IndexedDB. The memory
+// tier is lost whenever the service worker is suspended; the IndexedDB tier
+// keeps entries across worker restarts and browser sessions, with a TTL and an
+// entry cap per store (least recently used entries are evicted first).
+const CACHE_DB_NAME = 'coursera-search-intelligence';
+const CACHE_DB_VERSION = 1;
+const CACHE_STORES = {
+  explanations: { memoryEntries: 200, maxEntries: 5000, ttlMs: 7 * 24 * 60 * 60 * 1000 },
+  // Metrics come from a daily load
+  metrics: { memoryEntries: 1000, maxEntries: 20000, ttlMs: 12 * 60 * 60 * 1000 }
+};
+// Prune a store after this many writes (expired entries first, then LRU down to 90% of the cap)
+const CACHE_PRUNE_EVERY = 50;
+// Persisted entries refresh their last-access time at most this often
+const CACHE_TOUCH_INTERVAL_MS = 60 * 60 * 1000;
+
+let cacheDBPromise = null;
+
+function idbRequest(request) {
+  return new Promise((resolve, reject) => {
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+function openCacheDB() {
+  if (!cacheDBPromise) {
+    cacheDBPromise = new Promise((resolve, reject) => {
+      const request = indexedDB.open(CACHE_DB_NAME, CACHE_DB_VERSION);
+      request.onupgradeneeded = () => {
+        const db = request.result;
+        Object.keys(CACHE_STORES).forEach(name => {
+          if (!db.objectStoreNames.contains(name)) {
+            const store = db.createObjectStore(name, { keyPath: 'key' });
+            store.createIndex('expiresAt', 'expiresAt');
+            store.createIndex('accessedAt', 'accessedAt');
+          }
+        });
+      };
+      request.onsuccess = () => resolve(request.result);
+      request.onerror = () => reject(request.error);
+    }).catch(error => {
+      // No IndexedDB (private mode, quota, corruption): run memory-only
+      console.log('⚠️ [CACHE] IndexedDB unavailable, using memory cache only:', error?.message);
+      return null;
+    });
+  }
+  return cacheDBPromise;
+}
+
+class TwoTierCache {
+  constructor(storeName, { memoryEntries, maxEntries, ttlMs }) {
+    this.storeName = storeName;
+    this.memoryEntries = memoryEntries;
+    this.maxEntries = maxEntries;
+    this.ttlMs = ttlMs;
+    // Map iteration order is insertion order: re-inserting on access makes it an LRU
+    this.memory = new Map();
+    this.writesSincePrune = 0;
+  }
+
+  remember(key, value, expiresAt) {
+    this.memory.delete(key);
+    this.memory.set(key, { value, expiresAt });
+    while (this.memory.size > this.memoryEntries) {
+      this.memory.delete(this.memory.keys().next().value);
+    }
+  }
+
+  fromMemory(key) {
+    const entry = this.memory.get(key);
+    if (!entry) {
+      return null;
+    }
+    if (entry.expiresAt <= Date.now()) {
+      this.memory.delete(key);
+      return null;
+    }
+    this.remember(key, entry.value, entry.expiresAt);
+    return { value: entry.value, tier: 'memory' };
+  }
+
+  // Resolves to { value, tier: 'memory' | 'persistent' }, or null on a miss
+  async get(key) {
+    const found = await this.getMany([key]);
+    return found.get(key) || null;
+  }
+
+  // Resolves to a Map of key → { value, tier } for the keys found (one IndexedDB transaction)
+  async getMany(keys) {
+    const found = new Map();
+    const missing = [];
+    keys.forEach(key => {
+      const hit = this.fromMemory(key);
+      if (hit) {
+        found.set(key, hit);
+      } else {
+        missing.push(key);
+      }
+    });
+
+    const db = missing.length > 0 ? await openCacheDB() : null;
+    if (!db) {
+      return found;
+    }
+    try {
+      const store = db.transaction(this.storeName, 'readonly').objectStore(this.storeName);
+      const records = await Promise.all(missing.map(key => idbRequest(store.get(key))));
+      const now = Date.now();
+      const expired = [];
+      const touched = [];
+      records.forEach((record, index) => {
+        if (!record) {
+          return;
+        }
+        if (record.expiresAt <= now) {
+          expired.push(missing[index]);
+          return;
+        }
+        if (now - record.accessedAt > CACHE_TOUCH_INTERVAL_MS) {
+          touched.push({ ...record, accessedAt: now });
+        }
+        this.remember(record.key, record.value, record.expiresAt);
+        found.set(record.key, { value: record.value, tier: 'persistent' });
+      });
+      if (expired.length > 0 || touched.length > 0) {
+        const writes = db.transaction(this.storeName, 'readwrite').objectStore(this.storeName);
+        expired.forEach(key => writes.delete(key));
+        touched.forEach(record => writes.put(record));
+      }
+    } catch (error) {
+      console.log(`⚠️ [CACHE] ${this.storeName} read failed:`, error?.message);
+    }
+    return found;
+  }
+
+  // Memory is updated synchronously; the IndexedDB write happens in the background
+  set(key, value, ttlMs = this.ttlMs) {
+    const now = Date.now();
+    const expiresAt = now + ttlMs;
+    this.remember(key, value, expiresAt);
+    return openCacheDB().then(db => {
+      if (!db) {
+        return;
+      }
+      const tx = db.transaction(this.storeName, 'readwrite');
+      tx.objectStore(this.storeName).put({ key, value, expiresAt, accessedAt: now });
+      if (++this.writesSincePrune >= CACHE_PRUNE_EVERY) {
+        this.writesSincePrune = 0;
+        this.prune();
+      }
+    }).catch(error => {
+      console.log(`⚠️ [CACHE] ${this.storeName} write failed:`, error?.message);
+    });
+  }
+
+  // Delete expired entries, then the least recently used ones over the cap
+  async prune() {
+    const db = await openCacheDB();
+    if (!db) {
+      return 0;
+    }
+    let removed = 0;
+    try {
+      const tx = db.transaction(this.storeName, 'readwrite');
+      const store = tx.objectStore(this.storeName);
+      removed += await this.deleteByCursor(store.index('expiresAt').openCursor(IDBKeyRange.upperBound(Date.now())));
+      const count = await idbRequest(store.count());
+      const excess = count - Math.floor(this.maxEntries * 0.9);
+      if (count > this.maxEntries && excess > 0) {
+        removed += await this.deleteByCursor(store.index('accessedAt').openCursor(), excess);
+      }
+      if (removed > 0) {
+        console.log(`🧹 [CACHE] Pruned ${removed} ${this.storeName} entries`);
+      }
+    } catch (error) {
+      console.log(`⚠️ [CACHE] ${this.storeName} prune failed:`, error?.message);
+    }
+    return removed;
+  }
+
+  deleteByCursor(request, limit = Infinity) {
+    return new Promise((resolve, reject) => {
+      let removed = 0;
+      request.onsuccess = () => {
+        const cursor = request.result;
+        if (!cursor || removed >= limit) {
+          resolve(removed);
+          return;
+        }
+        cursor.delete();
+        removed++;
+        cursor.continue();
+      };
+      request.onerror = () => reject(request.error);
+    });
+  }
+}
+
+// Explanations avoid repeated OpenAI / server calls; metrics avoid repeated /metrics lookups
+const explanationCache = new TwoTierCache('explanations', CACHE_STORES.explanations);
+const metricsCache = new TwoTierCache('metrics', CACHE_STORES.metrics);
+
+// Fallback-mode and stub-backend explanations stand in for a real one: keep
+// them for an hour so a proper explanation replaces them soon. Prewarmed
+// entries are generated in fallback mode on purpose and kept like any other.
+const PROVISIONAL_EXPLANATION_TTL_MS = 60 * 60 * 1000;
+
+function cacheExplanation(cacheKey, explanation) {
+  const provisional = !explanation?.prewarmed && (explanation?.fallbackMode || explanation?.backend === 'stub');
+  return explanationCache.set(cacheKey, explanation, provisional ? PROVISIONAL_EXPLANATION_TTL_MS : undefined);
+}
+
+// Drop expired and over-cap entries left by earlier sessions
+openCacheDB().then(() => {
+  explanationCache.prune();
+  metricsCache.prune();
+});
+
+// Memory-only set of keys that expire after ttlMs; past maxEntries the oldest keys go first
+class ExpiringKeySet {
+  constructor({ maxEntries, ttlMs }) {
+    this.maxEntries = maxEntries;
+    this.ttlMs = ttlMs;
+    // key -> expiresAt; every key gets the same TTL, so insertion order is expiry order
+    this.expiries = new Map();
+  }
+
+  add(key) {
+    const now = Date.now();
+    this.expiries.delete(key);
+    this.expiries.set(key, now + this.ttlMs);
+    for (const [oldest, expiresAt] of this.expiries) {
+      if (this.expiries.size <= this.maxEntries && expiresAt > now) {
+        break;
+      }
+      this.expiries.delete(oldest);
+    }
+  }
+
+  has(key) {
+    const expiresAt = this.expiries.get(key);
+    if (expiresAt === undefined) {
+      return false;
+    }
+    if (expiresAt <= Date.now()) {
+      this.expiries.delete(key);
+      return false;
+    }
+    return true;
+  }
+
+  delete(key) {
+    this.expiries.delete(key);
+  }
+}
+
+// Keys a batch lookup confirmed are not in Redis (skip the per-card cache check).
+// Another tab or a prewarm run may fill them in, so a miss is only trusted briefly.
+const knownExplanationMisses = new ExpiringKeySet({ maxEntries: 2000, ttlMs: 10 * 60 * 1000 });
+
+// Metrics for each tab's current query, loaded with one /search request:
+// tabId -> { query, metrics: Map(productId -> metrics) | null, loading: Promise }
+const tabMetrics = new Map();
+
+chrome.tabs.onRemoved.addListener(tabId => tabMetrics.delete(tabId));
 
 // Handle messages from content script (for Redis API calls)
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
@@ -120,7 +384,7 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
   
   if (request.action === 'fetchRedisMetrics') {
     console.log('🔗 [BACKGROUND] Fetching Redis metrics for:', request.query, request.productId);
-    fetchRedisMetrics(request.query, request.productId)
+    fetchRedisMetrics(request.query, request.productId, sender.tab?.id)
       .then(result => {
         console.log('🔗 [BACKGROUND] Metrics result:', result);
         sendResponse(result);
@@ -132,6 +396,28 @@ chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     return true; // Keep message channel open for async response
   }
   
+  if (request.action === 'prefetchMetrics') {
+    console.log('🔗 [BACKGROUND] Prefetching page metrics for:', request.query);
+    prefetchQueryMetrics(sender.tab?.id, request.query)
+      .then(result => sendResponse(result))
+      .catch(error => {
+        console.log('🔗 [BACKGROUND] Metrics prefetch error:', error);
+        sendResponse({ success: false, error: error.message });
+      });
+    return true; // Keep message channel open for async response
+  }
+  
+  if (request.action === 'prefetchExplanations') {
+    console.log('🧠 [BACKGROUND] Prefetching explanations for', request.productIds?.length, 'cards');
+    prefetchExplanations(request.query, request.productIds || [])
+      .then(result => sendResponse(result))
+      .catch(error => {
+        console.log('🧠 [BACKGROUND] Prefetch error:', error);
+        sendResponse({ success: false, error: error.message });
+      });
+    return true; // Keep message channel open for async response
+  }
+  
   if (request.action === 'formatExplanation') {
     console.log('🎯 [BACKGROUND] Received formatExplanation request');
     console.log('🔍 [CONTEXT] Raw explanation:', request.explanation?.substring(0, 100) + '...');
@@ -199,35 +485,49 @@ async function formatExplanationWithOpenAI(rawExplanation, productDetails, searc
   try {
     const cacheKey = `${searchQuery.toLowerCase()}:${productDetails.productId}`;
     
-    // Check if we have this in our session cache first
-    if (explanationCache.has(cacheKey)) {
-      console.log('🎯 [OPENAI] Using session cache for:', cacheKey);
+    // Check the local cache first (memory, then IndexedDB)
+    const localEntry = await explanationCache.get(cacheKey);
+    if (localEntry) {
+      console.log(`🎯 [OPENAI] Using ${localEntry.tier} cache for:`, cacheKey);
       return {
-        ...explanationCache.get(cacheKey),
+        ...localEntry.value,
         cached: true,
-        cacheType: 'session'
+        cacheType: localEntry.tier === 'memory' ? 'session' : 'local'
       };
     }
     
-    // Check Redis cache
-    console.log('🔍 [REDIS] Checking cache for AI explanation:', cacheKey);
-    try {
-      const cacheResponse = await fetch(`http://localhost:8080/ai-explanation/${encodeURIComponent(cacheKey)}`);
-      if (cacheResponse.ok) {
-        const cachedData = await cacheResponse.json();
-        console.log('✅ [REDIS] Found cached AI explanation');
-        
-        // Store in session cache too
-        explanationCache.set(cacheKey, cachedData);
-        
-        return {
-          ...cachedData,
-          cached: true,
-          cacheType: 'redis'
-        };
+    // Check Redis cache (unless a batch lookup already reported a miss)
+    if (knownExplanationMisses.has(cacheKey)) {
+      console.log('🔍 [REDIS] Skipping cache check, batch lookup reported a miss:', cacheKey);
+    } else {
+      console.log('🔍 [REDIS] Checking cache for AI explanation:', cacheKey);
+      try {
+        const cacheResponse = await fetch(`http://localhost:8080/ai-explanation/${encodeURIComponent(cacheKey)}`);
+        if (cacheResponse.ok) {
+          const cachedData = await cacheResponse.json();
+          console.log('✅ [REDIS] Found cached AI explanation');
+          
+          // Store in the local cache too
+          cacheExplanation(cacheKey, cachedData);
+          
+          return {
+            ...cachedData,
+            cached: true,
+            cacheType: 'redis'
+          };
+        }
+      } catch (redisError) {
+        console.log('⚠️ [REDIS] Cache check failed, proceeding with OpenAI:', redisError.message);
       }
-    } catch (redisError) {
-      console.log('⚠️ [REDIS] Cache check failed, proceeding with OpenAI:', redisError.message);
+    }
+
+    // Prefer server-side generation: concurrent requests for the same course
+    // share one upstream call and the server writes the result to Redis
+    const serverResult = await generateExplanationOnServer(rawExplanation, productDetails, searchQuery, cacheKey);
+    if (serverResult) {
+      cacheExplanation(cacheKey, serverResult);
+      knownExplanationMisses.delete(cacheKey);
+      return serverResult;
     }
 
     console.log('🤖 [OPENAI] Generating new explanation with rich context');
@@ -382,8 +682,9 @@ Focus on being specific rather than generic. Use the actual course data AND nume
       fallbackMode: isFallbackMode
     };
 
-    // Store in session cache
-    explanationCache.set(cacheKey, result);
+    // Store in the local cache
+    cacheExplanation(cacheKey, result);
+    knownExplanationMisses.delete(cacheKey);
 
     // Store in Redis cache
     try {
@@ -420,12 +721,149 @@ Focus on being specific rather than generic. Use the actual course data AND nume
   }
 }
 
+// Warm the local cache for a whole results page with one batch lookup
+async function prefetchExplanations(searchQuery, productIds) {
+  if (!searchQuery || productIds.length === 0) {
+    return { success: true, hits: 0, misses: [] };
+  }
+
+  const pageKeys = [...new Set(productIds.map(productId => `${searchQuery.toLowerCase()}:${productId}`))];
+  const cached = await explanationCache.getMany(pageKeys);
+  const keys = pageKeys.filter(key => !cached.has(key) && !knownExplanationMisses.has(key));
+  if (keys.length === 0) {
+    return { success: true, hits: 0, misses: [] };
+  }
+
+  const response = await fetch(`${REDIS_API_BASE}/ai-explanation/batch`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({ keys: keys })
+  });
+  if (!response.ok) {
+    return { success: false, error: `HTTP ${response.status}: ${response.statusText}` };
+  }
+
+  const data = await response.json();
+  Object.entries(data.hits || {}).forEach(([key, cachedData]) => {
+    cacheExplanation(key, cachedData);
+  });
+  (data.misses || []).forEach(key => knownExplanationMisses.add(key));
+  console.log(`🧠 [BACKGROUND] Prefetched ${data.hit_count} explanations, ${data.miss_count} need generation`);
+
+  return { success: true, hits: data.hit_count, misses: data.misses };
+}
+
+// Ask the API server to generate (or reuse) an explanation; null if unavailable
+async function generateExplanationOnServer(rawExplanation, productDetails, searchQuery, cacheKey) {
+  try {
+    console.log('🤖 [SERVER] Requesting server-side explanation for:', cacheKey);
+    const response = await fetch(`${REDIS_API_BASE}/ai-explanation/generate`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        key: cacheKey,
+        query: searchQuery,
+        productDetails: productDetails,
+        rawExplanation: rawExplanation
+      })
+    });
+
+    if (!response.ok) {
+      console.log('⚠️ [SERVER] Server-side generation unavailable:', response.status);
+      return null;
+    }
+
+    const result = await response.json();
+    console.log('✅ [SERVER] Explanation received', result.coalesced ? '(coalesced)' : '');
+    return {
+      ...result,
+      cacheType: result.cacheType === 'redis' ? 'redis' : 'server'
+    };
+  } catch (error) {
+    console.log('⚠️ [SERVER] Server-side generation failed, falling back to OpenAI:', error.message);
+    return null;
+  }
+}
+
+// Every product's metrics for a query (one /search request), kept for the tab's current page
+async function prefetchQueryMetrics(tabId, query) {
+  const normalizedQuery = query.toLowerCase();
+  let page = tabMetrics.get(tabId);
+  if (!page || page.query !== normalizedQuery) {
+    page = { query: normalizedQuery, metrics: null, loading: null };
+    page.loading = loadQueryMetrics(normalizedQuery)
+      .then(metrics => {
+        page.metrics = metrics;
+        return metrics;
+      })
+      .catch(error => {
+        // Let the next prefetch for this tab try again
+        if (tabMetrics.get(tabId) === page) {
+          tabMetrics.delete(tabId);
+        }
+        throw error;
+      });
+    tabMetrics.set(tabId, page);
+  }
+
+  const metrics = await page.loading;
+  return {
+    success: true,
+    query: normalizedQuery,
+    metrics: Object.fromEntries(metrics),
+    count: metrics.size
+  };
+}
+
+async function loadQueryMetrics(normalizedQuery) {
+  const url = `${REDIS_API_BASE}/search/${encodeURIComponent(normalizedQuery)}`;
+  console.log('🔗 [BACKGROUND] Making page metrics request to:', url);
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+  }
+
+  const data = await response.json();
+  const metrics = new Map(Object.entries(data.results || {}));
+  console.log(`🔗 [BACKGROUND] Prefetched metrics for ${metrics.size} products of "${normalizedQuery}"`);
+  return metrics;
+}
+
 // Fetch Redis metrics
-async function fetchRedisMetrics(query, productId) {
+async function fetchRedisMetrics(query, productId, tabId) {
   try {
     // Normalize query to lowercase for case-insensitive Redis lookup
     const normalizedQuery = query.toLowerCase();
     const cleanProductId = productId.includes('~') ? productId.split('~')[1] : productId;
+    const metricsKey = `${normalizedQuery}:${cleanProductId}`;
+    
+    // The tab's page prefetch holds every product of the query; a missing product has no data
+    const page = tabMetrics.get(tabId);
+    if (page && page.query === normalizedQuery && page.metrics) {
+      console.log('🔗 [BACKGROUND] Metrics from page prefetch:', metricsKey);
+      return {
+        success: true,
+        metrics: page.metrics.get(cleanProductId) || null,
+        originalQuery: query,
+        normalizedQuery: normalizedQuery
+      };
+    }
+    
+    const cachedMetrics = await metricsCache.get(metricsKey);
+    if (cachedMetrics) {
+      console.log(`🔗 [BACKGROUND] Metrics from ${cachedMetrics.tier} cache:`, metricsKey);
+      return {
+        success: true,
+        metrics: cachedMetrics.value,
+        originalQuery: query,
+        normalizedQuery: normalizedQuery
+      };
+    }
+    
     const url = `${REDIS_API_BASE}/metrics/${encodeURIComponent(normalizedQuery)}/${encodeURIComponent(cleanProductId)}`;
     
     console.log('🔗 [BACKGROUND] Making metrics request to:', url);
@@ -441,6 +879,9 @@ async function fetchRedisMetrics(query, productId) {
     if (response.ok) {
       const data = await response.json();
       console.log('🔗 [BACKGROUND] Metrics data:', data);
+      if (data.metrics) {
+        metricsCache.set(metricsKey, data.metrics);
+      }
       return { 
         success: true, 
         metrics: data.metrics,
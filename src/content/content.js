@@ -139,6 +139,86 @@ async function fetchRedisMetrics(searchQuery, productId) {
   }
 }
 
+// Metrics for every product of the current query, loaded once per query:
+// { query, metrics: Map(productId -> metrics) }, and the request that loads them
+let pageMetrics = null;
+let pageMetricsRequest = null;
+
+// Fetch all of the current query's metrics with one request (the background keeps them per tab)
+function prefetchPageMetrics() {
+  if (!redisApiAvailable) {
+    return null;
+  }
+  if (!currentSearchQuery) {
+    extractSearchQuery();
+  }
+  if (!currentSearchQuery) {
+    return null;
+  }
+  
+  const query = currentSearchQuery.toLowerCase();
+  if (pageMetricsRequest && pageMetricsRequest.query === query) {
+    return pageMetricsRequest.promise;
+  }
+  
+  const promise = new Promise(resolve => {
+    chrome.runtime.sendMessage({
+      action: 'prefetchMetrics',
+      query: currentSearchQuery
+    }, (response) => {
+      if (chrome.runtime.lastError || !response?.success) {
+        console.log('🔗 [DEBUG] Page metrics prefetch failed:', chrome.runtime.lastError?.message || response?.error);
+        if (pageMetricsRequest?.promise === promise) {
+          pageMetricsRequest = null; // retry on the next pass
+        }
+        resolve(null);
+        return;
+      }
+      console.log(`🔗 [DEBUG] Prefetched metrics for ${response.count} products of "${response.query}"`);
+      pageMetrics = { query: response.query, metrics: new Map(Object.entries(response.metrics)) };
+      resolve(pageMetrics);
+    });
+  });
+  pageMetricsRequest = { query, promise };
+  return promise;
+}
+
+// Prefetched metrics for a product: the metrics, null if it has none, undefined if not prefetched
+function lookupPageMetrics(searchQuery, cleanProductId) {
+  if (!pageMetrics || !searchQuery || pageMetrics.query !== searchQuery.toLowerCase()) {
+    return undefined;
+  }
+  return pageMetrics.metrics.get(cleanProductId) || null;
+}
+
+// Warm the background's explanation cache for every card with one batch request
+function prefetchExplanations(matches) {
+  if (!redisApiAvailable || !aiExplanationsEnabled) {
+    return;
+  }
+  if (!currentSearchQuery) {
+    extractSearchQuery();
+  }
+  const productIds = matches
+    .map(match => match.cardInfo?.productId)
+    .filter(productId => productId && productId !== 'No product ID found');
+  if (!currentSearchQuery || productIds.length === 0) {
+    return;
+  }
+  
+  chrome.runtime.sendMessage({
+    action: 'prefetchExplanations',
+    query: currentSearchQuery,
+    productIds: productIds
+  }, (response) => {
+    if (chrome.runtime.lastError) {
+      console.log('🧠 [DEBUG] Explanation prefetch failed:', chrome.runtime.lastError.message);
+    } else {
+      console.log('🧠 [DEBUG] Explanation prefetch result:', response);
+    }
+  });
+}
+
 // Debouncing for processSearchResults
 let processTimeout = null;
 
@@ -718,9 +798,23 @@ function extractSearchResultsFromApollo() {
   return [];
 }
 
-// Function to find the actual card containers more precisely
-function findProductCards() {
-  const courseLinks = document.querySelectorAll('a[href*="/learn/"], a[href*="/browse/"], a[href*="/professional-certificates/"], a[href*="/degrees/"], a[href*="/projects/"], a[href*="/specializations/"]');
+const COURSE_LINK_SELECTOR = 'a[href*="/learn/"], a[href*="/browse/"], a[href*="/professional-certificates/"], a[href*="/degrees/"], a[href*="/projects/"], a[href*="/specializations/"]';
+
+// Course links inside (or equal to) the given root elements
+function findCourseLinks(roots) {
+  const links = [];
+  roots.forEach(root => {
+    if (root.matches(COURSE_LINK_SELECTOR)) {
+      links.push(root);
+    }
+    links.push(...root.querySelectorAll(COURSE_LINK_SELECTOR));
+  });
+  return links;
+}
+
+// Function to find the actual card containers more precisely (whole page, or only under roots)
+function findProductCards(roots) {
+  const courseLinks = roots ? findCourseLinks(roots) : document.querySelectorAll(COURSE_LINK_SELECTOR);
   
   const cards = [];
   const processedElements = new Set();
@@ -792,7 +886,7 @@ function extractProductIdFromCard(card) {
     }
     
     // Fallback: Look for links that contain course/product information
-    const links = card.querySelectorAll('a[href*="/learn/"], a[href*="/browse/"], a[href*="/professional-certificates/"], a[href*="/degrees/"], a[href*="/projects/"], a[href*="/specializations/"]');
+    const links = card.querySelectorAll(COURSE_LINK_SELECTOR);
     
     for (let link of links) {
       const href = link.getAttribute('href');
@@ -945,7 +1039,13 @@ async function createOverlay(match) {
   let redisMetrics = null;
   if (redisApiAvailable && currentSearchQuery && productId) {
     try {
-      redisMetrics = await fetchRedisMetrics(currentSearchQuery, productId);
+      // Filled from the page prefetch without a round trip once it has loaded
+      let prefetched = lookupPageMetrics(currentSearchQuery, cleanProductId);
+      if (prefetched === undefined && pageMetricsRequest) {
+        await pageMetricsRequest.promise;
+        prefetched = lookupPageMetrics(currentSearchQuery, cleanProductId);
+      }
+      redisMetrics = prefetched !== undefined ? prefetched : await fetchRedisMetrics(currentSearchQuery, productId);
     } catch (error) {
       console.log('❌ Error fetching Redis metrics in overlay:', error);
     }
@@ -1608,9 +1708,11 @@ function positionOverlay(overlay, card) {
 
 // Function to add hover effects to cards
 function addHoverEffects(matches) {
+  matches.forEach(match => processedCards.add(match.cardElement));
   matches.forEach(async (match) => {
     const card = match.cardElement;
     const overlay = await createOverlay(match);
+    overlayCards.set(overlay, card);
     let hideTimeout = null; // Store timeout reference
     
     // Add visual indicator to card for debugging
@@ -1687,6 +1789,89 @@ function addHoverEffects(matches) {
   });
 }
 
+// Cards that already have an overlay; a card the page re-renders is a new element and gets one again
+let processedCards = new WeakSet();
+const overlayCards = new WeakMap(); // overlay -> its card
+
+// Nodes with course links added since the last incremental pass
+let pendingCardRoots = [];
+let incrementalPassScheduled = false;
+
+// Idle-time budget per slice of an incremental pass (ms)
+const INCREMENTAL_SLICE_MS = 8;
+
+const scheduleIdle = window.requestIdleCallback
+  ? callback => window.requestIdleCallback(callback, { timeout: 1000 })
+  : callback => setTimeout(() => callback({ didTimeout: true, timeRemaining: () => INCREMENTAL_SLICE_MS }), 50);
+
+// Queue added nodes for the next incremental pass
+function queueAddedCards(roots) {
+  pendingCardRoots.push(...roots);
+  if (!incrementalPassScheduled) {
+    incrementalPassScheduled = true;
+    scheduleIdle(processAddedCards);
+  }
+}
+
+// Remove overlays whose cards the page has taken out (filter changes, virtualized lists)
+function pruneDetachedOverlays() {
+  overlays = overlays.filter(overlay => {
+    const card = overlayCards.get(overlay);
+    if (card && !card.isConnected) {
+      overlay.remove();
+      return false;
+    }
+    return true;
+  });
+  productCards = productCards.filter(card => card.isConnected);
+}
+
+// Add overlays for newly added cards only, in idle-time slices; existing overlays stay
+function processAddedCards(deadline) {
+  incrementalPassScheduled = false;
+  if (!isActive) {
+    pendingCardRoots = [];
+    return;
+  }
+  
+  const cards = [];
+  while (pendingCardRoots.length > 0 && (deadline.didTimeout || deadline.timeRemaining() > 1)) {
+    const root = pendingCardRoots.shift();
+    if (!root.isConnected) {
+      continue;
+    }
+    findProductCards([root]).forEach(card => {
+      if (!processedCards.has(card) && !cards.includes(card)) {
+        cards.push(card);
+      }
+    });
+  }
+  if (pendingCardRoots.length > 0) {
+    incrementalPassScheduled = true;
+    scheduleIdle(processAddedCards);
+  }
+  
+  pruneDetachedOverlays();
+  if (cards.length === 0) {
+    return;
+  }
+  
+  const apiResults = searchData ? extractSearchResultsFromAPI(searchData) : [];
+  const responseResults = responseData ? extractSearchResultsFromResponse(responseData) : [];
+  const apolloResults = extractSearchResultsFromApollo();
+  const matches = matchCardsWithData(cards, apiResults, apolloResults, responseResults);
+  matches.forEach(match => {
+    match.index += productCards.length;
+  });
+  productCards.push(...cards);
+  
+  prefetchPageMetrics();
+  prefetchExplanations(matches);
+  addHoverEffects(matches);
+  
+  console.log(`➕ Added overlays for ${cards.length} new cards (${productCards.length} total)`);
+}
+
 // Function to process search results
 function processSearchResults() {
   if (!isActive) return;
@@ -1835,6 +2020,8 @@ function processSearchResults() {
     })));
   }
   
+  prefetchPageMetrics();
+  prefetchExplanations(matches);
   addHoverEffects(matches);
   
   console.log(`✅ [${timestamp}] Extension ready! Found ${cards.length} cards, ${matches.filter(m => m.responseData).length} matched`);
@@ -1851,6 +2038,8 @@ function cleanupOverlays() {
   
   // Clear the overlays array
   overlays = [];
+  processedCards = new WeakSet();
+  pendingCardRoots = [];
   
   // Remove debug outlines from cards
   productCards.forEach(card => {
@@ -2060,29 +2249,23 @@ if (document.readyState === 'loading') {
   setTimeout(processSearchResults, 2000);
 }
 
-// Re-process when page content changes (for dynamic loading)
+// Pick up cards added by dynamic loading (infinite scroll, filters) without rebuilding the page
 const observer = new MutationObserver((mutations) => {
-  let shouldReprocess = false;
+  const addedRoots = [];
   mutations.forEach((mutation) => {
     if (mutation.type === 'childList' && mutation.addedNodes.length > 0) {
       for (let node of mutation.addedNodes) {
-        if (node.nodeType === 1 && (
-          node.querySelector && (
-            node.querySelector('a[href*="/learn/"]') ||
-            node.querySelector('a[href*="/browse/"]') ||
-            node.querySelector('a[href*="/professional-certificates/"]')
-          )
+        if (node.nodeType === 1 && !node.classList.contains('coursera-search-overlay') && (
+          node.matches(COURSE_LINK_SELECTOR) || node.querySelector(COURSE_LINK_SELECTOR)
         )) {
-          shouldReprocess = true;
-          break;
+          addedRoots.push(node);
         }
       }
     }
   });
   
-  if (shouldReprocess) {
-    cleanupOverlays();
-    setTimeout(processSearchResults, 1000);
+  if (addedRoots.length > 0) {
+    queueAddedCards(addedRoots);
   }
 });
 
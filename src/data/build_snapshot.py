@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""Build the memory-mapped metrics snapshot served with METRICS_BACKEND=snapshot.
+
+Usage:
+    python3 src/data/build_snapshot.py [csv_path] [snapshot_path]
+
+Running API servers keep serving the snapshot they opened; restart them to
+pick up a rebuilt file.
+"""
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from metrics_snapshot import DEFAULT_SNAPSHOT_PATH, MetricsSnapshot, write_snapshot  # noqa: E402
+
+CSV_FILE = '(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv'
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_FILE
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('METRICS_SNAPSHOT_PATH',
+                                                                        DEFAULT_SNAPSHOT_PATH)
+
+    print("🚀 Building Metrics Snapshot")
+    print("=" * 30)
+
+    try:
+        df = pd.read_csv(csv_path)
+        print(f"📈 Loaded {len(df):,} rows from {csv_path}")
+    except Exception as e:
+        print(f"❌ Failed to read CSV: {e}")
+        sys.exit(1)
+
+    started = time.time()
+    rows = write_snapshot(df, snapshot_path)
+    print(f"✅ Wrote {rows:,} rows to {snapshot_path} in {time.time() - started:.1f}s")
+
+    snapshot = MetricsSnapshot(snapshot_path)
+    stats = snapshot.stats()
+    snapshot.close()
+    print(f"📊 {stats['queries']:,} queries, {stats['products']:,} products, "
+          f"{stats['file_bytes'] / 1024 / 1024:.1f} MB")
+    print(f"   Serve it with: METRICS_BACKEND=snapshot METRICS_SNAPSHOT_PATH={snapshot_path}")
+
+
+if __name__ == '__main__':
+    main()
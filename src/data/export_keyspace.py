@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""Export the live keyspace - metrics and cached AI explanations - to a columnar file.
+
+Every primary is scanned in its own thread; values are fetched in pipelined
+batches, turned into Arrow record batches and handed to the writer through a
+bounded queue, so memory stays at a few batches no matter how many keys the
+cluster holds. Output is Parquet (zstd) or, for ``.arrow``/``.feather``/``.ipc``
+paths, an Arrow IPC file. The file is written next to the target and renamed
+into place when complete.
+
+One row per key, with a ``kind`` of ``metrics`` or ``explanation``. Metric
+rows carry the seven metric columns and the live ``dataset_version``;
+explanation rows carry the decoded entry as JSON in ``explanation`` (their
+``dataset_version`` is empty, since cached explanations outlive reloads).
+Index, rollup, dictionary, policy and rate-limit keys are not exported.
+
+pyarrow is only needed for this tool: ``pip install pyarrow``.
+
+Usage:
+    python3 src/data/export_keyspace.py --out keyspace.parquet
+    python3 src/data/export_keyspace.py --out ai.arrow --prefix ai: --prefix ai_explanation:ai
+    python3 src/data/export_keyspace.py --out keyspace.parquet --cluster localhost:7001 \\
+        --dataset-version 2025-07-17
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+import redis
+from redis.client import NEVER_DECODE
+from redis.cluster import RedisCluster
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from dataset_version import read_dataset_version  # noqa: E402
+from explanation_store import EXPLANATION_PREFIX, ExplanationCodec  # noqa: E402
+from keyspace import INTERNAL_PREFIXES  # noqa: E402
+
+# Explanations are exported with the metrics; the rest of the internal keys are not
+SKIPPED_PREFIXES = tuple(prefix for prefix in INTERNAL_PREFIXES if prefix != EXPLANATION_PREFIX)
+COUNT_COLUMNS = ['viewers', 'clickers', 'enrollers', 'paid_enrollers']
+RATE_COLUMNS = ['ctr', 'enrollment_rate', 'paid_conversion_rate']
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+SCAN_COUNT = 1000
+BATCH_SIZE = 5000
+QUEUE_BATCHES = 8
+
+_DONE = object()
+
+
+def export_schema(pa):
+    return pa.schema(
+        [('key', pa.string()), ('kind', pa.string()), ('query', pa.string()), ('product_id', pa.string())]
+        + [(column, pa.int64()) for column in COUNT_COLUMNS]
+        + [(column, pa.float64()) for column in RATE_COLUMNS]
+        + [('explanation', pa.string()), ('dataset_version', pa.string())]
+    )
+
+
+def glob_escape(prefix):
+    """Escape SCAN MATCH metacharacters so a prefix matches literally"""
+    return re.sub(r'([\\*?\[\]])', r'\\\1', prefix)
+
+
+def primary_connections(client):
+    """One plain client per primary (the client itself for a single node)"""
+    if isinstance(client, RedisCluster):
+        return [client.get_redis_connection(node) for node in client.get_primaries()]
+    return [client]
+
+
+class BatchBuilder:
+    """Collects decoded rows column-wise until a record batch is due"""
+
+    def __init__(self, pa, schema, dataset_version):
+        self.pa = pa
+        self.schema = schema
+        self.dataset_version = dataset_version
+        self.columns = {name: [] for name in schema.names}
+
+    def __len__(self):
+        return len(self.columns['key'])
+
+    def _append(self, key, kind, cache_key, metrics, explanation, dataset_version):
+        query, _, product_id = cache_key.rpartition(':')
+        columns = self.columns
+        columns['key'].append(key)
+        columns['kind'].append(kind)
+        columns['query'].append(query)
+        columns['product_id'].append(product_id)
+        for column in COUNT_COLUMNS + RATE_COLUMNS:
+            columns[column].append(metrics.get(column) if metrics else None)
+        columns['explanation'].append(explanation)
+        columns['dataset_version'].append(dataset_version)
+
+    def add_metrics(self, keys, values):
+        pairs = [(key, value) for key, value in zip(keys, values) if value is not None]
+        if not pairs:
+            return
+        # One parse for the whole batch; a malformed value falls back to per-key parsing
+        try:
+            records = json.loads(b'[' + b','.join(value for _, value in pairs) + b']')
+        except ValueError:
+            records = [_loads_or_none(value) for _, value in pairs]
+        for (key, _), metrics in zip(pairs, records):
+            if isinstance(metrics, dict):
+                self._append(key, 'metrics', key, metrics, None, self.dataset_version)
+
+    def add_explanations(self, keys, values, codec, client):
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            try:
+                entry = codec.decode(value, client)
+            except ValueError:
+                continue
+            self._append(key, 'explanation', key[len(EXPLANATION_PREFIX):], None,
+                         json.dumps(entry, ensure_ascii=False), None)
+
+    def flush(self):
+        batch = self.pa.RecordBatch.from_pydict(self.columns, schema=self.schema)
+        self.columns = {name: [] for name in self.schema.names}
+        return batch
+
+
+def _loads_or_none(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def scan_primary(connection, client, patterns, builder, out, batch_size=BATCH_SIZE, stop=None):
+    """Scan one primary and put record batches of at most ``batch_size`` rows on ``out``
+
+    Returns early once ``stop`` is set (the writer failed or another primary did).
+    """
+    codec = ExplanationCodec()
+    keys = []
+
+    def fetch():
+        pipe = connection.pipeline(transaction=False)
+        for key in keys:
+            pipe.execute_command('GET', key, **{NEVER_DECODE: True})
+        values = pipe.execute()
+        metric_keys, metric_values, explanation_keys, explanation_values = [], [], [], []
+        for key, value in zip(keys, values):
+            if key.startswith(EXPLANATION_PREFIX):
+                explanation_keys.append(key)
+                explanation_values.append(value)
+            else:
+                metric_keys.append(key)
+                metric_values.append(value)
+        builder.add_metrics(metric_keys, metric_values)
+        builder.add_explanations(explanation_keys, explanation_values, codec, client)
+        keys.clear()
+        if len(builder) >= batch_size:
+            out.put(builder.flush())
+
+    for pattern in patterns:
+        for key in connection.scan_iter(match=pattern, count=SCAN_COUNT):
+            if isinstance(key, bytes):
+                key = key.decode('utf-8')
+            if key.startswith(SKIPPED_PREFIXES) or ':' not in key:
+                continue
+            keys.append(key)
+            if len(keys) >= batch_size:
+                fetch()
+                if stop is not None and stop.is_set():
+                    return
+    if keys:
+        fetch()
+    if len(builder):
+        out.put(builder.flush())
+
+
+def open_writer(pa, path, schema, file_format):
+    if file_format == 'arrow':
+        return pa.ipc.new_file(path, schema)
+    import pyarrow.parquet as pq
+    return pq.ParquetWriter(path, schema, compression='zstd')
+
+
+def export_keyspace(client, path, prefixes=None, dataset_version=None, file_format=None,
+                    batch_size=BATCH_SIZE):
+    """Export matching keys to ``path``; returns ``{'rows', 'metrics', 'explanations', ...}``"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("pyarrow is required for exports. Install with: pip install pyarrow")
+
+    live = read_dataset_version(client)
+    live_version = live.get('version')
+    if dataset_version and dataset_version != live_version:
+        raise ValueError(f"Live dataset is version {live_version or 'unknown'}, not {dataset_version}")
+
+    file_format = file_format or ('arrow' if path.endswith(ARROW_SUFFIXES) else 'parquet')
+    patterns = [f'{glob_escape(prefix)}*' for prefix in prefixes] if prefixes else ['*']
+    schema = export_schema(pa)
+    connections = primary_connections(client)
+    out = queue.Queue(maxsize=QUEUE_BATCHES)
+    stop = threading.Event()
+    errors = []
+
+    def worker(connection):
+        try:
+            scan_primary(connection, client, patterns, BatchBuilder(pa, schema, live_version), out, batch_size,
+                         stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            out.put(_DONE)
+
+    tmp_path = f"{path}.tmp"
+    stats = {'rows': 0, 'metrics': 0, 'explanations': 0, 'primaries': len(connections),
+             'dataset_version': live_version, 'format': file_format}
+    threads = [threading.Thread(target=worker, args=(connection,), daemon=True) for connection in connections]
+    for thread in threads:
+        thread.start()
+
+    running = len(threads)
+    try:
+        writer = open_writer(pa, tmp_path, schema, file_format)
+        try:
+            while running:
+                batch = out.get()
+                if batch is _DONE:
+                    running -= 1
+                    continue
+                writer.write_batch(batch)
+                explanations = sum(1 for kind in batch.column('kind').to_pylist() if kind == 'explanation')
+                stats['rows'] += batch.num_rows
+                stats['explanations'] += explanations
+                stats['metrics'] += batch.num_rows - explanations
+        finally:
+            writer.close()
+    except BaseException:
+        # Stop the scans and keep taking batches so no producer stays blocked on a full queue
+        stop.set()
+        while running:
+            if out.get() is _DONE:
+                running -= 1
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if errors:
+        os.remove(tmp_path)
+        raise errors[0]
+    os.replace(tmp_path, path)
+    return stats
+
+
+def connect(args):
+    if args.cluster:
+        host, _, port = args.cluster.rpartition(':')
+        client = RedisCluster(host=host, port=int(port), decode_responses=True)
+    else:
+        client = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+    client.ping()
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', required=True, help='.parquet, or .arrow/.feather/.ipc for Arrow IPC')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], help='override the format implied by --out')
+    parser.add_argument('--prefix', action='append', help='only keys starting with this (repeatable)')
+    parser.add_argument('--dataset-version', help='refuse to export unless this dataset version is loaded')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per record batch')
+    parser.add_argument('--cluster', help='host:port of any cluster node')
+    parser.add_argument('--host', default=os.environ.get('REDIS_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('REDIS_PORT', 6379)))
+    args = parser.parse_args()
+
+    print("🚀 Exporting Redis keyspace")
+    print("=" * 30)
+    try:
+        client = connect(args)
+    except Exception as e:
+        print(f"❌ Failed to connect to Redis: {e}")
+        sys.exit(1)
+
+    started = time.time()
+    try:
+        stats = export_keyspace(client, args.out, args.prefix, args.dataset_version, args.format,
+                                args.batch_size)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"✅ Exported {stats['rows']:,} keys ({stats['metrics']:,} metrics, "
+          f"{stats['explanations']:,} explanations) from {stats['primaries']} primaries "
+          f"in {time.time() - started:.1f}s")
+    print(f"   {stats['format']} file: {args.out} ({os.path.getsize(args.out) / 1024 / 1024:.1f} MB)")
+    if stats['dataset_version']:
+        print(f"🏷️  Dataset version {stats['dataset_version']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,19 @@ import redis
 import json
 import time
 import sys
+import os
 from redis.cluster import RedisCluster
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from query_index import build_query_index
+from fuzzy_index import build_fuzzy_index
+from product_rollups import build_product_rollups
+from dataset_version import record_dataset_version
+from metric_history import append_history, history_retention_from_env
+
+# One daily export per load; METRICS_CSV points at a newer day's file
+CSV_FILE = os.environ.get('METRICS_CSV', '(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv')
+
 def wait_for_cluster():
     """Wait for Redis cluster to be ready"""
     startup_nodes = [
@@ -42,7 +53,7 @@ def load_csv_to_redis():
     # Read CSV file
     print("📊 Reading CSV file...")
     try:
-        df = pd.read_csv('(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv')
+        df = pd.read_csv(CSV_FILE)
         print(f"✅ Successfully loaded {len(df)} rows from CSV")
     except Exception as e:
         print(f"❌ Error reading CSV file: {e}")
@@ -86,6 +97,20 @@ def load_csv_to_redis():
     print(f"📈 Successfully loaded: {success_count} records")
     print(f"❌ Errors: {error_count} records")
     
+    # Prefix index so queries can be listed without a keyspace walk
+    indexed = build_query_index(rc, df)
+    print(f"🔤 Indexed {indexed:,} search queries for prefix lookup")
+    build_fuzzy_index(rc, df)
+    print("🔎 Built trigram index for fuzzy query matching")
+    products = build_product_rollups(rc, df)
+    print(f"📦 Stored rollups for {products:,} products")
+    version = record_dataset_version(rc, CSV_FILE, len(df))
+    print(f"🏷️  Dataset version {version}")
+    retention = history_retention_from_env()
+    if retention:
+        pairs = append_history(rc, df, version, retention)
+        print(f"📈 Appended {version} to the history of {pairs:,} pairs (keeping {retention} days)")
+    
     # Display some sample data
     print("\n📋 Sample data verification:")
     sample_keys = list(rc.scan_iter(count=5))
@@ -5,6 +5,17 @@ import redis
 import json
 import time
 import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from query_index import build_query_index
+from fuzzy_index import build_fuzzy_index
+from product_rollups import build_product_rollups
+from dataset_version import record_dataset_version
+from metric_history import append_history, history_retention_from_env
+
+# One daily export per load; METRICS_CSV points at a newer day's file
+CSV_FILE = os.environ.get('METRICS_CSV', '(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv')
 
 def wait_for_redis():
     """Wait for Redis to be ready"""
@@ -32,7 +43,7 @@ def load_csv_data(r):
     
     # Read CSV file
     try:
-        df = pd.read_csv('(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv')
+        df = pd.read_csv(CSV_FILE)
         print(f"📈 Loaded {len(df)} rows from CSV")
     except Exception as e:
         print(f"❌ Failed to read CSV: {e}")
@@ -70,6 +81,20 @@ def load_csv_data(r):
     
     print(f"✅ Successfully loaded {inserted_count:,} records into Redis")
     
+    # Prefix index so queries can be listed without a keyspace walk
+    indexed = build_query_index(r, df)
+    print(f"🔤 Indexed {indexed:,} search queries for prefix lookup")
+    build_fuzzy_index(r, df)
+    print("🔎 Built trigram index for fuzzy query matching")
+    products = build_product_rollups(r, df)
+    print(f"📦 Stored rollups for {products:,} products")
+    version = record_dataset_version(r, CSV_FILE, len(df))
+    print(f"🏷️  Dataset version {version}")
+    retention = history_retention_from_env()
+    if retention:
+        pairs = append_history(r, df, version, retention)
+        print(f"📈 Appended {version} to the history of {pairs:,} pairs (keeping {retention} days)")
+    
     # Show some sample data
     print("\n📋 Sample data:")
     sample_keys = r.keys('ai:*')[:3]  # Get 3 keys that start with 'ai:'
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+"""Full reloads through Redis's mass-insertion protocol instead of a Python client.
+
+``write`` encodes the whole dataset - the metric keys plus the query index,
+trigram index and product rollups the regular loaders build - as raw RESP
+command streams, one file per primary. Each command goes to the stream of
+the primary owning its key slot. The slot map comes from a live cluster
+(``--cluster host:port``), or from an even split over ``--shards N`` primaries,
+the split ``redis-cli --cluster create`` uses. A manifest records the row counts
+plus a SHA-256, byte size and command count per stream.
+
+``verify`` re-hashes the streams and re-counts their commands against the
+manifest. ``pipe`` feeds each stream to ``redis-cli --pipe`` on its primary,
+in parallel, and checks that every command got a reply without errors.
+
+Usage:
+    python3 src/data/mass_insert.py write --out resp_load            # single node
+    python3 src/data/mass_insert.py write --out resp_load --cluster localhost:7001
+    python3 src/data/mass_insert.py verify resp_load
+    python3 src/data/mass_insert.py pipe resp_load [--host localhost --port 6379]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from fuzzy_index import FUZZY_INDEX_KEY, TrigramIndex  # noqa: E402
+from dataset_version import DATASET_VERSION_KEY, dataset_version_fields, dataset_version_from_csv  # noqa: E402
+from product_rollups import PRODUCT_SET_KEY, compute_rollups, product_rollup_key  # noqa: E402
+from query_index import BUILD_SUFFIX, QUERY_INDEX_KEY, index_member, query_totals  # noqa: E402
+
+CSV_FILE = '(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv'
+MANIFEST_FILE = 'manifest.json'
+INDEX_CHUNK = 1000
+
+COUNT_COLUMNS = ['viewers', 'clickers', 'enrollers', 'paid_enrollers']
+RATE_COLUMNS = ['ctr', 'enrollment_rate', 'paid_conversion_rate']
+
+
+def encode_command(*args):
+    """One command in RESP (array of bulk strings)"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def even_slot_map(shards):
+    """Slot ranges for ``shards`` primaries, as ``redis-cli --cluster create`` assigns them"""
+    per_shard = REDIS_CLUSTER_HASH_SLOTS / shards
+    ranges = []
+    for shard in range(shards):
+        start = round(shard * per_shard)
+        end = round((shard + 1) * per_shard) - 1
+        ranges.append({'node': None, 'slots': [[start, end]]})
+    return ranges
+
+
+def cluster_slot_map(address):
+    """Slot ranges per primary, read from a live cluster"""
+    from redis.cluster import RedisCluster
+
+    host, port = address.rsplit(':', 1)
+    rc = RedisCluster(host=host, port=int(port), decode_responses=True)
+    owners = {}
+    for slot in range(REDIS_CLUSTER_HASH_SLOTS):
+        node = rc.nodes_manager.get_node_from_slot(slot)
+        ranges = owners.setdefault(f"{node.host}:{node.port}", [])
+        if ranges and ranges[-1][1] == slot - 1:
+            ranges[-1][1] = slot
+        else:
+            ranges.append([slot, slot])
+    rc.close()
+    return [{'node': node, 'slots': ranges} for node, ranges in sorted(owners.items())]
+
+
+class RespStreams:
+    """Routes encoded commands to one stream file per primary and tracks checksums"""
+
+    def __init__(self, out_dir, shard_map):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.shard_of_slot = bytearray(REDIS_CLUSTER_HASH_SLOTS)
+        self.streams = []
+        for shard, spec in enumerate(shard_map):
+            for start, end in spec['slots']:
+                self.shard_of_slot[start:end + 1] = bytes([shard]) * (end - start + 1)
+            path = os.path.join(out_dir, f"shard_{shard}.resp")
+            self.streams.append({
+                'file': path,
+                'node': spec['node'],
+                'slots': spec['slots'],
+                'commands': 0,
+                'bytes': 0,
+                '_handle': open(path, 'wb'),
+                '_sha256': hashlib.sha256(),
+            })
+
+    def add(self, *args):
+        """Queue one command; its second argument is the key used for routing"""
+        key = args[1] if isinstance(args[1], bytes) else str(args[1]).encode('utf-8')
+        stream = self.streams[self.shard_of_slot[key_slot(key)] if len(self.streams) > 1 else 0]
+        payload = encode_command(*args)
+        stream['_handle'].write(payload)
+        stream['_sha256'].update(payload)
+        stream['commands'] += 1
+        stream['bytes'] += len(payload)
+
+    def close(self):
+        summaries = []
+        for stream in self.streams:
+            stream.pop('_handle').close()
+            stream['sha256'] = stream.pop('_sha256').hexdigest()
+            stream['file'] = os.path.basename(stream['file'])
+            summaries.append(stream)
+        return summaries
+
+
+def metric_values(df):
+    """``(key, json value)`` per row, in the loaders' JSON layout"""
+    counts = {column: df[column].fillna(0).astype('int64').tolist() for column in COUNT_COLUMNS}
+    rates = {column: df[column].fillna(0.0).astype('float64').tolist() for column in RATE_COLUMNS}
+    keys = (df['searched_query'].astype(str) + ':' + df['clicked_product'].astype(str)).tolist()
+    for i, key in enumerate(keys):
+        value = {column: counts[column][i] for column in COUNT_COLUMNS}
+        value.update((column, rates[column][i]) for column in RATE_COLUMNS)
+        yield key, json.dumps(value)
+
+
+def write_streams(df, out_dir, shard_map, csv_path=CSV_FILE):
+    streams = RespStreams(out_dir, shard_map)
+    csv_rows = len(df)
+    df = df.dropna(subset=['searched_query', 'clicked_product'])
+
+    metric_keys = 0
+    for key, value in metric_values(df):
+        streams.add('SET', key, value)
+        metric_keys += 1
+
+    # Same derived structures as the regular loaders
+    building_key = f'{QUERY_INDEX_KEY}{BUILD_SUFFIX}'
+    streams.add('DEL', building_key)
+    members = [index_member(query, viewers, products) for query, viewers, products in query_totals(df)]
+    for start in range(0, len(members), INDEX_CHUNK):
+        args = []
+        for member in members[start:start + INDEX_CHUNK]:
+            args.extend((0, member))
+        streams.add('ZADD', building_key, *args)
+    if members:
+        streams.add('RENAME', building_key, QUERY_INDEX_KEY)
+    streams.add('SET', FUZZY_INDEX_KEY, TrigramIndex.from_dataframe(df).to_bytes())
+    rollups = compute_rollups(df)
+    for product_id, rollup in rollups.items():
+        streams.add('SET', product_rollup_key(product_id), json.dumps(rollup))
+    # Added to, not replaced: the streams cannot know which products left the
+    # dataset, so the next regular load still finds and deletes their rollups
+    product_ids = list(rollups)
+    for start in range(0, len(product_ids), INDEX_CHUNK):
+        streams.add('SADD', PRODUCT_SET_KEY, *product_ids[start:start + INDEX_CHUNK])
+    version = dataset_version_from_csv(csv_path)
+    streams.add('DEL', DATASET_VERSION_KEY)
+    fields = dataset_version_fields(version, csv_path, csv_rows)
+    streams.add('HSET', DATASET_VERSION_KEY, *[item for pair in fields.items() for item in pair])
+
+    return {
+        'created_at': int(time.time()),
+        'csv_rows': csv_rows,
+        'skipped_rows': csv_rows - len(df),
+        'metric_keys': metric_keys,
+        'indexed_queries': len(members),
+        'product_rollups': len(rollups),
+        'dataset_version': version,
+        'total_commands': sum(stream['commands'] for stream in streams.streams),
+        'streams': streams.close(),
+    }
+
+
+def count_commands(path):
+    """Count RESP commands in a stream file, validating the framing as it goes"""
+    commands = 0
+    with open(path, 'rb') as f:
+        while True:
+            header = f.readline()
+            if not header:
+                return commands
+            if not header.startswith(b'*') or not header.endswith(b'\r\n'):
+                raise ValueError(f"{path}: bad command header at offset {f.tell() - len(header)}")
+            for _ in range(int(header[1:-2])):
+                length = f.readline()
+                if not length.startswith(b'$'):
+                    raise ValueError(f"{path}: bad bulk string header at offset {f.tell() - len(length)}")
+                f.seek(int(length[1:-2]) + 2, os.SEEK_CUR)
+            commands += 1
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_streams(out_dir):
+    """Check every stream against the manifest; returns a list of problems"""
+    with open(os.path.join(out_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    problems = []
+    for stream in manifest['streams']:
+        path = os.path.join(out_dir, stream['file'])
+        if not os.path.exists(path):
+            problems.append(f"{stream['file']}: missing")
+            continue
+        if os.path.getsize(path) != stream['bytes']:
+            problems.append(f"{stream['file']}: {os.path.getsize(path)} bytes, manifest says {stream['bytes']}")
+        if sha256_file(path) != stream['sha256']:
+            problems.append(f"{stream['file']}: checksum mismatch")
+        try:
+            commands = count_commands(path)
+        except ValueError as e:
+            problems.append(str(e))
+            continue
+        if commands != stream['commands']:
+            problems.append(f"{stream['file']}: {commands} commands, manifest says {stream['commands']}")
+    if sum(stream['commands'] for stream in manifest['streams']) != manifest['total_commands']:
+        problems.append("stream command counts do not add up to total_commands")
+    return manifest, problems
+
+
+def pipe_stream(path, host, port):
+    """Feed one stream to ``redis-cli --pipe``; returns ``(errors, replies)``"""
+    with open(path, 'rb') as f:
+        result = subprocess.run(['redis-cli', '-h', host, '-p', str(port), '--pipe'],
+                                stdin=f, capture_output=True, text=True)
+    match = re.search(r'errors:\s*(\d+),\s*replies:\s*(\d+)', result.stdout)
+    if result.returncode != 0 and not match:
+        raise RuntimeError(result.stderr.strip() or result.stdout.strip())
+    return int(match.group(1)), int(match.group(2))
+
+
+def pipe_streams(out_dir, host, port):
+    manifest, problems = verify_streams(out_dir)
+    if problems:
+        raise RuntimeError(f"refusing to load unverified streams: {problems}")
+
+    def load(stream):
+        node_host, node_port = stream['node'].rsplit(':', 1) if stream['node'] else (host, port)
+        errors, replies = pipe_stream(os.path.join(out_dir, stream['file']), node_host, node_port)
+        return stream, errors, replies
+
+    ok = True
+    with ThreadPoolExecutor(max_workers=len(manifest['streams'])) as pool:
+        for stream, errors, replies in pool.map(load, manifest['streams']):
+            target = stream['node'] or f"{host}:{port}"
+            complete = errors == 0 and replies == stream['commands']
+            ok &= complete
+            marker = '✅' if complete else '❌'
+            print(f"{marker} {stream['file']} -> {target}: {replies:,}/{stream['commands']:,} replies, "
+                  f"{errors} errors")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load the dataset via the RESP mass-insertion protocol')
+    sub = parser.add_subparsers(dest='command', required=True)
+    write = sub.add_parser('write', help='encode the CSV as RESP command streams')
+    write.add_argument('--csv', default=CSV_FILE)
+    write.add_argument('--out', default='resp_load')
+    layout = write.add_mutually_exclusive_group()
+    layout.add_argument('--shards', type=int, default=1, help='split evenly over N primaries')
+    layout.add_argument('--cluster', help='host:port of a cluster node to read the slot map from')
+    verify = sub.add_parser('verify', help='check streams against their manifest')
+    verify.add_argument('out')
+    pipe = sub.add_parser('pipe', help='verify, then load every stream with redis-cli --pipe')
+    pipe.add_argument('out')
+    pipe.add_argument('--host', default='localhost', help='target for streams without a cluster node')
+    pipe.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    if args.command == 'write':
+        print("🚀 Writing RESP mass-insertion streams")
+        print("=" * 40)
+        df = pd.read_csv(args.csv)
+        print(f"📈 Loaded {len(df):,} rows from {args.csv}")
+        shard_map = cluster_slot_map(args.cluster) if args.cluster else even_slot_map(args.shards)
+        started = time.time()
+        manifest = write_streams(df, args.out, shard_map, args.csv)
+        with open(os.path.join(args.out, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"✅ {manifest['total_commands']:,} commands ({manifest['metric_keys']:,} metric keys) "
+              f"in {time.time() - started:.1f}s")
+        for stream in manifest['streams']:
+            print(f"   {stream['file']}: {stream['commands']:,} commands, {stream['bytes']:,} bytes"
+                  f"{' -> ' + stream['node'] if stream['node'] else ''}")
+        if manifest['skipped_rows']:
+            print(f"⚠️  Skipped {manifest['skipped_rows']:,} rows without a query or product")
+
+    elif args.command == 'verify':
+        manifest, problems = verify_streams(args.out)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"✅ {len(manifest['streams'])} streams match the manifest "
+              f"({manifest['total_commands']:,} commands, {manifest['csv_rows']:,} CSV rows)")
+
+    elif args.command == 'pipe':
+        if not pipe_streams(args.out, args.host, args.port):
+            sys.exit(1)
+        print("🎉 Mass insertion complete")
+
+
+if __name__ == '__main__':
+    main()
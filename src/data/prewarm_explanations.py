@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+"""Pre-generate AI explanations for the highest-traffic query/product pairs.
+
+Pairs are ranked by ``viewers`` (from the metrics CSV, or from Redis when no
+CSV is available) and walked in that order until N pairs are found that are
+not cached yet and have course metadata. Metadata comes from the CSV's
+metadata columns, a ``--metadata`` JSON Lines file of ``productDetails``
+objects, or the ``metadata`` of the product rollups in Redis; pairs without a
+title are skipped, since an explanation without course context is worse than
+the one the extension generates on hover.
+
+The selected pairs are generated through a pluggable model backend by a pool
+of workers with a shared rate limit and retry/backoff, then written to the
+``ai_explanation:`` cache like the API server does, except that each entry
+starts with a hit count scaled from its viewers (``starting_hits``), so the
+cache policy keeps it as long as an entry that earned those hits. Progress is
+appended to a checkpoint file; on a rerun, pairs are still checked against
+the cache, so checkpointed pairs whose entry was evicted are generated again.
+
+Usage:
+    python3 src/data/prewarm_explanations.py --top 500 --concurrency 4 --rate 2
+    AI_BACKEND=stub python3 src/data/prewarm_explanations.py --top 50   # offline
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from explanation_backends import BackendNotConfigured, generate_explanation, load_backend  # noqa: E402
+from explanation_policy import ExplanationCachePolicy  # noqa: E402
+from explanation_store import ExplanationCodec, explanation_key  # noqa: E402
+from keyspace import is_metric_key  # noqa: E402
+from product_rollups import METADATA_COLUMNS, product_metadata, product_rollup_key  # noqa: E402
+from query_normalizer import QueryCanonicalizer  # noqa: E402
+
+CSV_FILE = '(Clone)_SearchQuery_productid_level_metric_2025_07_17.csv'
+DEFAULT_CHECKPOINT = 'prewarm_checkpoint.jsonl'
+
+
+def starting_hits(viewers):
+    """Hits a prewarmed entry starts with: log2 of the pair's viewers, at least one
+
+    Without them a prewarmed entry would be written like a fresh one (base TTL,
+    no hits) and be the first pick for eviction, though it was chosen for its
+    traffic.
+    """
+    return max(1, int(viewers or 0).bit_length())
+
+
+class RateLimiter:
+    """Token bucket shared by all workers (``rate`` requests per second)"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """Append-only record of finished pairs, used to resume interrupted runs"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    if entry.get('status') == 'ok':
+                        self.done.add(entry['key'])
+
+    def record(self, key, status, **details):
+        if not self.path:
+            return
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'key': key, 'status': status, 'at': int(time.time()), **details}) + '\n')
+            if status == 'ok':
+                self.done.add(key)
+
+
+class ProductMetadata:
+    """Course details for the prompt, by product id
+
+    Known details (CSV columns, ``--metadata`` file) are used first; other
+    products are looked up in their Redis rollup, one pipeline per page.
+    """
+
+    def __init__(self, client, known=None):
+        self.client = client
+        self.details = dict(known or {})
+        self.looked_up = set(self.details)
+
+    @classmethod
+    def load(cls, client, csv_path=None, metadata_path=None):
+        known = {}
+        if csv_path and os.path.exists(csv_path):
+            import pandas as pd
+
+            wanted = {'clicked_product', *METADATA_COLUMNS}
+            known.update(product_metadata(pd.read_csv(csv_path, usecols=lambda column: column in wanted)))
+        if metadata_path:
+            with open(metadata_path) as f:
+                for line in f:
+                    if line.strip():
+                        details = json.loads(line)
+                        known[str(details['productId'])] = details
+        return cls(client, known)
+
+    def fetch(self, product_ids):
+        """Look up the rollups of products not seen yet"""
+        missing = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in self.looked_up]
+        if not missing:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for product_id in missing:
+            pipe.get(product_rollup_key(product_id))
+        for product_id, value in zip(missing, pipe.execute()):
+            self.looked_up.add(product_id)
+            metadata = json.loads(value).get('metadata') if value else None
+            if metadata:
+                self.details[product_id] = metadata
+
+    def get(self, product_id):
+        """``productDetails`` for the prompt, or None without at least a title"""
+        details = self.details.get(product_id)
+        if not details or not details.get('title'):
+            return None
+        return {**details, 'productId': product_id}
+
+
+def rank_pairs_from_csv(path):
+    """Every query/product pair, most viewers first, using pandas for the ranking"""
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=['searched_query', 'clicked_product', 'viewers'])
+    df = df.dropna(subset=['searched_query', 'clicked_product'])
+    df['viewers'] = df['viewers'].fillna(0)
+    ranked = df.sort_values('viewers', ascending=False, kind='stable')
+    return list(zip(ranked['searched_query'].astype(str), ranked['clicked_product'].astype(str),
+                    ranked['viewers'].astype(int)))
+
+
+def rank_pairs_from_redis(client, batch_size=1000):
+    """Every query/product pair, most viewers first, scanning the metrics keyspace"""
+    ranked = []
+    batch = []
+
+    def consume(keys):
+        for key, value in zip(keys, client.mget(keys)):
+            if not value:
+                continue
+            query, _, product_id = key.partition(':')
+            ranked.append((json.loads(value).get('viewers', 0), query, product_id))
+
+    for key in client.scan_iter(count=batch_size):
+        if not is_metric_key(key):
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            consume(batch)
+            batch = []
+    if batch:
+        consume(batch)
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return [(query, product_id, viewers) for viewers, query, product_id in ranked]
+
+
+def filter_uncached(client, pairs, top_n, metadata, canonicalizer=None, batch_size=500):
+    """The first ``top_n`` ranked pairs that have metadata and are not cached
+
+    Pages through the whole ranking until ``top_n`` are found. Returns
+    ``(selected, skipped)``, where ``skipped`` counts the pairs passed over
+    for lack of metadata and each item is
+    ``(cache_key, query, product_id, viewers, product_details)``.
+    """
+    canonicalizer = canonicalizer or QueryCanonicalizer.from_env()
+    selected = []
+    skipped = 0
+    seen = set()
+    for start in range(0, len(pairs), batch_size):
+        page = pairs[start:start + batch_size]
+        metadata.fetch(product_id for _, product_id, _ in page)
+        chunk = []
+        for query, product_id, viewers in page:
+            # Variants of one query share a canonical key; generate it once
+            cache_key = canonicalizer.canonical_key(f"{query}:{product_id}")
+            if cache_key in seen:
+                continue
+            seen.add(cache_key)
+            details = metadata.get(product_id)
+            if details is None:
+                skipped += 1
+                continue
+            chunk.append((cache_key, query, product_id, viewers, details))
+        if not chunk:
+            continue
+        # The cache, not the checkpoint, decides: evicted entries are generated again
+        pipe = client.pipeline(transaction=False)
+        for cache_key, *_ in chunk:
+            pipe.exists(explanation_key(cache_key))
+        for item, exists in zip(chunk, pipe.execute()):
+            if not exists:
+                selected.append(item)
+                if len(selected) >= top_n:
+                    return selected, skipped
+    return selected, skipped
+
+
+def generate_with_retry(backend, limiter, query, product_details, retries, base_delay):
+    """Call the backend with exponential backoff (plus jitter) between attempts"""
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return generate_explanation(backend, 'FALLBACK_MODE', product_details, query)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(base_delay * 2 ** attempt * (1 + random.random()))
+
+
+def prewarm(client, pairs, backend, concurrency=4, rate=2.0, retries=3, base_delay=1.0,
+            checkpoint=None, codec=None, policy=None):
+    """Generate and cache explanations for ``filter_uncached`` items"""
+    checkpoint = checkpoint or Checkpoint(None)
+    codec = codec or ExplanationCodec()
+    policy = policy or ExplanationCachePolicy.from_env()
+    limiter = RateLimiter(rate, burst=concurrency)
+    stats = {'generated': 0, 'failed': 0}
+
+    def work(cache_key, query, product_id, viewers, product_details):
+        result = generate_with_retry(backend, limiter, query, product_details, retries, base_delay)
+        cache_entry = {
+            **result,
+            'cached_at': int(time.time()),
+            'query': query,
+            'productId': product_id,
+            'title': product_details['title'],
+            'prewarmed': True
+        }
+        policy.record_write(client, cache_key, codec.encode(cache_entry), starting_hits(viewers))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(work, cache_key, query, product_id, viewers, details): (cache_key, viewers)
+                   for cache_key, query, product_id, viewers, details in pairs}
+        for future in as_completed(futures):
+            cache_key, viewers = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                stats['failed'] += 1
+                checkpoint.record(cache_key, 'failed', error=str(e))
+                print(f"❌ {cache_key}: {e}")
+                continue
+            stats['generated'] += 1
+            checkpoint.record(cache_key, 'ok', viewers=viewers)
+            done = stats['generated'] + stats['failed']
+            if done % 25 == 0:
+                print(f"⏳ {done}/{len(pairs)} pairs processed...")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate AI explanations for top traffic pairs')
+    parser.add_argument('--top', type=int, default=100, help='number of uncached pairs to generate')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2.0, help='max generations per second (0 = unlimited)')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=1.0, help='base retry delay in seconds')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="progress file ('' to disable)")
+    parser.add_argument('--csv', default=CSV_FILE, help='metrics CSV used for ranking (and metadata columns)')
+    parser.add_argument('--metadata', default=None, help='JSON Lines file of productDetails objects')
+    parser.add_argument('--backend', default=None, help='openai, stub or module:Class (default: AI_BACKEND)')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--dry-run', action='store_true', help='only list the pairs that would be generated')
+    args = parser.parse_args()
+
+    print("🚀 Explanation Pre-warming Job")
+    print("=" * 35)
+
+    client = redis.Redis(host=args.host, port=args.port, decode_responses=True, socket_timeout=5)
+    client.ping()
+    codec = ExplanationCodec()
+    codec.load_dictionaries(client)
+    checkpoint = Checkpoint(args.checkpoint)
+    if checkpoint.done:
+        print(f"📌 Resuming: {len(checkpoint.done)} pairs done according to {args.checkpoint}")
+
+    if os.path.exists(args.csv):
+        print(f"📊 Ranking pairs by viewers from {args.csv}")
+        ranked = rank_pairs_from_csv(args.csv)
+    else:
+        print("📊 CSV not found, ranking pairs by viewers from Redis")
+        ranked = rank_pairs_from_redis(client)
+    metadata = ProductMetadata.load(client, args.csv, args.metadata)
+
+    pairs, skipped = filter_uncached(client, ranked, args.top, metadata)
+    print(f"🎯 {len(pairs)} uncached pairs selected (of {len(ranked)} ranked)")
+    if skipped:
+        print(f"⚠️  Skipped {skipped} pairs without course metadata (add --metadata or metadata columns)")
+    evicted = sum(1 for cache_key, *_ in pairs if cache_key in checkpoint.done)
+    if evicted:
+        print(f"♻️  {evicted} checkpointed pairs were evicted from the cache and will be generated again")
+    if args.dry_run:
+        for cache_key, _, _, viewers, details in pairs:
+            print(f"   {cache_key} ({viewers:,} viewers) - {details['title']}")
+        return
+
+    try:
+        backend = load_backend(args.backend)
+    except BackendNotConfigured as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"🤖 Backend: {type(backend).__name__}, concurrency {args.concurrency}, rate {args.rate}/s")
+    started = time.time()
+    stats = prewarm(client, pairs, backend, concurrency=args.concurrency, rate=args.rate,
+                    retries=args.retries, base_delay=args.backoff, checkpoint=checkpoint, codec=codec)
+    print(f"✅ Generated {stats['generated']} explanations in {time.time() - started:.1f}s")
+    if stats['failed']:
+        print(f"⚠️  {stats['failed']} pairs failed; rerun to retry them")
+
+
+if __name__ == '__main__':
+    main()
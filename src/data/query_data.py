@@ -1,8 +1,22 @@
 #!/usr/bin/env python3
 
+import heapq
 import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from redis.cluster import RedisCluster
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from query_index import lookup_prefix
+from keyspace import INTERNAL_PREFIXES, is_metric_key
+
+SCAN_COUNT = 1000
+BATCH_SIZE = 500
+TOP_K = 10
+DISTRIBUTION_METRICS = ['viewers', 'ctr', 'enrollment_rate']
+
 def connect_to_cluster():
     """Connect to Redis cluster"""
     startup_nodes = [{"host": "localhost", "port": 7001}]
@@ -55,19 +69,166 @@ def query_examples(rc):
     # Search query analysis
     search_queries = set()
     for key in list(rc.scan_iter(count=1000)):
+        if key.startswith(INTERNAL_PREFIXES):
+            continue
         query = key.split(':')[0]
         search_queries.add(query)
     
     print(f"🔍 Unique search queries found: {len(search_queries)}")
     print(f"📝 Sample queries: {', '.join(list(search_queries)[:5])}")
 
+class NodeStats:
+    """Aggregates for the metric keys of one primary; merged after the scans
+
+    ``values`` keeps every key's distribution metrics for exact percentiles,
+    so memory grows with the key count (roughly 100 bytes per key as Python
+    floats in lists). For tens of millions of keys, narrow the report with a
+    match pattern.
+    """
+
+    def __init__(self, top_k=TOP_K):
+        self.top_k = top_k
+        self.keys = 0
+        self.skipped = 0
+        self.query_viewers = {}
+        self.values = {metric: [] for metric in DISTRIBUTION_METRICS}
+        self.top_enrollment = []
+
+    def add_batch(self, keys, values):
+        pairs = [(key, value) for key, value in zip(keys, values) if value is not None]
+        if not pairs:
+            return
+        # One parse per batch instead of one json.loads per key; a malformed
+        # value falls back to per-key parsing so it only costs its own key
+        try:
+            records = json.loads('[' + ','.join(value for _, value in pairs) + ']')
+        except ValueError:
+            records = [_loads_or_none(value) for _, value in pairs]
+        query_viewers = self.query_viewers
+        for (key, _), data in zip(pairs, records):
+            if not isinstance(data, dict):
+                self.skipped += 1
+                continue
+            self.keys += 1
+            viewers = data.get('viewers') or 0
+            query = key.rpartition(':')[0]
+            query_viewers[query] = query_viewers.get(query, 0) + viewers
+            for metric in DISTRIBUTION_METRICS:
+                self.values[metric].append(data.get(metric) or 0)
+            entry = (data.get('enrollment_rate') or 0, viewers, key)
+            if len(self.top_enrollment) < self.top_k:
+                heapq.heappush(self.top_enrollment, entry)
+            elif entry > self.top_enrollment[0]:
+                heapq.heapreplace(self.top_enrollment, entry)
+
+    def merge(self, other):
+        self.keys += other.keys
+        self.skipped += other.skipped
+        for query, viewers in other.query_viewers.items():
+            self.query_viewers[query] = self.query_viewers.get(query, 0) + viewers
+        for metric in DISTRIBUTION_METRICS:
+            self.values[metric].extend(other.values[metric])
+        self.top_enrollment = heapq.nlargest(self.top_k, self.top_enrollment + other.top_enrollment)
+        heapq.heapify(self.top_enrollment)
+
+def _loads_or_none(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+def scan_node(connection, match='*', top_k=TOP_K, batch_size=BATCH_SIZE):
+    """Scan one primary and fetch its metric values in pipelined batches.
+
+    Keys on one node still live in different hash slots, so the batch is a
+    pipeline of GETs rather than a (cross-slot) MGET.
+    """
+    stats = NodeStats(top_k)
+    batch = []
+
+    def flush():
+        pipe = connection.pipeline(transaction=False)
+        for key in batch:
+            pipe.get(key)
+        stats.add_batch(batch, pipe.execute())
+        batch.clear()
+
+    for key in connection.scan_iter(match=match, count=SCAN_COUNT):
+        if not is_metric_key(key):
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
+
+def cluster_analytics(rc, match='*', top_k=TOP_K, batch_size=BATCH_SIZE):
+    """Scan every primary concurrently and merge the per-node aggregates"""
+    primaries = rc.get_primaries()
+    stats = NodeStats(top_k)
+    with ThreadPoolExecutor(max_workers=max(len(primaries), 1)) as executor:
+        futures = [executor.submit(scan_node, rc.get_redis_connection(node), match, top_k, batch_size)
+                   for node in primaries]
+        for future in futures:
+            stats.merge(future.result())
+    return stats, len(primaries)
+
+def distribution(values):
+    """min / percentiles / max / mean of one metric"""
+    import numpy as np
+
+    if not values:
+        return None
+    array = np.asarray(values, dtype=float)
+    p50, p90, p99 = np.percentile(array, [50, 90, 99])
+    return {'min': float(array.min()), 'p50': float(p50), 'p90': float(p90), 'p99': float(p99),
+            'max': float(array.max()), 'mean': float(array.mean())}
+
+def analytics_report(rc, match='*', top_k=TOP_K):
+    """Full-cluster report: unique queries, metric distributions and top-K lists"""
+    print("\n📊 Redis Cluster Analytics")
+    print("=" * 50)
+
+    started = time.time()
+    stats, nodes = cluster_analytics(rc, match, top_k)
+    elapsed = time.time() - started
+
+    print(f"🔢 Metric keys: {stats.keys:,} (scanned {nodes} primaries in {elapsed:.1f}s)")
+    print(f"🔍 Unique search queries: {len(stats.query_viewers):,}")
+    if stats.skipped:
+        print(f"⚠️  Skipped {stats.skipped:,} keys whose value is not a metrics document")
+
+    print(f"\n📈 Metric distributions:")
+    for metric in DISTRIBUTION_METRICS:
+        summary = distribution(stats.values[metric])
+        if summary is None:
+            continue
+        print(f"  {metric:16} min {summary['min']:,.2f}  p50 {summary['p50']:,.2f}  "
+              f"p90 {summary['p90']:,.2f}  p99 {summary['p99']:,.2f}  max {summary['max']:,.2f}  "
+              f"mean {summary['mean']:,.2f}")
+
+    print(f"\n👥 Top {top_k} queries by viewers:")
+    top_queries = heapq.nlargest(top_k, stats.query_viewers.items(), key=lambda item: item[1])
+    for i, (query, viewers) in enumerate(top_queries, 1):
+        print(f"  {i}. {query} - {viewers:,} viewers")
+
+    print(f"\n🏆 Top {top_k} pairs by enrollment rate:")
+    for i, (rate, viewers, key) in enumerate(sorted(stats.top_enrollment, reverse=True), 1):
+        print(f"  {i}. {key} - {rate:.2f}% ({viewers:,} viewers)")
+
+    return stats
+
+
 def interactive_query(rc):
     """Interactive query mode"""
     print("\n🎮 Interactive Query Mode")
     print("Commands:")
     print("  get <key>           - Get data for specific key")
     print("  search <query>      - Find all products for search query")
+    print("  queries <prefix>    - List known search queries starting with prefix")
     print("  stats               - Show cluster statistics")
+    print("  analytics [pattern] - Full-cluster report (parallel per-node scans)")
     print("  quit                - Exit")
     print()
     
@@ -103,6 +264,18 @@ def interactive_query(rc):
                 else:
                     print(f"No products found for '{query}'")
                     
+            elif command.startswith('queries'):
+                prefix = command[8:]
+                queries = lookup_prefix(rc, prefix, limit=20)
+                if queries:
+                    for entry in queries:
+                        print(f"  {entry['query']}  ({entry['viewers']:,} viewers, {entry['products']} products)")
+                else:
+                    print(f"No indexed queries start with '{prefix}' (run the loader to build the index)")
+                    
+            elif command.startswith('analytics'):
+                analytics_report(rc, command[10:].strip() or '*')
+                    
             elif command == 'stats':
                 print(f"Total keys: {rc.dbsize():,}")
                 print(f"Cluster info: {rc.cluster_info()}")
@@ -123,6 +296,11 @@ def main():
     if not rc:
         return
     
+    # `query_data.py analytics [pattern]` prints the full report and exits
+    if len(sys.argv) > 1 and sys.argv[1] == 'analytics':
+        analytics_report(rc, sys.argv[2] if len(sys.argv) > 2 else '*')
+        return
+    
     # Run example queries
     query_examples(rc)
     
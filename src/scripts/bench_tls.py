@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""TLS startup and handshake benchmark for the HTTPS API server.
+
+Measures, per key type (ECDSA P-256 and RSA 2048):
+
+* startup - creating the key and certificate (first start, or after expiry)
+  against loading the cached pair (every other start)
+* handshakes/s - full handshakes against resumed ones (session tickets),
+  on a local TLS echo server with the server's own ``SSLContext``
+
+With ``--target host:port`` the handshakes go to a running server instead
+(for example ``python3 src/api/api_server_https.py`` on 5443).
+
+Usage:
+    python3 src/scripts/bench_tls.py
+    python3 src/scripts/bench_tls.py --handshakes 500 --target localhost:5443
+"""
+
+import argparse
+import os
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from tls_certs import KEY_TYPES, load_or_create_certificate, server_context  # noqa: E402
+
+
+def time_startup(key_type, cert_dir):
+    """``(create_ms, load_ms)`` for one key type"""
+    started = time.perf_counter()
+    load_or_create_certificate(cert_dir, key_type)
+    created = time.perf_counter() - started
+    started = time.perf_counter()
+    cert_path, key_path, info = load_or_create_certificate(cert_dir, key_type)
+    server_context(cert_path, key_path)
+    loaded = time.perf_counter() - started
+    assert not info['created'], "cached certificate was not reused"
+    return created * 1000, loaded * 1000
+
+
+def echo_server(context):
+    """Local TLS server answering one byte per connection; returns its port"""
+    listener = socket.create_server(('127.0.0.1', 0))
+
+    def serve():
+        while True:
+            conn, _ = listener.accept()
+            try:
+                with context.wrap_socket(conn, server_side=True) as tls:
+                    tls.sendall(tls.recv(1))
+            except (OSError, ssl.SSLError):
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def client_context(cafile=None):
+    context = ssl.create_default_context(cafile=cafile)
+    if cafile is None:
+        # A running server's self-signed cert: measuring, not authenticating
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def handshake(context, host, port, session=None):
+    with socket.create_connection((host, port)) as raw:
+        with context.wrap_socket(raw, server_hostname=host, session=session) as tls:
+            # TLS 1.3 tickets arrive after the handshake; one exchange picks them up
+            tls.sendall(b'x')
+            tls.recv(1)
+            return tls.session, tls.session_reused
+
+
+def time_handshakes(context, host, port, count, resume):
+    """``(handshakes_per_second, resumed_fraction)``"""
+    session, _ = handshake(context, host, port)
+    resumed = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        new_session, reused = handshake(context, host, port, session if resume else None)
+        resumed += reused
+        session = new_session if resume else session
+    return count / (time.perf_counter() - started), resumed / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handshakes', type=int, default=200, help='handshakes per measurement')
+    parser.add_argument('--target', help='host:port of a running HTTPS server')
+    args = parser.parse_args()
+
+    print("🔐 TLS Startup & Handshake Benchmark")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Pay the cryptography import outside the measurements
+        load_or_create_certificate(os.path.join(tmp, 'warmup'))
+        print("\n⏱️  Startup (certificate ready + SSLContext)")
+        for key_type in KEY_TYPES:
+            created, loaded = time_startup(key_type, os.path.join(tmp, key_type))
+            print(f"   {key_type:<6} create {created:8.1f}ms   cached {loaded:6.1f}ms")
+
+        print(f"\n🤝 Handshakes ({args.handshakes} per run)")
+        if args.target:
+            host, _, port = args.target.rpartition(':')
+            targets = [(args.target, client_context(), host, int(port))]
+        else:
+            targets = []
+            for key_type in KEY_TYPES:
+                cert_path, key_path, _ = load_or_create_certificate(os.path.join(tmp, key_type), key_type)
+                port = echo_server(server_context(cert_path, key_path))
+                targets.append((key_type, client_context(cert_path), 'localhost', port))
+
+        for label, context, host, port in targets:
+            full, _ = time_handshakes(context, host, port, args.handshakes, resume=False)
+            resumed, fraction = time_handshakes(context, host, port, args.handshakes, resume=True)
+            print(f"   {label:<6} full {full:8.0f}/s   resumed {resumed:8.0f}/s "
+                  f"({fraction:.0%} resumed, {resumed / full:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+
+"""In-memory Redis stand-in for running the API servers without external services.
+
+The stand-in plugs in at the connection level, so a real ``redis.Redis`` client
+(response callbacks, pipelines, ``decode_responses``) talks to it exactly as it
+would to a server. Every command and every network round trip is recorded so
+callers can assert on how much Redis work a code path does.
+"""
+
+import fnmatch
+import hashlib
+import math
+import os
+import sys
+import time
+
+import redis
+from redis.connection import Connection, ConnectionPool
+from redis.exceptions import NoScriptError, ResponseError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from redis_scripts import SCRIPTS  # noqa: E402
+
+
+class CommandLog:
+    """Records commands, touched keys and round trips issued against the stand-in"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = []
+        self.keys = []
+        self.round_trips = 0
+
+    def record(self, name, keys):
+        self.commands.append(name)
+        self.keys.extend(keys)
+
+    def summary(self):
+        return {
+            'commands': len(self.commands),
+            'round_trips': self.round_trips,
+            'keys': len(self.keys),
+            'command_names': list(self.commands),
+        }
+
+
+def _key_args(name, args):
+    """Return the key arguments of a command (the subset the stand-in knows about)"""
+    if name in ('PING', 'DBSIZE', 'KEYS', 'SCAN', 'MULTI', 'EXEC', 'SCRIPT', 'INFO'):
+        return []
+    if name in ('DEL', 'UNLINK', 'EXISTS', 'MGET'):
+        return list(args)
+    if name == 'MSET':
+        return list(args[0::2])
+    if name in ('EVAL', 'EVALSHA'):
+        return list(args[2:2 + int(args[1])])
+    return list(args[:1])
+
+
+class StandInServer:
+    """A single-node keyspace implementing the commands the API servers use"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.scripts = {}
+        self.log = CommandLog()
+
+    # -- keyspace helpers -------------------------------------------------
+
+    def _alive(self, key):
+        expire_at = self.expires.get(key)
+        if expire_at is not None and expire_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _get(self, key, kind):
+        if not self._alive(key):
+            return None
+        found_kind, value = self.data[key]
+        if found_kind != kind:
+            raise ResponseError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    def _delete(self, key):
+        existed = self._alive(key)
+        self.data.pop(key, None)
+        self.expires.pop(key, None)
+        return int(existed)
+
+    def _live_keys(self):
+        return [key for key in list(self.data) if self._alive(key)]
+
+    @staticmethod
+    def _match(key, pattern):
+        return pattern is None or fnmatch.fnmatchcase(key.decode('utf-8', 'replace'),
+                                                       pattern.decode('utf-8', 'replace'))
+
+    def seed(self, mapping):
+        """Load plain string values directly, without recording commands"""
+        for key, value in mapping.items():
+            key = key.encode() if isinstance(key, str) else key
+            value = value.encode() if isinstance(value, str) else value
+            self.data[key] = ('string', value)
+
+    # -- command dispatch -------------------------------------------------
+
+    def execute(self, args):
+        # redis-py sends some subcommands as one word ("SCRIPT LOAD")
+        name = args[0].decode().upper().replace(' ', '_')
+        rest = list(args[1:])
+        if name in ('SCRIPT', 'MEMORY') and rest:
+            name = f"{name}_{rest.pop(0).decode().upper()}"
+        self.log.record(name, _key_args(name.split('_')[0], rest))
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            return ResponseError(f"ERR unknown command '{name}' in stand-in")
+        try:
+            return handler(*rest)
+        except ResponseError as e:
+            return e
+
+    def cmd_ping(self, *args):
+        return b'PONG'
+
+    def cmd_dbsize(self):
+        return len(self._live_keys())
+
+    def cmd_get(self, key):
+        return self._get(key, 'string')
+
+    def cmd_set(self, key, value, *options):
+        options = [o.upper() if isinstance(o, bytes) else o for o in options]
+        if b'NX' in options and self._alive(key):
+            return None
+        if b'XX' in options and not self._alive(key):
+            return None
+        self._delete(key)
+        self.data[key] = ('string', value)
+        if b'EX' in options:
+            self.expires[key] = time.time() + int(options[options.index(b'EX') + 1])
+        return b'OK'
+
+    def cmd_setex(self, key, seconds, value):
+        self.cmd_set(key, value)
+        self.expires[key] = time.time() + int(seconds)
+        return b'OK'
+
+    def cmd_mget(self, *keys):
+        return [self._get(key, 'string') for key in keys]
+
+    def cmd_mset(self, *pairs):
+        for key, value in zip(pairs[0::2], pairs[1::2]):
+            self.cmd_set(key, value)
+        return b'OK'
+
+    def cmd_del(self, *keys):
+        return sum(self._delete(key) for key in keys)
+
+    cmd_unlink = cmd_del
+
+    def cmd_rename(self, key, new_key):
+        if not self._alive(key):
+            raise ResponseError('ERR no such key')
+        self._delete(new_key)
+        self.data[new_key] = self.data.pop(key)
+        if key in self.expires:
+            self.expires[new_key] = self.expires.pop(key)
+        return b'OK'
+
+    def cmd_exists(self, *keys):
+        return sum(int(self._alive(key)) for key in keys)
+
+    def cmd_expire(self, key, seconds, *options):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.time() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key):
+        if not self._alive(key):
+            return -2
+        if key not in self.expires:
+            return -1
+        return int(self.expires[key] - time.time())
+
+    def cmd_strlen(self, key):
+        value = self._get(key, 'string')
+        return len(value) if value is not None else 0
+
+    def cmd_incrby(self, key, amount):
+        value = int(self._get(key, 'string') or 0) + int(amount)
+        self.data[key] = ('string', str(value).encode())
+        return value
+
+    def cmd_decrby(self, key, amount):
+        return self.cmd_incrby(key, -int(amount))
+
+    # -- hashes -----------------------------------------------------------
+
+    def _hash(self, key, create=False):
+        value = self._get(key, 'hash')
+        if value is None and create:
+            value = {}
+            self.data[key] = ('hash', value)
+        return value
+
+    def cmd_hset(self, key, *pairs):
+        fields = self._hash(key, create=True)
+        added = 0
+        for field, value in zip(pairs[0::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        return added
+
+    def cmd_hget(self, key, field):
+        return (self._hash(key) or {}).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        values = self._hash(key) or {}
+        return [values.get(field) for field in fields]
+
+    def cmd_hgetall(self, key):
+        return [item for pair in (self._hash(key) or {}).items() for item in pair]
+
+    def cmd_hdel(self, key, *fields):
+        values = self._hash(key) or {}
+        return sum(values.pop(field, None) is not None for field in fields)
+
+    def cmd_hincrby(self, key, field, amount):
+        fields = self._hash(key, create=True)
+        fields[field] = str(int(fields.get(field, 0)) + int(amount)).encode()
+        return int(fields[field])
+
+    # -- sets ---------------------------------------------------------------
+
+    def _set(self, key, create=False):
+        value = self._get(key, 'set')
+        if value is None and create:
+            value = set()
+            self.data[key] = ('set', value)
+        return value
+
+    def cmd_sadd(self, key, *members):
+        values = self._set(key, create=True)
+        added = len(set(members) - values)
+        values.update(members)
+        return added
+
+    def cmd_smembers(self, key):
+        return sorted(self._set(key) or ())
+
+    # -- sorted sets --------------------------------------------------------
+
+    @staticmethod
+    def _score(score):
+        return (f"{score:.17g}").encode()
+
+    def _zset(self, key, create=False):
+        value = self._get(key, 'zset')
+        if value is None and create:
+            value = {}
+            self.data[key] = ('zset', value)
+        return value
+
+    def _zsorted(self, key):
+        return sorted((self._zset(key) or {}).items(), key=lambda item: (item[1], item[0]))
+
+    def cmd_zadd(self, key, *args):
+        args = list(args)
+        flags = set()
+        while args and args[0].upper() in (b'NX', b'XX', b'GT', b'LT', b'CH', b'INCR'):
+            flags.add(args.pop(0).upper())
+        members = self._zset(key, create=True)
+        changed = 0
+        result = None
+        for score, member in zip(args[0::2], args[1::2]):
+            exists = member in members
+            if (b'NX' in flags and exists) or (b'XX' in flags and not exists):
+                continue
+            score = float(score)
+            if b'INCR' in flags:
+                score += members.get(member, 0.0)
+            changed += not exists or members[member] != score
+            members[member] = score
+            result = score
+        if not members:
+            self.data.pop(key, None)
+        if b'INCR' in flags:
+            return None if result is None else self._score(result)
+        return changed
+
+    def cmd_zincrby(self, key, amount, member):
+        members = self._zset(key, create=True)
+        members[member] = members.get(member, 0.0) + float(amount)
+        return self._score(members[member])
+
+    def cmd_zscore(self, key, member):
+        score = (self._zset(key) or {}).get(member)
+        return None if score is None else self._score(score)
+
+    def cmd_zmscore(self, key, *members):
+        scores = self._zset(key) or {}
+        return [None if scores.get(m) is None else self._score(scores[m]) for m in members]
+
+    def cmd_zcard(self, key):
+        return len(self._zset(key) or {})
+
+    def cmd_zrem(self, key, *members):
+        scores = self._zset(key) or {}
+        return sum(scores.pop(member, None) is not None for member in members)
+
+    def cmd_zrange(self, key, start, stop, *options):
+        items = self._zsorted(key)
+        start, stop = int(start), int(stop)
+        stop = len(items) + stop if stop < 0 else stop
+        items = items[start:stop + 1]
+        if b'WITHSCORES' in [o.upper() for o in options]:
+            return [part for member, score in items for part in (member, self._score(score))]
+        return [member for member, _ in items]
+
+    @staticmethod
+    def _lex_bound(bound, lower):
+        """Predicate for one ZRANGEBYLEX bound (``-``, ``+``, ``[value`` or ``(value``)"""
+        if bound in (b'-', b'+'):
+            unbounded = (bound == b'-') == lower
+            return lambda member: unbounded
+        value, inclusive = bound[1:], bound[:1] == b'['
+        if lower:
+            return lambda member: member >= value if inclusive else member > value
+        return lambda member: member <= value if inclusive else member < value
+
+    def cmd_zrangebylex(self, key, low, high, *options):
+        above, below = self._lex_bound(low, True), self._lex_bound(high, False)
+        members = sorted(member for member in (self._zset(key) or {}) if above(member) and below(member))
+        options = list(options)
+        if options and options[0].upper() == b'LIMIT':
+            offset, count = int(options[1]), int(options[2])
+            members = members[offset:] if count < 0 else members[offset:offset + count]
+        return members
+
+    def cmd_keys(self, pattern=b'*'):
+        return [key for key in self._live_keys() if self._match(key, pattern)]
+
+    def cmd_scan(self, cursor, *options):
+        # The whole keyspace is returned in one page; cursor 0 ends the iteration
+        pattern = None
+        options = list(options)
+        if b'MATCH' in options:
+            pattern = options[options.index(b'MATCH') + 1]
+        return [b'0', [key for key in self._live_keys() if self._match(key, pattern)]]
+
+
+    # -- scripting ----------------------------------------------------------
+    # Scripts from redis_scripts run as Python equivalents; the commands they
+    # issue happen "inside Redis", so only the EVALSHA itself is logged.
+
+    def cmd_script_load(self, source):
+        sha = hashlib.sha1(source).hexdigest()
+        if sha not in SCRIPT_EQUIVALENTS:
+            raise ResponseError('ERR the stand-in has no Python equivalent for this script')
+        self.scripts[sha] = SCRIPT_EQUIVALENTS[sha]
+        return sha.encode()
+
+    def cmd_script_flush(self, *options):
+        self.scripts.clear()
+        return b'OK'
+
+    def cmd_evalsha(self, sha, numkeys, *rest):
+        script = self.scripts.get(sha.decode())
+        if script is None:
+            raise NoScriptError('No matching script. Please use EVAL.')
+        numkeys = int(numkeys)
+        return script(self, list(rest[:numkeys]), list(rest[numkeys:]))
+
+    def load_scripts(self):
+        """Register every library script, as the servers do at startup"""
+        for source in SCRIPTS.values():
+            self.cmd_script_load(source.encode('utf-8'))
+
+
+def _lookup_fallback(server, keys, args):
+    for index, key in enumerate(keys, 1):
+        value = server.cmd_get(key)
+        if value is not None:
+            return [index, value]
+    return None
+
+
+def _token_bucket(server, keys, args):
+    rate, burst, cost, now = (float(arg) for arg in args)
+    if rate <= 0:
+        raise ResponseError('ERR token bucket rate must be positive')
+    tokens, updated = server.cmd_hmget(keys[0], b'tokens', b'updated')
+    tokens = float(tokens) if tokens is not None else burst
+    updated = float(updated) if updated is not None else now
+    tokens = min(burst, tokens + max(now - updated, 0) * rate / 1000)
+    wait = 0
+    if tokens >= cost:
+        tokens -= cost
+    else:
+        wait = math.ceil((cost - tokens) * 1000 / rate)
+    server.cmd_hset(keys[0], b'tokens', repr(tokens).encode(), b'updated', repr(now).encode())
+    server.cmd_expire(keys[0], math.ceil(burst / rate) + 1)
+    return wait
+
+
+SCRIPT_EQUIVALENTS = {
+    hashlib.sha1(SCRIPTS[name].encode('utf-8')).hexdigest(): equivalent
+    for name, equivalent in (('lookup_fallback', _lookup_fallback), ('token_bucket', _token_bucket))
+}
+
+
+class StandInConnection(Connection):
+    """Connection that hands commands to a ``StandInServer`` instead of a socket"""
+
+    def __init__(self, server=None, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server
+        self._responses = []
+        self._in_multi = False
+        self._queued = []
+
+    def connect(self):
+        self._sock = True
+
+    def disconnect(self, *args):
+        self._sock = None
+        self._responses = []
+
+    def can_read(self, timeout=0):
+        return False
+
+    def pack_command(self, *args):
+        return [tuple(self.encoder.encode(arg) for arg in args)]
+
+    def pack_commands(self, commands):
+        return [tuple(self.encoder.encode(arg) for arg in args) for args in commands]
+
+    def send_packed_command(self, command, check_health=True):
+        self.server.log.round_trips += 1
+        for args in command:
+            self._responses.append(self._dispatch(args))
+
+    def send_command(self, *args, **kwargs):
+        self.send_packed_command(self.pack_command(*args))
+
+    def _dispatch(self, args):
+        name = args[0].upper()
+        if name == b'MULTI':
+            self._in_multi, self._queued = True, []
+            return b'OK'
+        if name == b'EXEC':
+            self._in_multi = False
+            return [self.server.execute(queued) for queued in self._queued]
+        if self._in_multi:
+            self._queued.append(args)
+            return b'QUEUED'
+        return self.server.execute(args)
+
+    def read_response(self, disable_decoding=False, **kwargs):
+        response = self._responses.pop(0)
+        if isinstance(response, ResponseError):
+            raise response
+        if disable_decoding:
+            return response
+        return self._decode(response)
+
+    def _decode(self, response):
+        if isinstance(response, list):
+            return [self._decode(item) for item in response]
+        return self.encoder.decode(response)
+
+
+def standin_client(server=None, decode_responses=True):
+    """Return a ``redis.Redis`` client wired to ``server`` (a new one if omitted)"""
+    server = server or StandInServer()
+    pool = ConnectionPool(connection_class=StandInConnection, server=server,
+                          decode_responses=decode_responses)
+    client = redis.Redis(connection_pool=pool)
+    client.server = server
+    return client
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""Token buckets, route costs and concurrency caps in ``admission``.
+
+``python3 -m pytest src/scripts``; the Redis store runs on the stand-in.
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask, jsonify
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+import admission  # noqa: E402
+from admission import AdmissionController, ConcurrencyLimits, MemoryBuckets, RedisBuckets  # noqa: E402
+from redis_scripts import RATE_LIMIT_PREFIX, ScriptLibrary  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the ``time`` module inside ``admission``"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FailingClient:
+    def evalsha(self, *args):
+        raise ConnectionError('Redis unavailable')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission, 'time', clock)
+    return clock
+
+
+def test_from_env_is_opt_in(monkeypatch):
+    for name in ('ADMISSION_CONTROL', 'ADMISSION_RATE', 'ADMISSION_BURST', 'ADMISSION_LIMIT_LOOPBACK'):
+        monkeypatch.delenv(name, raising=False)
+    assert not AdmissionController.from_env().enabled
+    monkeypatch.setenv('ADMISSION_CONTROL', '1')
+    controller = AdmissionController.from_env()
+    assert controller.enabled
+    assert not controller.limit_loopback
+
+
+@pytest.mark.parametrize('name, value', [('ADMISSION_RATE', '0'), ('ADMISSION_RATE', '-5'),
+                                         ('ADMISSION_BURST', '0')])
+def test_from_env_rejects_non_positive_rate(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ValueError):
+        AdmissionController.from_env()
+
+
+def test_bucket_refills_at_rate(clock):
+    buckets = MemoryBuckets()
+    assert buckets.take('a', rate=2, burst=3, cost=3) == 0
+    assert buckets.take('a', rate=2, burst=3, cost=1) == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert buckets.take('a', rate=2, burst=3, cost=1) == 0
+    # Refill stops at the burst
+    clock.advance(60)
+    assert buckets.take('a', rate=2, burst=3, cost=3) == 0
+    assert buckets.take('a', rate=2, burst=3, cost=1) > 0
+    # Other clients have their own bucket
+    assert buckets.take('b', rate=2, burst=3, cost=3) == 0
+
+
+def test_bucket_forgets_least_recent_clients(clock):
+    buckets = MemoryBuckets(max_clients=2)
+    for client in ('a', 'b', 'c'):
+        buckets.take(client, rate=1, burst=1, cost=1)
+    assert len(buckets) == 2
+    assert buckets.take('a', rate=1, burst=1, cost=1) == 0
+
+
+def test_route_costs(clock):
+    controller = AdmissionController(rate=1, burst=10, costs={'get_stats': 50, 'get_metrics': 2})
+    assert controller.cost('get_search_data') == 5
+    assert controller.cost('get_metrics') == 2
+    assert controller.cost('unknown') == 1
+    # Capped at the burst so it can be paid at all
+    assert controller.cost('get_stats') == 10
+
+    assert controller.admit('get_search_data', 'a') is None
+    controller.concurrency.release('get_search_data')
+    assert controller.admit('get_search_data', 'a') is None
+    controller.concurrency.release('get_search_data')
+    assert controller.admit('get_search_data', 'a') == ('rate_limited', pytest.approx(5))
+    assert controller.admit('health_like', 'a') == ('rate_limited', pytest.approx(1))
+    assert controller.rejected['rate_limited'] == 2
+    # A rejected request gives its concurrency slot back
+    assert controller.concurrency.in_flight['get_search_data'] == 0
+
+
+def test_concurrency_cap():
+    limits = ConcurrencyLimits(default=3, per_route={'flush_ai_cache': 1, 'get_metrics': 10})
+    assert limits.limit('get_metrics') == 3
+    assert limits.acquire('flush_ai_cache')
+    assert not limits.acquire('flush_ai_cache')
+    limits.release('flush_ai_cache')
+    assert limits.acquire('flush_ai_cache')
+
+    controller = AdmissionController(concurrency=limits)
+    assert controller.admit('flush_ai_cache', 'a') == ('concurrency', 1)
+    assert controller.rejected['concurrency'] == 1
+
+
+def test_loopback_skips_bucket_but_not_cap(clock):
+    controller = AdmissionController(rate=1, burst=1, concurrency=ConcurrencyLimits(default=1))
+    for _ in range(5):
+        assert controller.admit('get_metrics', '127.0.0.1') is None
+        controller.concurrency.release('get_metrics')
+    assert controller.admit('get_metrics', '::1') is None
+    assert controller.admit('get_metrics', '::1') == ('concurrency', 1)
+
+    strict = AdmissionController(rate=1, burst=1, limit_loopback=True)
+    assert strict.admit('get_metrics', '127.0.0.1') is None
+    assert strict.admit('get_metrics', '127.0.0.1')[0] == 'rate_limited'
+
+
+def test_installed_check_answers_429(clock):
+    app = Flask(__name__)
+
+    @app.route('/search/<query>')
+    def get_search_data(query):
+        return jsonify({'query': query})
+
+    controller = AdmissionController(rate=1, burst=5)
+    controller.install(app)
+    client = app.test_client()
+    remote = {'REMOTE_ADDR': '10.0.0.1'}
+    assert client.get('/search/ai', environ_base=remote).status_code == 200
+    response = client.get('/search/ai', environ_base=remote)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+    assert response.get_json()['reason'] == 'rate_limited'
+    assert client.get('/search/ai').status_code == 200
+    # The teardown hook released every slot
+    assert controller.stats()['in_flight'] == {}
+
+
+def test_redis_buckets_share_state_through_script(clock):
+    server = StandInServer()
+    client = standin_client(server)
+    scripts = ScriptLibrary()
+    scripts.load(client)
+    buckets = RedisBuckets(lambda: client, scripts)
+    assert buckets.take('a', rate=10, burst=2, cost=2) == 0
+    assert buckets.take('a', rate=10, burst=2, cost=1) == pytest.approx(0.1)
+    assert client.exists(f"{RATE_LIMIT_PREFIX}a")
+    assert buckets.errors == 0
+    assert len(buckets.fallback) == 0
+
+
+def test_redis_buckets_fall_back_to_memory(clock):
+    buckets = RedisBuckets(lambda: FailingClient(), ScriptLibrary())
+    assert buckets.take('a', rate=1, burst=1, cost=1) == 0
+    assert buckets.take('a', rate=1, burst=1, cost=1) > 0
+    assert buckets.errors == 2
+    assert len(buckets.fallback) == 1
+
+    disconnected = RedisBuckets(lambda: None)
+    assert disconnected.take('a', rate=1, burst=1, cost=1) == 0
+    assert disconnected.errors == 0
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""Backend selection and request coalescing in ``explanation_backends``.
+
+Runs offline on the stub backend: ``python3 -m pytest src/scripts``.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from explanation_backends import (  # noqa: E402
+    BackendNotConfigured, SingleFlight, StubBackend, generate_explanation, load_backend, parse_sections,
+)
+
+PRODUCT = {'productId': 'abc', 'title': 'Machine Learning'}
+
+
+def test_no_backend_configured_raises(monkeypatch):
+    monkeypatch.delenv('AI_BACKEND', raising=False)
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    with pytest.raises(BackendNotConfigured):
+        load_backend()
+
+
+def test_stub_only_when_asked_for(monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setenv('AI_BACKEND', 'stub')
+    assert isinstance(load_backend(), StubBackend)
+
+
+def test_openai_key_selects_openai(monkeypatch):
+    monkeypatch.delenv('AI_BACKEND', raising=False)
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    assert load_backend().name == 'openai'
+
+
+def test_stub_result_is_flagged():
+    result = generate_explanation(StubBackend(delay=0), 'FALLBACK_MODE', PRODUCT, 'ml')
+    assert result['backend'] == 'stub'
+    assert result['fallbackMode'] is True
+    assert set(result['sections']) == {'📋 Summary', '🎯 Relevance', '💡 Key Skills', '🔍 Topics',
+                                       '📚 Content Format', '📈 Level', '💫 Recommendation'}
+
+
+def test_parse_sections_joins_continuation_lines():
+    sections = parse_sections("📋 Summary: one\ntwo\n\n🎯 Relevance: a: b")
+    assert sections == {'📋 Summary': 'one two', '🎯 Relevance': 'a: b'}
+
+
+def test_concurrent_callers_share_one_backend_call():
+    backend = StubBackend(delay=0.2)
+    flights = SingleFlight()
+    callers = 8
+    start = threading.Barrier(callers)
+    results = []
+
+    def call():
+        start.wait()
+        results.append(flights.do('ml:abc', lambda: generate_explanation(backend, 'FALLBACK_MODE', PRODUCT, 'ml')))
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert backend.calls == 1
+    assert len(results) == callers
+    assert sum(1 for _, shared in results if not shared) == 1
+    assert len({id(result) for result, _ in results}) == 1
+    assert flights.in_flight() == 0
+
+
+def test_leader_error_reaches_followers():
+    flights = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait()
+        raise RuntimeError('upstream down')
+
+    def call():
+        try:
+            flights.do('k', fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flights.in_flight() == 0:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ['upstream down'] * 3
+
+
+def test_late_caller_rechecks_instead_of_generating_again():
+    flights = SingleFlight()
+    calls = []
+    # Checked the cache (and missed) while the first flight was still running
+    checked_at = time.monotonic()
+    flights.do('k', lambda: calls.append('first') or 'fresh')
+
+    result, shared = flights.do('k', lambda: calls.append('second') or 'fresh', recheck=lambda: 'cached',
+                                since=checked_at)
+    assert (result, shared) == ('cached', True)
+    assert calls == ['first']
+
+
+def test_recheck_skipped_when_no_flight_finished_since_lookup():
+    flights = SingleFlight()
+    flights.do('k', lambda: 'old')
+    rechecks = []
+    result, shared = flights.do('k', lambda: 'fresh', recheck=lambda: rechecks.append(1),
+                                since=time.monotonic())
+    assert (result, shared) == ('fresh', False)
+    assert rechecks == []
+
+
+def test_recheck_miss_falls_through_to_generation():
+    flights = SingleFlight()
+    checked_at = time.monotonic()
+    flights.do('k', lambda: 'first')
+    assert flights.do('k', lambda: 'second', recheck=lambda: None, since=checked_at) == ('second', False)
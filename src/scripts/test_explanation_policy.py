@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""Adaptive TTLs, budget, eviction and metadata upkeep of ``explanation_policy``.
+
+Runs on the Redis stand-in: ``python3 -m pytest src/scripts``.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+import explanation_policy  # noqa: E402
+from explanation_policy import (  # noqa: E402
+    BYTES_KEY, FREQ_KEY, LAST_ACCESS_KEY, SIZE_KEY, ExplanationCachePolicy,
+)
+from explanation_store import explanation_key  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def client():
+    return standin_client(StandInServer())
+
+
+def write(policy, client, *keys, size=10):
+    policy.record_writes(client, [(key, b'x' * size) for key in keys])
+
+
+def ttl_days(client, cache_key):
+    return round(client.ttl(explanation_key(cache_key)) / DAY)
+
+
+def test_ttl_doubles_per_hit_up_to_max():
+    policy = ExplanationCachePolicy(base_ttl=DAY, max_ttl=30 * DAY)
+    assert [policy.ttl_for(hits) // DAY for hits in range(6)] == [1, 2, 4, 8, 16, 30]
+
+
+def test_hits_promote_ttl_at_powers_of_two(client):
+    policy = ExplanationCachePolicy(base_ttl=DAY, max_ttl=30 * DAY)
+    write(policy, client, 'a')
+    assert ttl_days(client, 'a') == 1
+
+    ttls = []
+    for _ in range(9):
+        client.server.log.reset()
+        assert policy.lookup(client, 'a') == b'x' * 10
+        ttls.append((client.server.log.round_trips, ttl_days(client, 'a')))
+    # Promotions at 1, 2, 4 and 8 hits cost a second round trip; 8 hits reach the cap
+    assert ttls == [(2, 2), (2, 4), (1, 4), (2, 16), (1, 16), (1, 16), (1, 16), (2, 30), (1, 30)]
+    assert client.zscore(FREQ_KEY, 'a') == 9
+
+
+def test_lookup_many_is_one_round_trip_without_promotions(client):
+    policy = ExplanationCachePolicy(base_ttl=DAY, max_ttl=30 * DAY)
+    write(policy, client, 'a', 'b')
+    client.zadd(FREQ_KEY, {'a': 2, 'b': 4})
+    client.server.log.reset()
+    assert policy.lookup_many(client, ['a', 'missing', 'b']) == [b'x' * 10, None, b'x' * 10]
+    assert client.server.log.round_trips == 1
+    assert client.zscore(FREQ_KEY, 'missing') is None
+    assert client.zscore(FREQ_KEY, 'b') == 5
+
+    # The fourth hit on 'a' is a promotion
+    policy.lookup_many(client, ['a'])
+    assert client.zscore(FREQ_KEY, 'a') == 4
+    assert ttl_days(client, 'a') == 16
+
+
+def test_untracked_hit_is_adopted(client):
+    policy = ExplanationCachePolicy()
+    client.set(explanation_key('legacy'), b'x' * 10)
+    assert policy.lookup_many(client, ['legacy']) == [b'x' * 10]
+    assert client.zscore(FREQ_KEY, 'legacy') == 1
+    assert int(client.hget(SIZE_KEY, 'legacy')) == 10
+    assert int(client.get(BYTES_KEY)) == 10
+
+
+def test_starting_hits_seed_frequency_and_ttl(client):
+    policy = ExplanationCachePolicy(base_ttl=DAY, max_ttl=30 * DAY)
+    policy.record_write(client, 'popular', b'x' * 10, starting_hits=3)
+    assert client.zscore(FREQ_KEY, 'popular') == 3
+    assert ttl_days(client, 'popular') == 8
+
+    # Rewrites keep the higher of the earned and the starting count
+    write(policy, client, 'earned')
+    client.zadd(FREQ_KEY, {'earned': 5})
+    policy.record_write(client, 'earned', b'x' * 10, starting_hits=2)
+    assert client.zscore(FREQ_KEY, 'earned') == 5
+    assert ttl_days(client, 'earned') == 30
+    policy.record_write(client, 'popular', b'x' * 10, starting_hits=4)
+    assert client.zscore(FREQ_KEY, 'popular') == 4
+    assert ttl_days(client, 'popular') == 16
+
+
+def test_stats_drop_expired_entries(client):
+    policy = ExplanationCachePolicy()
+    write(policy, client, 'a', 'b', 'c')
+    # As if b's TTL ran out
+    client.delete(explanation_key('b'))
+
+    stats = policy.stats(client)
+    assert stats['entries'] == 2
+    assert stats['bytes'] == 20
+    assert stats['counters']['expired_cleaned'] == 1
+    assert client.zscore(FREQ_KEY, 'b') is None
+    assert client.zscore(LAST_ACCESS_KEY, 'b') is None
+    assert client.hget(SIZE_KEY, 'b') is None
+    assert int(client.get(BYTES_KEY)) == 20
+    # Nothing left to reconcile
+    assert policy.stats(client)['counters']['expired_cleaned'] == 1
+
+
+def test_evict_drops_expired_before_live(client):
+    policy = ExplanationCachePolicy(max_entries=100)
+    write(policy, client, 'a', 'b', 'c', 'd')
+    client.delete(explanation_key('c'))
+    policy.max_entries = 3
+
+    # Target is 90% of 3: two entries go, the expired one first
+    assert policy.evict(client, 4, 40) == 1
+    counters = policy.stats(client)['counters']
+    assert counters['expired_cleaned'] == 1
+    assert counters['evictions'] == 1
+    assert counters['evicted_bytes'] == 10
+    assert client.zcard(FREQ_KEY) == 2
+    assert int(client.get(BYTES_KEY)) == 20
+
+
+def test_expired_entries_can_bring_usage_under_budget(client):
+    policy = ExplanationCachePolicy(max_entries=100)
+    write(policy, client, 'a', 'b', 'c')
+    client.delete(explanation_key('a'))
+    policy.max_entries = 3
+    # 90% of 3 is 2: dropping the expired entry is enough
+    assert policy.evict(client, 3, 30) == 0
+    assert client.exists(explanation_key('b'), explanation_key('c')) == 2
+
+
+def test_stale_frequent_entry_is_a_candidate(client, monkeypatch):
+    monkeypatch.setattr(explanation_policy, 'EVICTION_SAMPLE', 2)
+    policy = ExplanationCachePolicy(max_entries=100)
+    write(policy, client, 'fresh1', 'fresh2', 'fresh3', 'fresh4', 'old')
+    # 'old' was popular a month ago; the fresh entries have no hits yet but
+    # fill the lowest-frequency sample on their own
+    client.zadd(FREQ_KEY, {'old': 3})
+    client.zadd(LAST_ACCESS_KEY, {'old': time.time() - 30 * DAY})
+    policy.max_entries = 5
+
+    assert policy.evict(client, 5, 50) == 1
+    assert not client.exists(explanation_key('old'))
+    assert client.zscore(FREQ_KEY, 'old') is None
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""Compressed explanation values and the footprint report in ``explanation_store``.
+
+Runs on the Redis stand-in: ``python3 -m pytest src/scripts``.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from explanation_store import (  # noqa: E402
+    ACTIVE_DICTIONARY_KEY, DICTIONARY_PREFIX, DICTIONARY_SEED, MAGIC, ExplanationCodec, explanation_key,
+    footprint_report, get_raw, train_dictionary, train_from_cache,
+)
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+ENTRY = {
+    'sections': {'📋 Summary': 'An introduction to supervised learning.'},
+    'query': 'machine learning',
+    'productId': 'abc',
+}
+
+
+@pytest.fixture
+def client():
+    return standin_client(StandInServer())
+
+
+def seed(client, codec, count):
+    for index in range(count):
+        client.set(explanation_key(f"ml:{index}"), codec.encode({**ENTRY, 'productId': f"p{index:02d}"}))
+
+
+def test_round_trip_without_dictionary():
+    codec = ExplanationCodec()
+    stored = codec.encode(ENTRY)
+    assert stored.startswith(MAGIC)
+    assert codec.decode(stored) == ENTRY
+    assert codec.session_stats()['active_dictionary'] is None
+
+
+def test_dictionary_shrinks_entries_and_round_trips():
+    plain = ExplanationCodec().encode(ENTRY)
+    codec = ExplanationCodec()
+    dict_id = codec.use_dictionary(train_dictionary([json.dumps(ENTRY)] * 3))
+    stored = codec.encode(ENTRY)
+    assert len(stored) < len(plain)
+    assert codec.decode(stored) == ENTRY
+    assert codec.session_stats()['active_dictionary'] == dict_id
+
+
+def test_legacy_json_values_are_read_as_is():
+    codec = ExplanationCodec()
+    assert codec.decode(json.dumps(ENTRY)) == ENTRY
+    assert codec.decode(json.dumps(ENTRY).encode('utf-8')) == ENTRY
+    assert codec.decode(None) is None
+
+
+def test_missing_dictionary_is_fetched_from_redis(client):
+    writer = ExplanationCodec()
+    dictionary = train_dictionary([json.dumps(ENTRY)] * 3)
+    dict_id = writer.use_dictionary(dictionary)
+    stored = writer.encode(ENTRY)
+
+    reader = ExplanationCodec()
+    with pytest.raises(ValueError):
+        reader.decode(stored)
+    client.set(f"{DICTIONARY_PREFIX}{dict_id}", dictionary)
+    assert reader.decode(stored, client) == ENTRY
+    assert reader.active_id == 0
+
+
+def test_unknown_format_version_is_rejected():
+    stored = bytearray(ExplanationCodec().encode(ENTRY))
+    stored[2] = 99
+    with pytest.raises(ValueError):
+        ExplanationCodec().decode(bytes(stored))
+
+
+def test_train_dictionary_keeps_recurring_phrases_within_size():
+    shared = 'This course is recommended for beginners who want hands-on practice.'
+    samples = [f"{shared} Sample number {index} covers topic {index * 7}." for index in range(5)]
+    dictionary = train_dictionary(samples, size=len(DICTIONARY_SEED.encode('utf-8')) + 200)
+    assert dictionary.startswith(DICTIONARY_SEED.encode('utf-8'))
+    assert len(dictionary) <= len(DICTIONARY_SEED.encode('utf-8')) + 200
+    assert b'recommended for beginners who' in dictionary
+    # Phrases from a single sample are not worth a dictionary slot
+    assert b'topic 14.' not in dictionary
+
+
+def test_train_from_cache_activates_dictionary(client):
+    codec = ExplanationCodec()
+    seed(client, codec, 3)
+    dict_id, sample_count = train_from_cache(client, codec)
+    assert sample_count == 3
+    assert int(client.get(ACTIVE_DICTIONARY_KEY)) == dict_id
+
+    reader = ExplanationCodec()
+    assert reader.load_dictionaries(client) == dict_id
+    # Entries written before training stay readable
+    assert reader.decode(get_raw(client, explanation_key('ml:0')), client)['productId'] == 'p00'
+
+
+def test_footprint_report_walks_every_entry(client):
+    codec = ExplanationCodec()
+    seed(client, codec, 5)
+    report = footprint_report(client, codec)
+    assert report['entries'] == report['sampled_entries'] == 5
+    assert not report['estimated']
+    assert report['compressed_entries'] == 5
+    assert report['stored_bytes'] == codec.stored_bytes
+    assert report['raw_bytes'] == codec.raw_bytes
+
+
+def test_sampled_footprint_reads_a_fixed_number_of_entries(client):
+    codec = ExplanationCodec()
+    seed(client, codec, 20)
+    client.server.log.reset()
+    report = footprint_report(client, codec, sample=4, total_entries=20)
+    assert client.server.log.summary()['command_names'] == ['SCAN', 'MGET']
+    assert len(client.server.log.keys) == 4
+    assert report['sampled_entries'] == 4
+    assert report['entries'] == 20
+    assert report['estimated']
+    # Every seeded entry has the same size, so scaling is exact
+    assert report['stored_bytes'] == codec.stored_bytes
+    assert report['raw_bytes'] == codec.raw_bytes
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""Keyspace exports from ``export_keyspace``, on the Redis stand-in.
+
+Needs pyarrow (skipped otherwise). ``python3 -m pytest src/scripts``.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'data'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+import export_keyspace  # noqa: E402
+from dataset_version import DATASET_VERSION_KEY  # noqa: E402
+from explanation_store import EXPLANATION_PREFIX, ExplanationCodec  # noqa: E402
+from query_index import QUERY_INDEX_KEY  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+VERSION = '2025-07-17'
+
+
+def metrics(viewers, ctr=5.0):
+    return json.dumps({'viewers': viewers, 'clickers': 3, 'enrollers': 2, 'paid_enrollers': 1,
+                       'ctr': ctr, 'enrollment_rate': 2.0, 'paid_conversion_rate': 1.0})
+
+
+@pytest.fixture
+def client():
+    client = standin_client(StandInServer())
+    client.hset(DATASET_VERSION_KEY, mapping={'version': VERSION, 'source': 'data.csv', 'rows': 3})
+    client.set('ai:1', metrics(100))
+    client.set('ai:2', metrics(50))
+    client.set('ml:3', metrics(10))
+    client.set('ml:4', 'not json')
+    client.set(f'{EXPLANATION_PREFIX}ai:1', ExplanationCodec().encode({'explanation': 'Popular pick'}))
+    client.zadd(QUERY_INDEX_KEY, {'ai': 0})
+    return client
+
+
+def rows_by_key(path):
+    return {row['key']: row for row in pq.read_table(path).to_pylist()}
+
+
+def test_metrics_and_explanations_become_separate_row_kinds(client, tmp_path):
+    path = str(tmp_path / 'keyspace.parquet')
+
+    stats = export_keyspace.export_keyspace(client, path, batch_size=2)
+
+    rows = rows_by_key(path)
+    assert set(rows) == {'ai:1', 'ai:2', 'ml:3', f'{EXPLANATION_PREFIX}ai:1'}
+    assert stats['rows'] == 4
+    assert stats['metrics'] == 3
+    assert stats['explanations'] == 1
+    assert stats['dataset_version'] == VERSION
+
+    metric = rows['ai:1']
+    assert metric['kind'] == 'metrics'
+    assert (metric['query'], metric['product_id'], metric['viewers']) == ('ai', '1', 100)
+    assert metric['explanation'] is None
+    assert metric['dataset_version'] == VERSION
+
+    explanation = rows[f'{EXPLANATION_PREFIX}ai:1']
+    assert explanation['kind'] == 'explanation'
+    assert (explanation['query'], explanation['product_id']) == ('ai', '1')
+    assert explanation['viewers'] is None
+    assert json.loads(explanation['explanation']) == {'explanation': 'Popular pick'}
+    assert explanation['dataset_version'] is None
+
+
+def test_prefixes_limit_the_export(client, tmp_path):
+    path = str(tmp_path / 'ai.arrow')
+
+    stats = export_keyspace.export_keyspace(client, path, prefixes=['ai:'])
+
+    assert stats['format'] == 'arrow'
+    with pa.ipc.open_file(path) as reader:
+        keys = reader.read_all().column('key').to_pylist()
+    assert sorted(keys) == ['ai:1', 'ai:2']
+
+
+def test_refuses_a_different_dataset_version(client, tmp_path):
+    path = str(tmp_path / 'keyspace.parquet')
+
+    with pytest.raises(ValueError, match=VERSION):
+        export_keyspace.export_keyspace(client, path, dataset_version='2024-01-01')
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_writer_failure_removes_the_partial_file(client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'keyspace.parquet')
+    open_writer = export_keyspace.open_writer
+
+    class FailingWriter:
+        def __init__(self, *args):
+            self.writer = open_writer(*args)
+
+        def write_batch(self, batch):
+            raise OSError('disk full')
+
+        def close(self):
+            self.writer.close()
+
+    monkeypatch.setattr(export_keyspace, 'QUEUE_BATCHES', 1)
+    monkeypatch.setattr(export_keyspace, 'open_writer', FailingWriter)
+
+    with pytest.raises(OSError, match='disk full'):
+        export_keyspace.export_keyspace(client, path, batch_size=1)
+
+    assert os.listdir(tmp_path) == []
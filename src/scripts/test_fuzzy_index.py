@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""Trigram lookups, the stored blob of ``fuzzy_index`` and its reload in the 8080 server.
+
+``python3 -m pytest src/scripts``; the Redis round trip uses the stand-in.
+"""
+
+import os
+import sys
+import zlib
+
+import pandas as pd
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'api'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from dataset_version import DATASET_VERSION_KEY  # noqa: E402
+from fuzzy_index import (  # noqa: E402
+    BLOB_HEADER, FORMAT_VERSION, FUZZY_INDEX_KEY, TrigramIndex, build_fuzzy_index, load_fuzzy_index, trigrams,
+)
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+QUERIES = ['machine learning', 'deep learning', 'data science', 'python', 'python for data science']
+VIEWERS = [1200, 800, 900, 3000, 400]
+
+
+@pytest.fixture
+def index():
+    return TrigramIndex.build(QUERIES, VIEWERS)
+
+
+def test_trigrams_are_padded_per_word():
+    assert trigrams('ML') == {'  m', ' ml', 'ml '}
+    # Case, punctuation and word order do not matter
+    assert trigrams('Data-Science') == trigrams('science data')
+
+
+def test_typo_resolves_to_known_query(index):
+    results = index.search('machine lerning')
+    assert results[0]['query'] == 'machine learning'
+    assert 0.3 <= results[0]['score'] < 1
+
+
+def test_exact_match_scores_one(index):
+    assert index.search('Python')[0] == {'query': 'python', 'score': 1.0}
+
+
+def test_results_respect_min_score_and_limit(index):
+    assert index.search('zzzz') == []
+    assert index.search('') == []
+    results = index.search('learning', limit=1, min_score=0.1)
+    assert len(results) == 1
+    assert all(result['score'] >= 0.1 for result in index.search('learning', min_score=0.1))
+
+
+def test_equal_scores_rank_by_viewers():
+    # Same words, so the same trigrams
+    index = TrigramIndex.build(['science data', 'data science'], [10, 500])
+    results = index.search('data sciense')
+    assert results[0]['score'] == results[1]['score']
+    assert [result['query'] for result in results] == ['data science', 'science data']
+
+
+def test_blob_round_trip(index):
+    restored = TrigramIndex.from_bytes(index.to_bytes())
+    assert restored.queries == QUERIES
+    assert restored.viewers.tolist() == VIEWERS
+    for query in ('machine lerning', 'pyton', 'science for data'):
+        assert restored.search(query) == index.search(query)
+
+
+def test_unknown_blob_version_is_rejected(index):
+    body = zlib.decompress(index.to_bytes())
+    magic, _, *counts = BLOB_HEADER.unpack_from(body)
+    body = BLOB_HEADER.pack(magic, FORMAT_VERSION + 1, *counts) + body[BLOB_HEADER.size:]
+    with pytest.raises(ValueError):
+        TrigramIndex.from_bytes(zlib.compress(body))
+
+
+def test_build_from_dataframe_and_load_from_redis():
+    client = standin_client(StandInServer())
+    assert load_fuzzy_index(client) is None
+    df = pd.DataFrame({
+        'searched_query': ['python', 'python', 'data science'],
+        'clicked_product': ['a', 'b', 'a'],
+        'viewers': [100, 50, 70],
+    })
+    assert build_fuzzy_index(client, df) == 2
+    loaded = load_fuzzy_index(client)
+    assert dict(zip(loaded.queries, loaded.viewers.tolist())) == {'python': 150, 'data science': 70}
+    assert loaded.search('pythn')[0]['query'] == 'python'
+
+
+def test_server_reloads_index_after_a_data_load(monkeypatch):
+    server = pytest.importorskip('api_server_8080')
+    client = standin_client(StandInServer())
+    client.set(FUZZY_INDEX_KEY, TrigramIndex.build(['python']).to_bytes())
+    client.hset(DATASET_VERSION_KEY, mapping={'version': '2025-07-17', 'loaded_at': 1})
+    monkeypatch.setattr(server, 'r', client)
+    monkeypatch.setattr(server, 'fuzzy_index', None)
+    monkeypatch.setattr(server, 'fuzzy_index_checked', 0.0)
+    test_client = server.app.test_client()
+
+    assert test_client.get('/queries/resolve/pythn').get_json()['matches'][0]['query'] == 'python'
+    # The loader rebuilds the index, then restamps the dataset
+    client.set(FUZZY_INDEX_KEY, TrigramIndex.build(['data science']).to_bytes())
+    client.hset(DATASET_VERSION_KEY, 'loaded_at', 2)
+    client.server.log.reset()
+    test_client.get('/queries/resolve/pythn')
+    # Within the recheck interval the stamp is not even read
+    assert client.server.log.round_trips == 0
+
+    monkeypatch.setattr(server, 'fuzzy_index_checked', 0.0)
+    assert test_client.get('/queries/resolve/data sciense').get_json()['matches'][0]['query'] == 'data science'
+    assert test_client.get('/queries/resolve/pythn').get_json()['matches'] == []
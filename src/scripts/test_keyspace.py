@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+"""Metric keys vs internal keys in ``keyspace``: ``python3 -m pytest src/scripts``."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+from explanation_policy import FREQ_KEY  # noqa: E402
+from explanation_store import ACTIVE_DICTIONARY_KEY, explanation_key  # noqa: E402
+from fuzzy_index import FUZZY_INDEX_KEY  # noqa: E402
+from keyspace import is_metric_key  # noqa: E402
+from metric_history import history_key  # noqa: E402
+from product_rollups import product_rollup_key  # noqa: E402
+from query_index import QUERY_INDEX_KEY  # noqa: E402
+from redis_scripts import RATE_LIMIT_PREFIX  # noqa: E402
+
+
+def test_internal_keys_are_not_metrics():
+    for key in (explanation_key('ai:abc'), ACTIVE_DICTIONARY_KEY, FREQ_KEY, QUERY_INDEX_KEY, FUZZY_INDEX_KEY,
+                product_rollup_key('abc'), f"{RATE_LIMIT_PREFIX}127.0.0.1", history_key('ai', 'abc')):
+        assert not is_metric_key(key), key
+
+
+def test_metric_keys():
+    assert is_metric_key('machine learning:Gtv4Xb1-EeS-ViIACwYKVQ')
+    assert is_metric_key('ai:course~abc')
+    assert not is_metric_key('no-separator')
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""RESP streams, slot routing and manifest checks of ``mass_insert``.
+
+``python3 -m pytest src/scripts``; the streams are replayed into the Redis stand-in.
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'data'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from mass_insert import (  # noqa: E402
+    MANIFEST_FILE, RespStreams, count_commands, encode_command, even_slot_map, verify_streams, write_streams,
+)
+from query_index import QUERY_INDEX_KEY  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+CSV_PATH = 'search_metrics_2025_07_17.csv'
+
+
+def make_dataset():
+    return pd.DataFrame({
+        'searched_query': ['ai', 'ai', 'machine learning', None],
+        'clicked_product': ['abc', 'xyz', 'abc', 'lost'],
+        'viewers': [100, 50, 70, 1],
+        'clickers': [10, 5, None, 0],
+        'enrollers': [2, 1, 1, 0],
+        'paid_enrollers': [1, 0, 0, 0],
+        'ctr': [10.0, 10.0, 0.0, 0.0],
+        'enrollment_rate': [2.0, 2.0, 1.43, 0.0],
+        'paid_conversion_rate': [1.0, 0.0, 0.0, 0.0],
+    })
+
+
+def read_commands(path):
+    """Parse a RESP stream back into argument lists"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    commands, pos = [], 0
+    while pos < len(data):
+        end = data.index(b'\r\n', pos)
+        count, pos = int(data[pos + 1:end]), end + 2
+        args = []
+        for _ in range(count):
+            end = data.index(b'\r\n', pos)
+            length, pos = int(data[pos + 1:end]), end + 2
+            args.append(data[pos:pos + length])
+            pos += length + 2
+        commands.append(args)
+    return commands
+
+
+def write(tmp_path, shards=1):
+    out_dir = str(tmp_path / 'resp_load')
+    manifest = write_streams(make_dataset(), out_dir, even_slot_map(shards), CSV_PATH)
+    with open(os.path.join(out_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+    return out_dir, manifest
+
+
+def test_encode_command():
+    assert encode_command('SET', 'key', 'value') == b'*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$5\r\nvalue\r\n'
+    # Lengths count UTF-8 bytes; binary values pass through unchanged
+    assert encode_command('SET', 'données', b'\r\n\x00') == (
+        b'*3\r\n$3\r\nSET\r\n$8\r\ndonn\xc3\xa9es\r\n$3\r\n\r\n\x00\r\n')
+    assert encode_command('ZADD', 'k', 0, 1.5) == b'*4\r\n$4\r\nZADD\r\n$1\r\nk\r\n$1\r\n0\r\n$3\r\n1.5\r\n'
+
+
+def test_even_slot_map_covers_every_slot_once():
+    shard_map = even_slot_map(3)
+    assert [spec['slots'] for spec in shard_map] == [[[0, 5460]], [[5461, 10922]], [[10923, 16383]]]
+    assert even_slot_map(1)[0]['slots'] == [[0, REDIS_CLUSTER_HASH_SLOTS - 1]]
+
+
+def test_commands_go_to_the_slot_owner(tmp_path):
+    streams = RespStreams(str(tmp_path), even_slot_map(2))
+    keys = [f'key{index}' for index in range(20)]
+    for key in keys:
+        streams.add('SET', key, 'x')
+    summaries = streams.close()
+    for shard, summary in enumerate(summaries):
+        routed = [args[1].decode() for args in read_commands(tmp_path / summary['file'])]
+        assert routed == [key for key in keys if (key_slot(key.encode()) >= 8192) == shard]
+        assert summary['commands'] == len(routed)
+
+
+def test_streams_replay_to_the_loaders_layout(tmp_path):
+    out_dir, manifest = write(tmp_path)
+    assert manifest['csv_rows'] == 4
+    assert manifest['skipped_rows'] == 1
+    assert manifest['metric_keys'] == 3
+    assert manifest['indexed_queries'] == 2
+    assert manifest['dataset_version'] == '2025-07-17'
+
+    client = standin_client(StandInServer())
+    for args in read_commands(os.path.join(out_dir, manifest['streams'][0]['file'])):
+        client.execute_command(*args)
+    assert json.loads(client.get('ai:abc')) == {
+        'viewers': 100, 'clickers': 10, 'enrollers': 2, 'paid_enrollers': 1,
+        'ctr': 10.0, 'enrollment_rate': 2.0, 'paid_conversion_rate': 1.0,
+    }
+    assert json.loads(client.get('machine learning:abc'))['clickers'] == 0
+    assert client.zcard(QUERY_INDEX_KEY) == 2
+    assert client.exists('product_rollup:abc')
+
+
+def test_verify_catches_tampering(tmp_path):
+    out_dir, manifest = write(tmp_path, shards=2)
+    assert verify_streams(out_dir)[1] == []
+    assert sum(count_commands(os.path.join(out_dir, s['file'])) for s in manifest['streams']) == \
+        manifest['total_commands']
+
+    path = os.path.join(out_dir, manifest['streams'][0]['file'])
+    with open(path, 'ab') as f:
+        f.write(b'garbage\r\n')
+    problems = verify_streams(out_dir)[1]
+    assert any('checksum mismatch' in problem for problem in problems)
+    assert any('bad command header' in problem for problem in problems)
+    with pytest.raises(ValueError):
+        count_commands(path)
+
+    os.remove(os.path.join(out_dir, manifest['streams'][1]['file']))
+    assert any('missing' in problem for problem in verify_streams(out_dir)[1])
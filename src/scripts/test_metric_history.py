@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""Packed per-pair metric series in ``metric_history``.
+
+``python3 -m pytest src/scripts``; the loader test runs on the Redis stand-in.
+"""
+
+import base64
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from metric_history import (  # noqa: E402
+    METRIC_COLUMNS, _get_varint, _put_varint, append_day, append_history, day_number, decode_series,
+    encode_series, history_key, history_retention_from_env, pack_values, series_points, unpack_values,
+    week_over_week,
+)
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+METRICS = {
+    'viewers': 1200, 'clickers': 150, 'enrollers': 40, 'paid_enrollers': 12,
+    'ctr': 12.5, 'enrollment_rate': 3.33, 'paid_conversion_rate': 1.0,
+}
+DAY = day_number('2025-07-17')
+
+
+def with_viewers(viewers, **overrides):
+    return pack_values({**METRICS, 'viewers': viewers, **overrides})
+
+
+@pytest.mark.parametrize('value, size', [(0, 1), (-1, 1), (63, 1), (-64, 1), (64, 2), (10 ** 6, 3), (-10 ** 9, 5)])
+def test_zigzag_varint_round_trip(value, size):
+    out = bytearray()
+    _put_varint(out, value)
+    assert len(out) == size
+    assert _get_varint(bytes(out) + b'\x00', 0) == (value, size)
+
+
+def test_pack_values_uses_fixed_point_rates():
+    values = pack_values(METRICS)
+    assert values == (1200, 150, 40, 12, 1250, 333, 100)
+    assert unpack_values(values) == METRICS
+    assert pack_values({'viewers': None}) == (0,) * len(METRIC_COLUMNS)
+
+
+def test_series_round_trip_with_gaps_and_drops():
+    entries = [(DAY, with_viewers(1200)), (DAY + 1, with_viewers(1100, ctr=11.0)), (DAY + 5, with_viewers(1300))]
+    blob = encode_series(entries)
+    assert decode_series(blob) == entries
+    # An unchanged day costs one byte for the gap and one per metric
+    unchanged = encode_series(entries + [(DAY + 6, with_viewers(1300))])
+    assert len(base64.b64decode(unchanged)) - len(base64.b64decode(blob)) == 1 + len(METRIC_COLUMNS)
+    assert encode_series([]) == ''
+    assert decode_series(None) == decode_series('') == []
+
+
+def test_unknown_series_version_is_rejected():
+    data = bytearray(base64.b64decode(encode_series([(DAY, with_viewers(1))])))
+    data[0] = 99
+    with pytest.raises(ValueError):
+        decode_series(base64.b64encode(bytes(data)))
+
+
+def test_append_day_replaces_same_day_and_trims():
+    entries = append_day([], DAY, with_viewers(1))
+    entries = append_day(entries, DAY, with_viewers(2))
+    assert entries == [(DAY, with_viewers(2))]
+    entries = append_day(entries, DAY + 3, with_viewers(3), retention_days=3)
+    assert [day for day, _ in entries] == [DAY + 3]
+
+
+def test_series_points_and_week_over_week():
+    entries = [(DAY + offset, with_viewers(1000 + offset * 10)) for offset in range(10)]
+    points = series_points(entries, days=3)
+    assert [point['date'] for point in points] == ['2025-07-24', '2025-07-25', '2025-07-26']
+    assert points[-1]['viewers'] == 1090
+
+    change = week_over_week(entries)
+    assert change['compared_to'] == '2025-07-19'
+    assert change['metrics']['viewers'] == {'current': 1090, 'previous': 1020, 'change': 70, 'change_pct': 6.9}
+    assert change['metrics']['ctr']['change_pct'] == 0.0
+    assert week_over_week(entries[:7]) is None
+
+
+def test_day_number_falls_back_to_today_for_non_dates():
+    assert day_number('1970-01-02') == 1
+    assert day_number('v3') == day_number(None) > DAY
+
+
+def test_retention_is_opt_in(monkeypatch):
+    monkeypatch.delenv('METRIC_HISTORY', raising=False)
+    assert history_retention_from_env() is None
+    monkeypatch.setenv('METRIC_HISTORY', '1')
+    monkeypatch.setenv('METRIC_HISTORY_DAYS', '30')
+    assert history_retention_from_env() == 30
+
+
+def test_append_history_extends_and_repairs_series():
+    client = standin_client(StandInServer())
+    df = pd.DataFrame([{'searched_query': 'ai', 'clicked_product': 'abc', **METRICS},
+                       {'searched_query': 'ml', 'clicked_product': 'xyz', **METRICS}])
+    client.set(history_key('ml', 'xyz'), 'not a series')
+    assert append_history(client, df, '2025-07-17') == 2
+    assert append_history(client, df.assign(viewers=1300), '2025-07-18') == 2
+
+    entries = decode_series(client.get(history_key('ai', 'abc')))
+    assert entries == [(DAY, with_viewers(1200)), (DAY + 1, with_viewers(1300))]
+    assert len(decode_series(client.get(history_key('ml', 'xyz')))) == 2
+    assert client.ttl(history_key('ai', 'abc')) > 0
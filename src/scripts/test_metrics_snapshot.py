@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""File format and lookups of the memory-mapped ``metrics_snapshot``.
+
+``python3 -m pytest src/scripts``.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from metrics_snapshot import (  # noqa: E402
+    HEADER, SECTION_TABLE, SECTIONS, MetricsSnapshot, open_snapshot_from_env, write_snapshot,
+)
+
+COUNTS = {'viewers': 0, 'clickers': 0, 'enrollers': 0, 'paid_enrollers': 0}
+RATES = {'ctr': 0.0, 'enrollment_rate': 0.0, 'paid_conversion_rate': 0.0}
+
+
+def row(query, product, viewers, ctr=0.0):
+    return {'searched_query': query, 'clicked_product': product, **COUNTS, **RATES,
+            'viewers': viewers, 'ctr': ctr}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    df = pd.DataFrame([
+        row('machine learning', 'abc', 1200, 12.5),
+        row('ai', 'xyz', 300),
+        row('ai', 'abc', 900),
+        row('données', 'ü1', 5),
+        row(None, 'lost', 1),
+        # Repeated pair: the later row wins
+        row('ai', 'xyz', 400),
+    ])
+    path = tmp_path / 'metrics.snapshot'
+    assert write_snapshot(df, str(path)) == 4
+    snapshot = MetricsSnapshot(str(path))
+    yield snapshot
+    snapshot.close()
+
+
+def test_pair_lookups(snapshot):
+    assert snapshot.get('machine learning', 'abc') == {**COUNTS, **RATES, 'viewers': 1200, 'ctr': 12.5}
+    assert snapshot.get('ai', 'xyz')['viewers'] == 400
+    assert snapshot.get_key('données:ü1')['viewers'] == 5
+    assert snapshot.get_key('machine learning:abc')['viewers'] == 1200
+    assert snapshot.get('ai', 'missing') is None
+    assert snapshot.get_key('no separator') is None
+
+
+def test_search_groups_rows_by_query(snapshot):
+    results = snapshot.search('ai')
+    assert list(results) == ['abc', 'xyz']
+    assert [metrics['viewers'] for metrics in results.values()] == [900, 400]
+    assert snapshot.search('unknown') == {}
+
+
+def test_header_and_aligned_sections(snapshot):
+    assert snapshot.stats()['rows'] == 4
+    assert snapshot.stats()['queries'] == 3
+    assert snapshot.stats()['products'] == 3
+    assert snapshot.sample_queries(2) == ['ai', 'données']
+    with open(snapshot.path, 'rb') as f:
+        data = f.read()
+    table = SECTION_TABLE.unpack_from(data, HEADER.size)
+    offsets = table[0::2]
+    assert all(offset % 8 == 0 for offset in offsets)
+    assert offsets[-1] + table[-1] == len(data)
+    assert len(offsets) == len(SECTIONS)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not.snapshot'
+    path.write_bytes(b'\0' * (HEADER.size + SECTION_TABLE.size))
+    with pytest.raises(ValueError):
+        MetricsSnapshot(str(path))
+
+
+def test_rewrite_replaces_file_atomically(snapshot, tmp_path):
+    write_snapshot(pd.DataFrame([row('ai', 'new', 7)]), snapshot.path)
+    assert not os.path.exists(f"{snapshot.path}.tmp")
+    # Already-open snapshots keep reading the old file
+    assert snapshot.get('ai', 'xyz')['viewers'] == 400
+    reopened = MetricsSnapshot(snapshot.path)
+    assert reopened.get('ai', 'new')['viewers'] == 7
+    assert reopened.get('ai', 'xyz') is None
+    reopened.close()
+
+
+def test_backend_is_opt_in(snapshot, monkeypatch):
+    monkeypatch.delenv('METRICS_BACKEND', raising=False)
+    assert open_snapshot_from_env() is None
+    monkeypatch.setenv('METRICS_BACKEND', 'snapshot')
+    monkeypatch.setenv('METRICS_SNAPSHOT_PATH', snapshot.path)
+    opened = open_snapshot_from_env()
+    assert opened.get('ai', 'abc')['viewers'] == 900
+    opened.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""Pair selection and generation in ``prewarm_explanations``, on the Redis stand-in."""
+
+import json
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'data'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+
+import pandas as pd  # noqa: E402
+
+from redis_standin import StandInServer, standin_client  # noqa: E402
+from explanation_backends import StubBackend  # noqa: E402
+from explanation_store import ExplanationCodec, explanation_key, get_raw  # noqa: E402
+from product_rollups import build_product_rollups  # noqa: E402
+from explanation_policy import FREQ_KEY, ExplanationCachePolicy  # noqa: E402
+from prewarm_explanations import Checkpoint, ProductMetadata, filter_uncached, prewarm, starting_hits  # noqa: E402
+from query_normalizer import QueryCanonicalizer  # noqa: E402
+
+
+def make_dataset(rows=30):
+    """``rows`` pairs for products p0..; even products have a title, odd ones none"""
+    df = pd.DataFrame({
+        'searched_query': [f'query {i}' for i in range(rows)],
+        'clicked_product': [f'p{i}' for i in range(rows)],
+        'viewers': [1000 - i for i in range(rows)],
+        'clickers': 1, 'enrollers': 1, 'paid_enrollers': 0,
+        'ctr': 1.0, 'enrollment_rate': 1.0, 'paid_conversion_rate': 0.0,
+        'product_title': [f'Course {i}' if i % 2 == 0 else None for i in range(rows)],
+    })
+    ranked = list(zip(df['searched_query'], df['clicked_product'], df['viewers']))
+    return df, ranked
+
+
+def make_client(df):
+    client = standin_client(StandInServer())
+    build_product_rollups(client, df)
+    return client
+
+
+def cache(client, query, product_id):
+    client.set(explanation_key(f'{query}:{product_id}'), 'cached')
+
+
+def select(client, ranked, top_n):
+    return filter_uncached(client, ranked, top_n, ProductMetadata(client), QueryCanonicalizer())
+
+
+def test_pages_past_cached_pairs_until_top_n_found():
+    df, ranked = make_dataset()
+    client = make_client(df)
+    # The four best-ranked pairs with metadata are cached already
+    for i in (0, 2, 4, 6):
+        cache(client, f'query {i}', f'p{i}')
+
+    selected, skipped = select(client, ranked, 3)
+    assert [product_id for _, _, product_id, _, _ in selected] == ['p8', 'p10', 'p12']
+
+
+def test_pairs_without_metadata_are_skipped():
+    df, ranked = make_dataset()
+    selected, skipped = select(make_client(df), ranked, 100)
+    assert len(selected) == 15
+    assert skipped == 15
+    assert all(details['title'] for *_, details in selected)
+
+
+def test_metadata_file_takes_precedence_over_rollups(tmp_path):
+    df, ranked = make_dataset(4)
+    client = make_client(df)
+    path = tmp_path / 'products.jsonl'
+    path.write_text(json.dumps({'productId': 'p1', 'title': 'From file', 'partner': 'X'}) + '\n')
+
+    metadata = ProductMetadata.load(client, metadata_path=str(path))
+    selected, _ = filter_uncached(client, ranked, 10, metadata, QueryCanonicalizer())
+    titles = {product_id: details['title'] for _, _, product_id, _, details in selected}
+    assert titles == {'p0': 'Course 0', 'p1': 'From file', 'p2': 'Course 2'}
+
+
+def test_checkpointed_but_evicted_pairs_are_selected_again(tmp_path):
+    df, ranked = make_dataset(4)
+    client = make_client(df)
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.jsonl'))
+    checkpoint.record('query 0:p0', 'ok')
+
+    selected, _ = select(client, ranked, 10)
+    assert 'query 0:p0' in [cache_key for cache_key, *_ in selected]
+
+
+def test_prewarm_writes_explanations_with_course_context():
+    df, ranked = make_dataset(4)
+    client = make_client(df)
+    backend = StubBackend(delay=0)
+    selected, _ = select(client, ranked, 10)
+
+    stats = prewarm(client, selected, backend, concurrency=2, rate=0)
+    assert stats == {'generated': 2, 'failed': 0}
+    assert backend.calls == 2
+    entry = ExplanationCodec().decode(get_raw(client, explanation_key('query 0:p0')), client)
+    assert entry['title'] == 'Course 0'
+    assert entry['prewarmed'] is True
+    assert 'Course 0' in entry['sections']['📋 Summary']
+
+
+def test_prewarmed_entries_start_with_hits_from_traffic():
+    assert [starting_hits(viewers) for viewers in (0, 1, 3, 1000, 10 ** 6)] == [1, 1, 2, 10, 20]
+    df, ranked = make_dataset(2)
+    client = make_client(df)
+    selected, _ = select(client, ranked, 10)
+    policy = ExplanationCachePolicy(base_ttl=24 * 3600, max_ttl=30 * 24 * 3600)
+
+    prewarm(client, selected, StubBackend(delay=0), rate=0, policy=policy)
+    # 1000 viewers: ten hits, which earn the longest TTL
+    assert client.zscore(FREQ_KEY, 'query 0:p0') == 10
+    assert client.ttl(explanation_key('query 0:p0')) > 29 * 24 * 3600
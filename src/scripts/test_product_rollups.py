@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+"""Per-product aggregation and reloads of ``product_rollups``, on the Redis stand-in.
+
+``python3 -m pytest src/scripts``.
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from product_rollups import PRODUCT_SET_KEY, build_product_rollups, compute_rollups, product_rollup_key  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+
+def make_dataset(products):
+    rows = [{'searched_query': query, 'clicked_product': product_id, 'viewers': viewers,
+             'clickers': 1, 'enrollers': 1, 'paid_enrollers': 0,
+             'ctr': ctr, 'enrollment_rate': 1.0, 'paid_conversion_rate': 0.0}
+            for product_id in products
+            for query, viewers, ctr in (('ai', 300, 10.0), ('ml', 100, 30.0))]
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def client():
+    return standin_client(StandInServer())
+
+
+def test_rates_are_viewer_weighted():
+    rollup = compute_rollups(make_dataset(['abc']))['abc']
+    assert rollup['queries'] == 2
+    assert rollup['viewers'] == 400
+    assert rollup['ctr'] == 15.0
+    assert [entry['query'] for entry in rollup['top_queries']] == ['ai', 'ml']
+
+
+def test_reload_drops_rollups_of_departed_products(client):
+    assert build_product_rollups(client, make_dataset(['abc', 'gone'])) == 2
+    assert client.smembers(PRODUCT_SET_KEY) == {'abc', 'gone'}
+
+    assert build_product_rollups(client, make_dataset(['abc', 'new'])) == 2
+    assert not client.exists(product_rollup_key('gone'))
+    assert json.loads(client.get(product_rollup_key('new')))['viewers'] == 400
+    assert client.smembers(PRODUCT_SET_KEY) == {'abc', 'new'}
+
+
+def test_first_reload_finds_rollups_by_prefix(client):
+    # Stored by a load from before the id set existed
+    client.set(product_rollup_key('old'), '{}')
+    build_product_rollups(client, make_dataset(['abc']))
+    assert not client.exists(product_rollup_key('old'))
+    assert client.exists(product_rollup_key('abc'))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""Per-node scans and merges behind the ``query_data.py analytics`` report, on the Redis stand-in.
+
+``python3 -m pytest src/scripts``.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'data'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from query_data import NodeStats, cluster_analytics, distribution, scan_node  # noqa: E402
+from query_index import QUERY_INDEX_KEY  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+
+def metrics(viewers, enrollment_rate, ctr=5.0):
+    return json.dumps({'viewers': viewers, 'ctr': ctr, 'enrollment_rate': enrollment_rate})
+
+
+class FakeCluster:
+    """``get_primaries`` / ``get_redis_connection`` over one stand-in per primary"""
+
+    def __init__(self, clients):
+        self.clients = clients
+
+    def get_primaries(self):
+        return list(range(len(self.clients)))
+
+    def get_redis_connection(self, node):
+        return self.clients[node]
+
+
+def test_add_batch_skips_malformed_values():
+    stats = NodeStats()
+    stats.add_batch(['ai:1', 'ai:2', 'ml:3', 'ml:4', 'ml:5'],
+                    [metrics(100, 2.0), '{"viewers": 5', metrics(50, 9.0), '"not a document"', None])
+
+    assert stats.keys == 2
+    assert stats.skipped == 2
+    assert stats.query_viewers == {'ai': 100, 'ml': 50}
+    assert stats.values['viewers'] == [100, 50]
+    assert max(stats.top_enrollment) == (9.0, 50, 'ml:3')
+
+
+def test_merge_combines_counts_and_keeps_top_k():
+    first, second = NodeStats(top_k=2), NodeStats(top_k=2)
+    first.add_batch(['ai:1', 'ai:2'], [metrics(100, 1.0), metrics(10, 7.0)])
+    second.add_batch(['ai:3', 'ml:4'], [metrics(30, 5.0), metrics(20, 3.0)])
+
+    first.merge(second)
+
+    assert first.keys == 4
+    assert first.query_viewers == {'ai': 140, 'ml': 20}
+    assert sorted(first.values['viewers']) == [10, 20, 30, 100]
+    assert sorted(first.top_enrollment, reverse=True) == [(7.0, 10, 'ai:2'), (5.0, 30, 'ai:3')]
+
+
+def test_scan_node_batches_metric_keys_only():
+    client = standin_client(StandInServer())
+    for i in range(7):
+        client.set(f'ai:{i}', metrics(10 * i, float(i)))
+    client.zadd(QUERY_INDEX_KEY, {'ai': 0})
+    client.set('broken:1', 'not json')
+    client.server.log.reset()
+
+    stats = scan_node(client, top_k=3, batch_size=3)
+
+    assert stats.keys == 7
+    assert stats.skipped == 1
+    assert stats.query_viewers == {'ai': 210}
+    assert [key for _, _, key in sorted(stats.top_enrollment, reverse=True)] == ['ai:6', 'ai:5', 'ai:4']
+    assert QUERY_INDEX_KEY not in client.server.log.keys
+
+
+def test_cluster_analytics_merges_every_primary():
+    clients = [standin_client(StandInServer()) for _ in range(3)]
+    for node, client in enumerate(clients):
+        client.set(f'ai:{node}', metrics(100, float(node)))
+        client.set(f'ml:{node}', metrics(1, 0.5))
+
+    stats, nodes = cluster_analytics(FakeCluster(clients), top_k=2)
+
+    assert nodes == 3
+    assert stats.keys == 6
+    assert stats.query_viewers == {'ai': 300, 'ml': 3}
+    assert [key for _, _, key in sorted(stats.top_enrollment, reverse=True)] == ['ai:2', 'ai:1']
+
+
+def test_distribution_summarises_values():
+    pytest.importorskip('numpy')
+
+    assert distribution([]) is None
+    summary = distribution([1, 2, 3, 4])
+    assert summary['min'] == 1.0
+    assert summary['max'] == 4.0
+    assert summary['mean'] == 2.5
+    assert summary['p50'] == 2.5
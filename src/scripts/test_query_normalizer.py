@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""Query and cache-key canonical forms in ``query_normalizer``.
+
+``python3 -m pytest src/scripts``.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from query_normalizer import QueryCanonicalizer, clean_product_id, fold_text, stem_token  # noqa: E402
+
+
+@pytest.mark.parametrize('text, folded', [
+    ('Machine Learning ', 'machine learning'),
+    ('machine-learning', 'machine learning'),
+    ('  Data\tScience!! ', 'data science'),
+    ('Café Résumé', 'cafe resume'),
+    ('Ｐｙｔｈｏｎ', 'python'),
+    ("Beginner's Guide", 'beginners guide'),
+    ('C++', 'c++'),
+    ('C#', 'c#'),
+    ('STRASSE', 'strasse'),
+])
+def test_fold_text(text, folded):
+    assert fold_text(text) == folded
+
+
+@pytest.mark.parametrize('token, stem', [
+    ('courses', 'course'),
+    ('libraries', 'library'),
+    ('classes', 'classe'),
+    ('status', 'status'),
+    ('business', 'business'),
+    ('aws', 'aws'),
+    ('python3s', 'python3s'),
+])
+def test_stem_token(token, stem):
+    assert stem_token(token) == stem
+
+
+def test_clean_product_id():
+    assert clean_product_id('course~ABC') == 'ABC'
+    assert clean_product_id(' s12n~XYZ ') == 'XYZ'
+    assert clean_product_id('ABC') == 'ABC'
+
+
+def test_synonyms_fold_aliases_longest_first():
+    canonicalizer = QueryCanonicalizer(synonyms={'ML': 'Machine Learning', 'deep ml': 'deep learning'})
+    assert canonicalizer.canonical_query('ml') == 'machine learning'
+    assert canonicalizer.canonical_query('Intro to ML') == 'intro to machine learning'
+    assert canonicalizer.canonical_query('deep ML') == 'deep learning'
+    # Whole words only
+    assert canonicalizer.canonical_query('html') == 'html'
+
+
+def test_stemming_is_opt_in():
+    assert QueryCanonicalizer().canonical_query('Python Courses') == 'python courses'
+    assert QueryCanonicalizer(stemming=True).canonical_query('Python Courses') == 'python course'
+
+
+def test_canonical_key_splits_on_last_colon():
+    canonicalizer = QueryCanonicalizer()
+    assert canonicalizer.canonical_key('AI!:course~abc') == 'ai:abc'
+    assert canonicalizer.canonical_key('python: the basics:xyz') == 'python the basics:xyz'
+    assert canonicalizer.canonical_key('Data Science') == 'data science'
+
+
+def test_hit_rate_counts_folded_hits():
+    canonicalizer = QueryCanonicalizer()
+    entry = {'query': 'machine learning', 'productId': 'abc'}
+    canonicalizer.record_lookup('machine learning:abc', 'machine learning:abc', entry)
+    canonicalizer.record_lookup('Machine-Learning:abc', 'machine learning:abc', entry)
+    canonicalizer.record_lookup('ai:xyz', 'ai:xyz', None)
+    stats = canonicalizer.stats()
+    assert stats['lookups'] == 3
+    assert stats['hits'] == 2
+    assert stats['folded_hits'] == 1
+    assert stats['keys_rewritten'] == 1
+    assert stats['hit_rate_before'] == pytest.approx(1 / 3, abs=1e-4)
+    assert stats['hit_rate_after'] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_from_env_reads_synonyms_file(tmp_path, monkeypatch):
+    path = tmp_path / 'synonyms.json'
+    path.write_text(json.dumps({'ml': 'machine learning'}))
+    monkeypatch.setenv('QUERY_SYNONYMS_FILE', str(path))
+    monkeypatch.setenv('QUERY_STEMMING', 'yes')
+    canonicalizer = QueryCanonicalizer.from_env()
+    assert canonicalizer.stemming
+    assert canonicalizer.canonical_query('ML Courses') == 'machine learning course'
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+"""Redis command-budget regression harness for the API servers.
+
+Every endpoint of every server variant is called against an in-memory Redis
+stand-in (no Docker, no network). The harness counts the commands, network
+round trips and keys each call issues and fails when an endpoint goes over its
+declared budget, so an extra round trip shows up as a failing check instead of
+as a slow overlay in the extension.
+
+Run directly (``python3 src/scripts/test_redis_budget.py``) or through pytest.
+"""
+
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(SCRIPTS_DIR, '..', 'api')
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, API_DIR)
+
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from explanation_backends import StubBackend  # noqa: E402
+from explanation_policy import BYTES_KEY, FREQ_KEY, LAST_ACCESS_KEY, SIZE_KEY  # noqa: E402
+from query_index import QUERY_INDEX_KEY, index_member  # noqa: E402
+from fuzzy_index import TrigramIndex  # noqa: E402
+from metric_history import append_day, day_number, encode_series, history_key, pack_values  # noqa: E402
+
+PRODUCT_ID = 'mR7MlUaTEemuHQ4HpHozrA'
+
+SAMPLE_METRICS = {
+    'viewers': 1200,
+    'clickers': 150,
+    'enrollers': 40,
+    'paid_enrollers': 12,
+    'ctr': 12.5,
+    'enrollment_rate': 3.33,
+    'paid_conversion_rate': 1.0,
+}
+
+# Two weeks of daily history for one pair, as the loader appends it
+SEED_HISTORY = []
+for offset in range(14):
+    SEED_HISTORY = append_day(SEED_HISTORY, day_number('2025-07-17') - 13 + offset,
+                              pack_values({**SAMPLE_METRICS, 'viewers': SAMPLE_METRICS['viewers'] + offset * 10}))
+
+SEED_DATA = {
+    f'ai:{PRODUCT_ID}': json.dumps(SAMPLE_METRICS),
+    'ai:daG-a-O1EeijKBISCWxf6g': json.dumps(SAMPLE_METRICS),
+    'machine learning:Gtv4Xb1-EeS-ViIACwYKVQ': json.dumps(SAMPLE_METRICS),
+    f'product_rollup:{PRODUCT_ID}': json.dumps({
+        **SAMPLE_METRICS,
+        'product_id': PRODUCT_ID,
+        'queries': 1,
+        'top_queries': [{'query': 'ai', 'viewers': 1200}],
+    }),
+    history_key('ai', PRODUCT_ID): encode_series(SEED_HISTORY),
+    f'ai_explanation:ai:{PRODUCT_ID}': json.dumps({
+        'sections': {'📋 Summary': 'Cached summary'},
+        'query': 'ai',
+        'productId': PRODUCT_ID,
+    }),
+    # Written before the cache policy existed: no metadata
+    'ai_explanation:ai:daG-a-O1EeijKBISCWxf6g': json.dumps({
+        'sections': {'📋 Summary': 'Legacy summary'},
+        'query': 'ai',
+        'productId': 'daG-a-O1EeijKBISCWxf6g',
+    }),
+}
+
+# Policy metadata for the cached explanation: tracked, and two hits in, so the
+# next hit is not a TTL promotion
+TRACKED_EXPLANATION = f'ai:{PRODUCT_ID}'
+TRACKED_HITS = 2
+
+GENERATE_POST = {
+    'query': 'machine learning',
+    'productDetails': {'productId': 'Gtv4Xb1-EeS-ViIACwYKVQ', 'title': 'Machine Learning'},
+    'rawExplanation': 'FALLBACK_MODE',
+}
+
+EXPLANATION_POST = {
+    'key': f'ai:{PRODUCT_ID}',
+    'data': {'sections': {'📋 Summary': 'Fresh summary'}},
+    'query': 'ai',
+    'productId': PRODUCT_ID,
+    'title': 'AI For Everyone',
+}
+
+
+def check(label, path, status, commands, round_trips=None, keys=None, method='GET', body=None):
+    """Declare the Redis budget for one endpoint call"""
+    return {
+        'label': label,
+        'method': method,
+        'path': path,
+        'status': status,
+        'commands': commands,
+        'round_trips': round_trips if round_trips is not None else commands,
+        'keys': keys,
+        'body': body,
+    }
+
+
+# Per-server budgets. ``commands`` counts every Redis command (pipelined ones
+# included), ``round_trips`` counts network round trips and ``keys`` counts the
+# key arguments touched.
+BUDGETS = {
+    'api_server_8080': {
+        'client_attr': 'r',
+        'checks': [
+            # Probed inline only while the background health monitor's state is missing or old
+            check('/health', '/health', 200, commands=2),
+            check('/metrics (hit)', f'/metrics/ai/{PRODUCT_ID}', 200, commands=1, keys=1),
+            # The exact/lowercase/fuzzy fallback chain is one lookup_fallback script call
+            check('/metrics (case fallback hit)', f'/metrics/AI/{PRODUCT_ID}', 200, commands=1, keys=2),
+            check('/metrics (miss)', '/metrics/ai/unknown', 404, commands=1, keys=1),
+            check('/metrics (fuzzy hit)', '/metrics/machine lerning/Gtv4Xb1-EeS-ViIACwYKVQ?fuzzy=1', 200,
+                  commands=1),
+            # One SCAN per variant tried, then one MGET per page of matches (ranked on the client)
+            check('/search', '/search/ai', 200, commands=2),
+            check('/search (case fallback)', '/search/AI', 200, commands=3),
+            check('/search (fuzzy)', '/search/machine lerning?fuzzy=1', 200, commands=3),
+            check('/search (top N)', '/search/ai?limit=1', 200, commands=2),
+            # DBSIZE plus the query index and policy counts; KEYS fails any check
+            check('/stats', '/stats', 200, commands=4, round_trips=1),
+            check('/queries', '/queries?prefix=Mach&limit=10', 200, commands=1, keys=1),
+            check('/queries/resolve', '/queries/resolve/machine lerning', 200, commands=0),
+            check('/product (hit)', f'/product/course~{PRODUCT_ID}', 200, commands=1, keys=1),
+            check('/product (miss)', '/product/unknown', 404, commands=1, keys=1),
+            # The whole series is one packed value; the lowercase variant rides in the same MGET
+            check('/trend (hit)', f'/trend/ai/course~{PRODUCT_ID}?days=7', 200, commands=1, keys=1),
+            check('/trend (case fallback hit)', f'/trend/AI/{PRODUCT_ID}', 200, commands=1, keys=2),
+            check('/trend (miss)', '/trend/ai/unknown', 404, commands=1, keys=1),
+            # Hits and misses pipeline the GET with the policy's access bookkeeping
+            check('/ai-explanation (hit)', f'/ai-explanation/ai:{PRODUCT_ID}', 200, commands=3, round_trips=1),
+            # Query/product-id variants fold onto the same canonical entry
+            check('/ai-explanation (variant hit)', f'/ai-explanation/AI!:course~{PRODUCT_ID}', 200,
+                  commands=3, round_trips=1),
+            # An entry without metadata is adopted in a second round trip
+            check('/ai-explanation (untracked hit)', '/ai-explanation/ai:daG-a-O1EeijKBISCWxf6g', 200,
+                  commands=7, round_trips=2),
+            check('/ai-explanation (miss)', '/ai-explanation/ai:unknown', 404, commands=3, round_trips=1),
+            # Overwrites the tracked entry: a second round trip takes back the old
+            # size and keeps the TTL the entry had earned
+            check('POST /ai-explanation', '/ai-explanation', 200, commands=10, round_trips=2,
+                  method='POST', body=EXPLANATION_POST),
+            # The page's MGET and the access bookkeeping share one pipeline
+            check('POST /ai-explanation/batch', '/ai-explanation/batch', 200, commands=5, round_trips=1,
+                  method='POST', body={'keys': [f'ai:{PRODUCT_ID}', 'ai:unknown', 'ml:unknown']}),
+            # Miss: lookup round trip, then the policy's write round trip
+            check('POST /ai-explanation/generate', '/ai-explanation/generate', 200, commands=11,
+                  round_trips=2, method='POST', body=GENERATE_POST),
+            # Policy counters, then an expiry check of the sampled entries, then the
+            # footprint sample's SCAN and MGET
+            check('/ai-explanation/stats', '/ai-explanation/stats', 200, commands=11, round_trips=4),
+            # Metadata UNLINK rides with the first SCAN, each page's UNLINK with the next SCAN
+            check('/ai-explanation/flush', '/ai-explanation/flush', 200, commands=3, round_trips=2),
+        ],
+    },
+    'api_server': {
+        'client_attr': 'rc',
+        'cluster': True,
+        'checks': [
+            check('/health', '/health', 200, commands=2),
+            check('/metrics (hit)', f'/metrics/ai/{PRODUCT_ID}', 200, commands=1, keys=1),
+            check('/metrics (miss)', '/metrics/ai/unknown', 200, commands=1, keys=1),
+            check('/search', '/search/ai', 200, commands=2),
+            check('/stats', '/stats', 200, commands=2),
+            check('/queries', '/queries?prefix=Mach&limit=10', 200, commands=1, keys=1),
+            check('/product (hit)', f'/product/course~{PRODUCT_ID}', 200, commands=1, keys=1),
+            check('/stats/reads', '/stats/reads', 200, commands=0),
+        ],
+    },
+    'api_server_simple': {
+        'client_attr': 'r',
+        'checks': [
+            check('/health', '/health', 200, commands=2),
+            check('/metrics (hit)', f'/metrics/ai/{PRODUCT_ID}', 200, commands=1, keys=1),
+            check('/metrics (miss)', '/metrics/ai/unknown', 404, commands=1, keys=1),
+            check('/search', '/search/ai', 200, commands=2),
+            check('/stats', '/stats', 200, commands=2, round_trips=1),
+        ],
+    },
+    'api_server_https': {
+        'client_attr': 'r',
+        'checks': [
+            check('/health', '/health', 200, commands=2),
+            check('/metrics (hit)', f'/metrics/ai/{PRODUCT_ID}', 200, commands=1, keys=1),
+            check('/metrics (miss)', '/metrics/ai/unknown', 404, commands=1, keys=1),
+            check('/search', '/search/ai', 200, commands=2),
+            check('/stats', '/stats', 200, commands=2, round_trips=1),
+        ],
+    },
+}
+
+
+# Prefix index entries the loader would build for SEED_DATA
+SEED_QUERY_INDEX = {
+    index_member('ai', 2400, 2): 0.0,
+    index_member('machine learning', 1200, 1): 0.0,
+}
+
+
+def make_client(cluster=False):
+    """Create a stand-in client seeded with the sample dataset"""
+    server = StandInServer()
+    server.seed(SEED_DATA)
+    server.data[QUERY_INDEX_KEY.encode()] = ('zset', {member.encode(): score
+                                                      for member, score in SEED_QUERY_INDEX.items()})
+    # The servers load their Lua scripts when they connect
+    server.load_scripts()
+    client = standin_client(server)
+    size = len(SEED_DATA[f'ai_explanation:{TRACKED_EXPLANATION}'].encode())
+    client.zadd(FREQ_KEY, {TRACKED_EXPLANATION: TRACKED_HITS})
+    client.zadd(LAST_ACCESS_KEY, {TRACKED_EXPLANATION: 0})
+    client.hset(SIZE_KEY, TRACKED_EXPLANATION, size)
+    client.set(BYTES_KEY, size)
+    if cluster:
+        # RedisCluster's non-atomic MGET splits keys per node; one node here
+        client.mget_nonatomic = client.mget
+    return client
+
+
+def run_check(module, client_attr, cluster, spec):
+    """Call one endpoint and return its Redis usage plus any budget violations"""
+    client = make_client(cluster)
+    setattr(module, client_attr, client)
+    log = client.server.log
+    log.reset()
+
+    test_client = module.app.test_client()
+    if spec['method'] == 'POST':
+        response = test_client.post(spec['path'], json=spec['body'])
+    else:
+        response = test_client.get(spec['path'])
+
+    usage = log.summary()
+    problems = []
+    if response.status_code != spec['status']:
+        problems.append(f"status {response.status_code} != {spec['status']}")
+    if 'KEYS' in usage['command_names']:
+        problems.append("KEYS walks the whole keyspace")
+    for field in ('commands', 'round_trips', 'keys'):
+        limit = spec[field]
+        if limit is not None and usage[field] > limit:
+            problems.append(f"{field} {usage[field]} > budget {limit}")
+    return usage, problems
+
+
+def run_budget_checks(verbose=True):
+    """Run every declared budget and return a list of failure descriptions"""
+    failures = []
+    for module_name, config in BUDGETS.items():
+        module = importlib.import_module(module_name)
+        if hasattr(module, 'explanation_backend'):
+            module.explanation_backend = StubBackend()
+        if hasattr(module, 'fuzzy_index'):
+            module.fuzzy_index = TrigramIndex.build(['ai', 'machine learning'], [2400, 1200])
+            # As if the dataset stamp was just checked: no reload inside the checks
+            module.fuzzy_index_checked = time.monotonic()
+        logging.getLogger(module_name).setLevel(logging.WARNING)
+        if verbose:
+            print(f"\n🧪 {module_name}")
+        for spec in config['checks']:
+            usage, problems = run_check(module, config['client_attr'], config.get('cluster', False), spec)
+            if verbose:
+                marker = '❌' if problems else '✅'
+                print(f"   {marker} {spec['label']:<32} commands={usage['commands']}/{spec['commands']} "
+                      f"round_trips={usage['round_trips']}/{spec['round_trips']} "
+                      f"keys={usage['keys']} {' '.join(usage['command_names'])}")
+                for problem in problems:
+                    print(f"      ↳ {problem}")
+            failures.extend(f"{module_name} {spec['label']}: {problem}" for problem in problems)
+    return failures
+
+
+def test_redis_command_budgets():
+    failures = run_budget_checks(verbose=False)
+    assert not failures, '\n'.join(failures)
+
+
+if __name__ == '__main__':
+    print("🧪 Redis Command Budget Harness")
+    print("=" * 40)
+    failures = run_budget_checks()
+    print()
+    if failures:
+        print(f"❌ {len(failures)} budget violation(s)")
+        sys.exit(1)
+    print("🎉 All endpoints within their Redis budgets")
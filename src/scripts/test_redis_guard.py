@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+"""Circuit breaker, stale copies and health probing in ``redis_guard``.
+
+Runs offline with a fake clock: ``python3 -m pytest src/scripts``.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+from redis.exceptions import ConnectionError, ResponseError
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'api'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+import redis_guard  # noqa: E402
+from redis_guard import CircuitBreaker, CircuitOpenError, GuardedRedis, HealthMonitor, StaleCache  # noqa: E402
+from redis_standin import StandInServer, standin_client  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the ``time`` module inside ``redis_guard``"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+    time = monotonic
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FlakyRedis:
+    """Callable Redis stand-in: raises while ``down``, takes ``latency`` seconds per call"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.down = False
+        self.latency = 0.0
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        self.clock.advance(self.latency)
+        if self.down:
+            raise ConnectionError('Connection refused')
+        return 'PONG'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(redis_guard, 'time', clock)
+    return clock
+
+
+def fail(breaker, redis_call, times):
+    for _ in range(times):
+        with pytest.raises(ConnectionError):
+            breaker.call(redis_call)
+
+
+def test_breaker_closed_open_half_open_closed(clock):
+    breaker = CircuitBreaker(failure_threshold=3, latency_threshold=0.5, reset_timeout=10)
+    redis_call = FlakyRedis(clock)
+    redis_call.down = True
+
+    fail(breaker, redis_call, 2)
+    assert breaker.state == 'closed'
+    fail(breaker, redis_call, 1)
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 1
+
+    # Open: fail fast without calling Redis
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.call(redis_call)
+    assert raised.value.retry_after == 10
+    assert redis_call.calls == 3
+    assert breaker.rejecting()
+
+    clock.advance(10)
+    assert not breaker.rejecting()
+    redis_call.down = False
+    seen_during_probe = []
+
+    def probe():
+        # Only the probe gets through while half-open
+        seen_during_probe.append((breaker.state, breaker.allow()))
+        return redis_call()
+
+    assert breaker.call(probe) == 'PONG'
+    assert seen_during_probe == [('half_open', False)]
+    assert breaker.state == 'closed'
+    assert breaker.failures == 0
+    assert breaker.rejected == 2
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    redis_call = FlakyRedis(clock)
+    redis_call.down = True
+    fail(breaker, redis_call, 1)
+    clock.advance(5)
+    fail(breaker, redis_call, 1)
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 2
+    assert breaker.retry_after() == 5
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, latency_threshold=0.5)
+    redis_call = FlakyRedis(clock)
+    redis_call.latency = 0.6
+    breaker.call(redis_call)
+    breaker.call(redis_call)
+    assert breaker.state == 'open'
+    assert breaker.last_latency_ms == 600
+
+
+def test_success_resets_and_caller_errors_do_not_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    redis_call = FlakyRedis(clock)
+    redis_call.down = True
+    fail(breaker, redis_call, 1)
+    redis_call.down = False
+    breaker.call(redis_call)
+    assert breaker.failures == 0
+
+    def wrong_type():
+        raise ResponseError('WRONGTYPE Operation against a key holding the wrong kind of value')
+
+    for _ in range(3):
+        with pytest.raises(ResponseError):
+            breaker.call(wrong_type)
+    assert breaker.state == 'closed'
+
+
+def test_guarded_client_fails_fast_once_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    # Nothing listens on port 1: every command raises ConnectionError
+    client = GuardedRedis(host='localhost', port=1, socket_connect_timeout=0.2, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            client.get('key')
+    with pytest.raises(CircuitOpenError):
+        client.get('key')
+    pipe = client.pipeline(transaction=False)
+    pipe.get('key')
+    with pytest.raises(CircuitOpenError):
+        pipe.execute()
+    assert breaker.stats()['state'] == 'open'
+    assert breaker.stats()['rejected_calls'] == 2
+
+
+def test_stale_cache(clock):
+    assert StaleCache().get('/metrics/ai/x') == (None, None)
+
+    cache = StaleCache(enabled=True, max_entries=2, max_age=60)
+    cache.remember('/a', {'value': 1})
+    clock.advance(30)
+    assert cache.get('/a') == ({'value': 1}, 30)
+    clock.advance(31)
+    assert cache.get('/a') == (None, None)
+
+    for path in ('/a', '/b', '/c'):
+        cache.remember(path, {'path': path})
+    assert cache.get('/a') == (None, None)
+    assert cache.get('/c')[0] == {'path': '/c'}
+    assert cache.stats() == {'enabled': True, 'entries': 2, 'served': 2}
+
+
+def test_health_monitor_caches_probe(clock):
+    redis_call = FlakyRedis(clock)
+
+    def probe():
+        redis_call()
+        return {'redis_connected': True}
+
+    monitor = HealthMonitor(probe, interval=2)
+    assert monitor.current()['redis_connected']
+    clock.advance(5)
+    monitor.current()
+    assert redis_call.calls == 1
+    # Stale beyond three intervals (background thread not running): probe inline
+    clock.advance(2)
+    redis_call.down = True
+    state = monitor.current()
+    assert redis_call.calls == 2
+    assert state == {'redis_connected': False, 'error': 'Connection refused', 'probe_ms': 0.0}
+
+
+def test_server_serves_stale_copy_while_open(monkeypatch):
+    server = pytest.importorskip('api_server_8080')
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    standin = standin_client(StandInServer())
+    standin.server.load_scripts()
+    standin.set('ai:abc', json.dumps({'viewers': 12}))
+    client = GuardedRedis(connection_pool=standin.connection_pool, breaker=breaker)
+    monkeypatch.setattr(server, 'r', client)
+    monkeypatch.setattr(server, 'redis_breaker', breaker)
+    monkeypatch.setattr(server, 'stale_cache', StaleCache(enabled=True))
+    monkeypatch.setattr(server, 'metrics_snapshot', None)
+    test_client = server.app.test_client()
+
+    fresh = test_client.get('/metrics/ai/abc')
+    assert fresh.status_code == 200
+    assert 'stale' not in fresh.get_json()
+
+    breaker.record(0, True)
+    assert breaker.state == 'open'
+    stale = test_client.get('/metrics/ai/abc')
+    assert stale.status_code == 200
+    payload = stale.get_json()
+    assert payload.pop('stale') is True
+    assert payload.pop('stale_age_seconds') >= 0
+    assert payload == fresh.get_json()
+
+    # Nothing remembered for this URL, and routes without stale copies fail fast
+    for path in ('/metrics/ai/other', '/ai-explanation/stats'):
+        response = test_client.get(path)
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
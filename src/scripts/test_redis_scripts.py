@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""Lua scripts and client-side keyspace walks in ``redis_scripts``.
+
+The stand-in runs Python equivalents of the scripts, so the tests marked
+``real_redis`` also run the actual Lua (and multi-page SCANs) against a
+server when ``REDIS_TEST_URL`` is set, e.g.
+``REDIS_TEST_URL=redis://localhost:6379/15 python3 -m pytest src/scripts``.
+They only touch keys under a random prefix.
+"""
+
+import json
+import os
+import sys
+import uuid
+
+import pytest
+import redis
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'api'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from redis_standin import StandInServer, standin_client  # noqa: E402
+from redis_scripts import RATE_LIMIT_PREFIX, ScriptLibrary, delete_matching, search_ranked  # noqa: E402
+
+# Product ids in the opposite order of their viewers
+VIEWERS = {'aaa': 10, 'bbb': 300, 'ccc': 20, 'ddd': 4000}
+RANKED = ['ddd', 'bbb', 'ccc', 'aaa']
+
+
+def seed_query(client, query):
+    client.mset({f"{query}:{product_id}": json.dumps({'viewers': viewers})
+                 for product_id, viewers in VIEWERS.items()})
+
+
+@pytest.fixture
+def standin():
+    return standin_client(StandInServer())
+
+
+@pytest.fixture
+def real_redis():
+    url = os.environ.get('REDIS_TEST_URL')
+    if not url:
+        pytest.skip('REDIS_TEST_URL not set')
+    client = redis.Redis.from_url(url, decode_responses=True)
+    try:
+        client.ping()
+    except redis.ConnectionError as e:
+        pytest.skip(f"Redis at {url} unreachable: {e}")
+    prefix = f"test_redis_scripts:{uuid.uuid4().hex}:"
+    yield client, prefix
+    keys = list(client.scan_iter(match=f"{prefix}*")) + list(client.scan_iter(match=f"{RATE_LIMIT_PREFIX}{prefix}*"))
+    if keys:
+        client.delete(*keys)
+
+
+def test_search_ranked_orders_by_viewers(standin):
+    seed_query(standin, 'ai')
+    index, rows = search_ranked(standin, ['ai:*'])
+    assert index == 0
+    assert [key.split(':', 1)[1] for key, _ in rows] == RANKED
+    _, top = search_ranked(standin, ['ai:*'], limit=2)
+    assert [key for key, _ in top] == ['ai:ddd', 'ai:bbb']
+
+
+def test_search_ranked_uses_first_pattern_with_values(standin):
+    seed_query(standin, 'ai')
+    assert search_ranked(standin, ['AI:*', 'ai:*'])[0] == 1
+    assert search_ranked(standin, ['none:*']) == (None, [])
+
+
+def test_delete_matching_removes_pattern_and_extra_keys(standin):
+    seed_query(standin, 'ai')
+    standin.set('ai_meta', '1')
+    standin.set('other:aaa', '1')
+    assert delete_matching(standin, 'ai:*', ['ai_meta']) == len(VIEWERS)
+    assert standin.keys('*') == ['other:aaa']
+
+
+def test_search_endpoint_keeps_ranking_order(standin):
+    server = pytest.importorskip('api_server_8080')
+    seed_query(standin, 'ai')
+    server.r = standin
+    response = server.app.test_client().get('/search/ai')
+    assert response.status_code == 200
+    # json.loads keeps the order the server wrote the keys in
+    assert list(json.loads(response.data)['results']) == RANKED
+    response = server.app.test_client().get('/search/ai?limit=3')
+    assert list(json.loads(response.data)['results']) == RANKED[:3]
+
+
+def test_scripts_reload_after_noscript(standin):
+    library = ScriptLibrary()
+    library.load(standin)
+    standin.set('b', 'two')
+    standin.script_flush()
+    assert library.lookup_fallback(standin, ['a', 'b']) == (1, 'two')
+    assert library.reloads == 1
+
+
+def test_real_lookup_fallback(real_redis):
+    client, prefix = real_redis
+    library = ScriptLibrary()
+    library.load(client)
+    client.set(f"{prefix}b", 'two')
+    client.set(f"{prefix}c", 'three')
+    assert library.lookup_fallback(client, [f"{prefix}a", f"{prefix}b", f"{prefix}c"]) == (1, 'two')
+    assert library.lookup_fallback(client, [f"{prefix}a"]) == (None, None)
+
+
+def test_real_token_bucket(real_redis):
+    client, prefix = real_redis
+    library = ScriptLibrary()
+    library.load(client)
+    bucket = f"{prefix}client"
+    assert library.token_bucket(client, bucket, 10, 2, 1, 1000) == 0
+    assert library.token_bucket(client, bucket, 10, 2, 1, 1000) == 0
+    # Empty: one token takes 100 ms at 10/s
+    assert library.token_bucket(client, bucket, 10, 2, 1, 1000) == 0.1
+    assert library.token_bucket(client, bucket, 10, 2, 1, 1100) == 0
+    assert client.ttl(f"{RATE_LIMIT_PREFIX}{bucket}") > 0
+
+
+def test_real_search_and_delete_across_pages(real_redis):
+    client, prefix = real_redis
+    seed_query(client, f"{prefix}ai")
+    # COUNT 1 forces several SCAN pages
+    index, rows = search_ranked(client, [f"{prefix}AI:*", f"{prefix}ai:*"], count=1)
+    assert index == 1
+    assert [key.rsplit(':', 1)[1] for key, _ in rows] == RANKED
+    client.set(f"{prefix}meta", '1')
+    assert delete_matching(client, f"{prefix}ai:*", [f"{prefix}meta"], batch=1) == len(VIEWERS)
+    assert list(client.scan_iter(match=f"{prefix}*")) == []
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""Node choice, replica health and fallbacks of ``replica_reads.ReplicaReader``.
+
+Uses a fake cluster client (slot map, per-node connections); no Redis needed.
+``python3 -m pytest src/scripts``.
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from redis.exceptions import ConnectionError
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from replica_reads import ReplicaReader  # noqa: E402
+
+HEALTHY = {'master_link_status': 'up', 'master_sync_in_progress': 0, 'master_last_io_seconds_ago': 1}
+
+
+class FakeNode:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeConnection:
+    def __init__(self, cluster, node):
+        self.cluster = cluster
+        self.node = node
+
+    def _serve(self):
+        if self.node.name in self.cluster.down:
+            raise ConnectionError(f"{self.node.name} is down")
+        self.cluster.served.append(self.node.name)
+
+    def get(self, key):
+        self._serve()
+        return self.cluster.data.get(key)
+
+    def dbsize(self):
+        self._serve()
+        return 1
+
+    def info(self, section):
+        if self.node.name in self.cluster.down:
+            raise ConnectionError(f"{self.node.name} is down")
+        self.cluster.info_calls += 1
+        return self.cluster.replication.get(self.node.name, HEALTHY)
+
+
+class FakeCluster:
+    """Slot ``n`` is owned by shard ``n``; keys are ``<slot>:<anything>``"""
+
+    def __init__(self, shards):
+        self.nodes_manager = SimpleNamespace(slots_cache={
+            slot: [FakeNode(primary)] + [FakeNode(replica) for replica in replicas]
+            for slot, (primary, replicas) in enumerate(shards.items())
+        })
+        self.data = {}
+        self.replication = {}
+        self.down = set()
+        self.served = []
+        self.info_calls = 0
+        self.cluster_reads = 0
+
+    def keyslot(self, key):
+        return int(key.split(':')[0])
+
+    def get_redis_connection(self, node):
+        return FakeConnection(self, node)
+
+    def get(self, key):
+        self.cluster_reads += 1
+        return self.data.get(key)
+
+
+@pytest.fixture
+def cluster():
+    cluster = FakeCluster({'p0': ['r0a', 'r0b'], 'p1': ['r1a']})
+    cluster.data = {'0:a': 'zero', '1:a': 'one'}
+    return cluster
+
+
+def test_round_robin_rotates_over_primary_and_replicas(cluster):
+    reader = ReplicaReader('round_robin')
+
+    for _ in range(6):
+        assert reader.get(cluster, '0:a') == 'zero'
+
+    assert cluster.served == ['p0', 'r0a', 'r0b'] * 2
+    assert reader.stats()['nodes']['r0a'] == {'role': 'replica', 'reads': 2}
+
+
+def test_replicas_strategy_keeps_reads_off_the_primary(cluster):
+    reader = ReplicaReader('replicas')
+
+    for _ in range(4):
+        reader.get(cluster, '0:a')
+
+    assert cluster.served == ['r0a', 'r0b', 'r0a', 'r0b']
+
+
+def test_stale_replicas_are_skipped(cluster):
+    cluster.replication = {
+        'r0a': dict(HEALTHY, master_last_io_seconds_ago=60),
+        'r0b': dict(HEALTHY, master_link_status='down'),
+    }
+    reader = ReplicaReader('replicas', max_lag=15)
+
+    reader.get(cluster, '0:a')
+
+    assert cluster.served == ['p0']
+    assert reader.stats()['stale_replicas'] == ['r0a', 'r0b']
+    assert reader.stale_skips == 2
+
+
+def test_lag_checks_after_the_first_run_off_the_request_path(cluster):
+    reader = ReplicaReader('replicas', check_interval=0)
+    reader.get(cluster, '0:a')
+    assert cluster.info_calls == 3
+
+    cluster.replication = {'r0a': dict(HEALTHY, master_sync_in_progress=1)}
+    reader.get(cluster, '0:a')
+    reader._checker.join(timeout=5)
+
+    assert reader.stats()['stale_replicas'] == ['r0a']
+
+
+def test_failed_replica_falls_back_to_primary_and_cools_down(cluster):
+    reader = ReplicaReader('replicas', cooldown=30)
+    reader.get(cluster, '0:a')
+    cluster.down.add('r0b')
+
+    assert reader.get(cluster, '0:a') == 'zero'
+    assert reader.fallbacks == 1
+    assert reader.stats()['cooling_down'] == ['r0b']
+
+    cluster.down.clear()
+    cluster.served.clear()
+    for _ in range(3):
+        reader.get(cluster, '0:a')
+    assert cluster.served == ['r0a'] * 3
+
+
+def test_unknown_shard_falls_back_to_the_cluster_client(cluster):
+    reader = ReplicaReader('round_robin')
+    reader.get(cluster, '1:a')
+
+    value = reader._on_shard(cluster, 'gone', lambda connection: connection.get('1:a'),
+                             lambda: cluster.get('1:a'))
+
+    assert value == 'one'
+    assert cluster.cluster_reads == 1
+
+
+def test_dbsize_reads_one_node_per_shard(cluster):
+    reader = ReplicaReader('replicas')
+
+    assert reader.dbsize(cluster) == 2
+    assert sorted(cluster.served) == ['r0a', 'r1a']
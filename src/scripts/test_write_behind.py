@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+"""Write-behind queue (``write_behind``) and its wiring into the 8080 server.
+
+``python3 -m pytest src/scripts``; the server test runs on the Redis stand-in.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'api'))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, '..', 'shared'))
+from redis_standin import StandInServer, standin_client  # noqa: E402
+from write_behind import WriteBehindQueue, WriteQueueFull  # noqa: E402
+
+
+class Recorder:
+    """Flush callback that records batches and can block or fail on demand"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, batch):
+        self.entered.set()
+        self.release.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Redis unavailable')
+        self.batches.append(list(batch))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.005)
+
+
+def test_repeated_writes_coalesce():
+    flush = Recorder()
+    queue = WriteBehindQueue(flush, flush_interval=60)
+    queue.put('a', b'1')
+    queue.put('b', b'2')
+    queue.put('a', b'3')
+    queue.flush()
+    assert flush.batches == [[('a', b'3'), ('b', b'2')]]
+    assert queue.stats()['coalesced'] == 1
+    assert queue.stats()['queued'] == 2
+
+
+def test_reads_see_queued_and_in_flight_writes():
+    flush = Recorder()
+    flush.release.clear()
+    queue = WriteBehindQueue(flush, flush_interval=60)
+    queue.put('a', b'1')
+    assert queue.get('a') == b'1'
+    writer = threading.Thread(target=queue.flush)
+    writer.start()
+    flush.entered.wait(5)
+    assert queue.get_many(['a', 'b']) == {'a': b'1'}
+    flush.release.set()
+    writer.join(5)
+    assert queue.get('a') is None
+    assert len(queue) == 0
+
+
+def test_put_waits_for_room_then_gives_up():
+    flush = Recorder()
+    queue = WriteBehindQueue(flush, flush_interval=60, max_pending=1, put_timeout=0.05)
+    queue.put('a', b'1')
+    # Coalescing into a queued key never waits
+    queue.put('a', b'2')
+    with pytest.raises(WriteQueueFull):
+        queue.put('b', b'1')
+
+    queue.put_timeout = 5
+    waiter = threading.Thread(target=queue.put, args=('b', b'1'))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+    queue.flush()
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert queue.get('b') == b'1'
+
+
+def test_close_flushes_queued_writes():
+    flush = Recorder()
+    queue = WriteBehindQueue(flush, flush_interval=60).start()
+    queue.put('a', b'1')
+    queue.close()
+    assert flush.batches == [[('a', b'1')]]
+    with pytest.raises(WriteQueueFull):
+        queue.put('b', b'1')
+
+
+def test_batches_flush_on_size():
+    flush = Recorder()
+    queue = WriteBehindQueue(flush, max_batch=2, flush_interval=60).start()
+    queue.put('a', b'1')
+    queue.put('b', b'2')
+    wait_for(lambda: flush.batches)
+    assert flush.batches == [[('a', b'1'), ('b', b'2')]]
+    queue.close()
+
+
+def test_failed_batch_counts_once():
+    flush = Recorder(failures=10)
+    queue = WriteBehindQueue(flush, flush_interval=0.001, retries=3)
+    queue.put('a', b'1')
+    queue.flush()
+    stats = queue.stats()
+    assert stats['failed_batches'] == 1
+    assert stats['failed_attempts'] == 3
+    assert stats['dropped'] == 1
+
+
+def test_clear_voids_in_flight_batch():
+    flush = Recorder(failures=1)
+    flush.release.clear()
+    queue = WriteBehindQueue(flush, flush_interval=0.001, retries=3)
+    queue.put('a', b'1')
+    writer = threading.Thread(target=queue.flush)
+    writer.start()
+    flush.entered.wait(5)
+
+    cleared = []
+    clearer = threading.Thread(target=lambda: cleared.append(queue.clear()))
+    clearer.start()
+    wait_for(lambda: queue.get('a') is None)
+    # clear() waits for the write that is under way
+    assert clearer.is_alive()
+    flush.release.set()
+    clearer.join(5)
+    writer.join(5)
+
+    assert cleared == [1]
+    # The failed attempt is not retried: the batch predates the clear
+    assert flush.batches == []
+    assert queue.stats()['discarded'] == 1
+    assert queue.stats()['failed_batches'] == 0
+
+
+def test_writes_after_clear_land_after_old_batch():
+    flush = Recorder()
+    flush.release.clear()
+    queue = WriteBehindQueue(flush, flush_interval=60)
+    queue.put('a', b'old')
+    writer = threading.Thread(target=queue.flush)
+    writer.start()
+    flush.entered.wait(5)
+    queue.clear(timeout=0)
+    queue.put('a', b'new')
+    assert queue.get('a') == b'new'
+    flush.release.set()
+    writer.join(5)
+    assert flush.batches == [[('a', b'old')], [('a', b'new')]]
+
+
+def test_server_acknowledges_then_writes_one_batch(monkeypatch):
+    server = pytest.importorskip('api_server_8080')
+    client = standin_client(StandInServer())
+    queue = WriteBehindQueue(server.flush_explanation_writes, flush_interval=60)
+    monkeypatch.setattr(server, 'r', client)
+    monkeypatch.setattr(server, 'explanation_writes', queue)
+    test_client = server.app.test_client()
+    log = client.server.log
+
+    log.reset()
+    for product_id in ('one', 'two', 'three'):
+        response = test_client.post('/ai-explanation', json={
+            'key': f'ai:{product_id}',
+            'data': {'sections': {'📋 Summary': product_id}},
+            'query': 'ai',
+        })
+        assert response.status_code == 200
+    assert log.round_trips == 0
+
+    # Read-your-writes before the batch reaches Redis
+    response = test_client.get('/ai-explanation/ai:two')
+    assert response.status_code == 200
+    assert response.get_json()['sections'] == {'📋 Summary': 'two'}
+
+    log.reset()
+    queue.flush()
+    assert log.round_trips == 1
+    assert queue.stats()['batches'] == 1
+
+    test_client.get('/ai-explanation/flush')
+    assert test_client.get('/ai-explanation/ai:two').status_code == 404
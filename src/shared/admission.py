@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+"""Admission control for the API servers: stop one noisy client from saturating Redis.
+
+With ``ADMISSION_CONTROL=1``, every request passes two checks before its
+route runs:
+
+* **Per-route concurrency cap** - at most ``ADMISSION_MAX_CONCURRENT``
+  requests of one route run at once (expensive routes have lower caps in
+  ``ROUTE_CONCURRENCY``). An extra request is rejected at once and does not
+  queue behind the others.
+* **Per-client token bucket** - each client gets ``ADMISSION_RATE`` tokens per
+  second, up to ``ADMISSION_BURST``. A request costs its route's weight from
+  ``ROUTE_COSTS``: a ``/search`` walks the keyspace, so it costs more than a
+  single ``/metrics`` GET.
+
+A rejected request gets ``429`` with a ``Retry-After`` header.
+
+Buckets live in process memory by default. With ``ADMISSION_STORE=redis`` they
+live in Redis and are updated by the atomic ``token_bucket`` script, so several
+server processes share one budget per client. If Redis cannot be reached,
+the in-process buckets take over, because the limiter must not take the API
+down with it.
+
+Clients are told apart by ``request.remote_addr``, or by the header named in
+``ADMISSION_CLIENT_HEADER`` (for example ``X-Forwarded-For`` behind a proxy).
+Loopback clients skip the token bucket by default: the extension talks to
+a local server, so all of its traffic comes from ``127.0.0.1`` and would
+share one bucket. The concurrency caps still apply to them.
+
+Configuration:
+    ADMISSION_CONTROL         1 to turn admission control on (default off)
+    ADMISSION_RATE            tokens per second per client (default 50, must be > 0)
+    ADMISSION_BURST           bucket size (default 200, must be > 0)
+    ADMISSION_LIMIT_LOOPBACK  1 to rate-limit loopback clients too
+    ADMISSION_MAX_CONCURRENT  concurrent requests per route (default 16)
+    ADMISSION_ROUTE_COSTS     overrides, e.g. "get_stats=20,get_search_data=10"
+    ADMISSION_STORE           memory | redis
+    ADMISSION_CLIENT_HEADER   header identifying the client
+"""
+
+import ipaddress
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+
+from redis_scripts import ScriptLibrary
+
+# Token cost per endpoint (Flask endpoint names of all server variants); others cost 1
+ROUTE_COSTS = {
+    'get_search_data': 5,
+    'get_search_metrics': 5,
+    'get_stats': 10,
+    'batch_ai_explanations': 3,
+    'generate_ai_explanation': 10,
+    'flush_ai_cache': 10,
+}
+# Lower concurrency caps for the routes that scan the keyspace or call a model
+ROUTE_CONCURRENCY = {
+    'get_search_data': 8,
+    'get_search_metrics': 8,
+    'get_stats': 2,
+    'generate_ai_explanation': 4,
+    'flush_ai_cache': 1,
+}
+# Liveness checks are never limited
+EXEMPT_ENDPOINTS = {'health', 'health_check'}
+
+DEFAULT_RATE = 50
+DEFAULT_BURST = 200
+DEFAULT_MAX_CONCURRENT = 16
+MAX_TRACKED_CLIENTS = 10000
+
+
+def parse_costs(spec):
+    """``"endpoint=cost,..."`` -> ``{endpoint: cost}``"""
+    costs = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        endpoint, _, cost = item.partition('=')
+        costs[endpoint.strip()] = float(cost)
+    return costs
+
+
+def is_loopback(client):
+    try:
+        return ipaddress.ip_address(client).is_loopback
+    except ValueError:
+        return client == 'localhost'
+
+
+class MemoryBuckets:
+    """Token buckets in process memory, least recently seen clients dropped first"""
+
+    name = 'memory'
+
+    def __init__(self, max_clients=MAX_TRACKED_CLIENTS):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client, rate, burst, cost):
+        """Seconds until ``cost`` tokens are available (0: taken now)"""
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(client, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[client] = (tokens, now)
+            self._buckets.move_to_end(client)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisBuckets:
+    """Token buckets shared through Redis, falling back to memory when Redis fails"""
+
+    name = 'redis'
+
+    def __init__(self, get_client, scripts=None):
+        self.get_client = get_client
+        self.scripts = scripts or ScriptLibrary()
+        self.fallback = MemoryBuckets()
+        self.errors = 0
+
+    def take(self, client, rate, burst, cost):
+        redis_client = self.get_client()
+        if redis_client is not None:
+            try:
+                return self.scripts.token_bucket(redis_client, client, rate, burst, cost,
+                                                 int(time.time() * 1000))
+            except Exception:
+                self.errors += 1
+        return self.fallback.take(client, rate, burst, cost)
+
+    def __len__(self):
+        return len(self.fallback)
+
+
+class ConcurrencyLimits:
+    """Non-blocking per-route caps on requests in flight"""
+
+    def __init__(self, default=DEFAULT_MAX_CONCURRENT, per_route=None):
+        self.default = default
+        self.per_route = dict(per_route or {})
+        self.in_flight = {}
+        self._lock = threading.Lock()
+
+    def limit(self, endpoint):
+        return min(self.per_route.get(endpoint, self.default), self.default)
+
+    def acquire(self, endpoint):
+        with self._lock:
+            running = self.in_flight.get(endpoint, 0)
+            if running >= self.limit(endpoint):
+                return False
+            self.in_flight[endpoint] = running + 1
+            return True
+
+    def release(self, endpoint):
+        with self._lock:
+            self.in_flight[endpoint] -= 1
+
+
+class AdmissionController:
+    """Decides per request whether it may run now; see the module docstring"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, costs=None, concurrency=None,
+                 store=None, client_header=None, enabled=True, limit_loopback=False):
+        if rate <= 0 or burst <= 0:
+            raise ValueError(f"Admission rate and burst must be positive (got rate={rate:g}, burst={burst:g})")
+        self.rate = rate
+        self.burst = burst
+        self.costs = {**ROUTE_COSTS, **(costs or {})}
+        self.concurrency = concurrency or ConcurrencyLimits(per_route=ROUTE_CONCURRENCY)
+        self.store = store if store is not None else MemoryBuckets()
+        self.client_header = client_header
+        self.enabled = enabled
+        self.limit_loopback = limit_loopback
+        self.admitted = 0
+        self.rejected = {'rate_limited': 0, 'concurrency': 0}
+
+    @classmethod
+    def from_env(cls, get_client=None, scripts=None):
+        store = None
+        if os.environ.get('ADMISSION_STORE', 'memory').lower() == 'redis' and get_client is not None:
+            store = RedisBuckets(get_client, scripts)
+        return cls(
+            rate=float(os.environ.get('ADMISSION_RATE', DEFAULT_RATE)),
+            burst=float(os.environ.get('ADMISSION_BURST', DEFAULT_BURST)),
+            costs=parse_costs(os.environ.get('ADMISSION_ROUTE_COSTS', '')),
+            concurrency=ConcurrencyLimits(int(os.environ.get('ADMISSION_MAX_CONCURRENT', DEFAULT_MAX_CONCURRENT)),
+                                          ROUTE_CONCURRENCY),
+            store=store,
+            client_header=os.environ.get('ADMISSION_CLIENT_HEADER') or None,
+            enabled=os.environ.get('ADMISSION_CONTROL', '').lower() in ('1', 'true', 'yes'),
+            limit_loopback=os.environ.get('ADMISSION_LIMIT_LOOPBACK', '').lower() in ('1', 'true', 'yes'),
+        )
+
+    def cost(self, endpoint):
+        # A cost above the burst could never be paid
+        return min(self.costs.get(endpoint, 1), self.burst)
+
+    def client_key(self):
+        if self.client_header:
+            value = request.headers.get(self.client_header, '')
+            # First hop of X-Forwarded-For style lists
+            client = value.split(',')[0].strip()
+            if client:
+                return client
+        return request.remote_addr or 'unknown'
+
+    def admit(self, endpoint, client):
+        """``None`` if the request may run (holding a concurrency slot), else ``(reason, retry_after)``"""
+        if not self.concurrency.acquire(endpoint):
+            self.rejected['concurrency'] += 1
+            return 'concurrency', 1
+        if not self.limit_loopback and is_loopback(client):
+            self.admitted += 1
+            return None
+        wait = self.store.take(client, self.rate, self.burst, self.cost(endpoint))
+        if wait > 0:
+            self.concurrency.release(endpoint)
+            self.rejected['rate_limited'] += 1
+            return 'rate_limited', wait
+        self.admitted += 1
+        return None
+
+    def describe(self):
+        """One-line summary for the startup log"""
+        if not self.enabled:
+            return 'off'
+        return (f"{self.rate:g} tokens/s per client (burst {self.burst:g}, {self.store.name} buckets), "
+                f"search costs {self.cost('get_search_data'):g}, stats {self.cost('get_stats'):g}; "
+                f"up to {self.concurrency.default} concurrent requests per route"
+                f"{'' if self.limit_loopback else '; loopback clients not rate-limited'}")
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'store': self.store.name,
+            'rate_per_second': self.rate,
+            'burst': self.burst,
+            'limit_loopback': self.limit_loopback,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'in_flight': {endpoint: count for endpoint, count in self.concurrency.in_flight.items() if count},
+            'tracked_clients': len(self.store),
+        }
+
+    def install(self, app):
+        """Register the check and the slot release on a Flask app"""
+
+        @app.before_request
+        def admission_check():
+            endpoint = request.endpoint
+            if (not self.enabled or request.method == 'OPTIONS' or endpoint is None
+                    or endpoint in EXEMPT_ENDPOINTS):
+                return None
+            rejection = self.admit(endpoint, self.client_key())
+            if rejection is None:
+                g.admission_endpoint = endpoint
+                return None
+            reason, wait = rejection
+            retry_after = max(math.ceil(wait), 1)
+            response = jsonify({'error': 'Too many requests', 'reason': reason, 'retry_after': retry_after})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+
+        @app.teardown_request
+        def admission_release(error=None):
+            endpoint = g.pop('admission_endpoint', None)
+            if endpoint is not None:
+                self.concurrency.release(endpoint)
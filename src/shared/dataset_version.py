@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""Version stamp for the metrics dataset currently loaded into Redis.
+
+Every load records which CSV it came from in a small hash next to the query
+index (``{query_index}:dataset_version``), so keyspace walkers that already
+skip the index skip it too. The version is the date in the CSV file name
+(``..._2025_07_17.csv`` -> ``2025-07-17``) unless ``DATASET_VERSION`` is set.
+"""
+
+import os
+import re
+import time
+
+from query_index import INDEX_PREFIX
+
+DATASET_VERSION_KEY = f'{INDEX_PREFIX}dataset_version'
+
+_DATE_IN_NAME = re.compile(r'(\d{4})[_-](\d{2})[_-](\d{2})')
+
+
+def dataset_version_from_csv(csv_path):
+    """``DATASET_VERSION``, else the date in the CSV name, else its mtime date"""
+    version = os.environ.get('DATASET_VERSION')
+    if version:
+        return version
+    match = _DATE_IN_NAME.search(os.path.basename(csv_path))
+    if match:
+        return '-'.join(match.groups())
+    try:
+        return time.strftime('%Y-%m-%d', time.gmtime(os.path.getmtime(csv_path)))
+    except OSError:
+        return 'unknown'
+
+
+def dataset_version_fields(version, source, rows):
+    return {
+        'version': version,
+        'source': os.path.basename(source),
+        'rows': int(rows),
+        'loaded_at': int(time.time()),
+    }
+
+
+def record_dataset_version(client, csv_path, rows):
+    """Stamp the loaded dataset; returns the version string"""
+    version = dataset_version_from_csv(csv_path)
+    client.delete(DATASET_VERSION_KEY)
+    client.hset(DATASET_VERSION_KEY, mapping=dataset_version_fields(version, csv_path, rows))
+    return version
+
+
+def read_dataset_version(client):
+    """The stamp of the live dataset (``{}`` if it predates versioning)"""
+    stamp = client.hgetall(DATASET_VERSION_KEY) or {}
+    return {
+        (field.decode('utf-8') if isinstance(field, bytes) else field):
+            (value.decode('utf-8') if isinstance(value, bytes) else value)
+        for field, value in stamp.items()
+    }
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+"""Server-side AI explanation generation with pluggable model backends.
+
+The prompts and section parsing mirror ``formatExplanationWithOpenAI`` in
+``src/background/background.js`` so explanations generated here are
+interchangeable with the ones the extension used to generate itself.
+
+Backends are selected with ``AI_BACKEND``:
+    openai           - OpenAI chat completions (needs ``OPENAI_API_KEY``)
+    stub             - deterministic local text, for offline runs and tests
+    package.module:Class - any class with a ``generate(prompt)`` method
+Defaults to ``openai`` when ``OPENAI_API_KEY`` is set. With neither set,
+``load_backend`` raises ``BackendNotConfigured`` (the API answers 503 and the
+extension generates the explanation itself); the stub is never picked
+implicitly, so its text cannot end up in the shared cache by accident.
+"""
+
+import importlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+FALLBACK_PROMPT = """You are a Coursera course recommendation expert. The course's search explanation service is unavailable, so analyze this course based on available metadata and explain why it matches the search query.
+
+IMPORTANT: Write in objective, third-person style. Do NOT use personal pronouns like "I", "you", "I recommend", or "you should". Write as factual statements and recommendations.
+
+SEARCH QUERY: "{search_query}"
+
+COURSE DETAILS:
+- Title: {title}
+- Partner: {partner}
+- Description: {description}
+- Skills: {skills}
+- Rating: {rating}
+- URL: {url}
+- Entity Type: {entity_type}
+- Free/Paid: {pricing}
+
+FULL COURSE DATA:
+{details_json}
+
+Since Coursera's search explanation service is not available, analyze this course based on the available metadata and provide insights on why it matches "{search_query}". Focus on inferring the course content, learning outcomes, and relevance from the title, description, skills, and other available data.
+
+Please provide a structured analysis in this EXACT format:
+
+📋 Summary: [2-3 sentences explaining why this course matches "{search_query}" based on available data]
+
+🎯 Relevance: [How this course relates to "{search_query}" based on title, description, and skills - infer from available metadata]
+
+💡 Key Skills: [List 3-4 specific skills this course likely teaches related to the search, based on course data]
+
+🔍 Topics: [List 3-4 main topics/subjects this course likely covers, inferred from available data]
+
+📚 Content Format: [Infer the learning format based on partner, course type, and available metadata]
+
+📈 Level: [Infer beginner/intermediate/advanced based on course title, description, and context]
+
+💫 Recommendation: [Specific objective recommendation explaining what learners will gain from this course and how it relates to "{search_query}". Use phrases like "This course is recommended for..." or "This course provides..." instead of "I recommend" or "You will...". Base this on the actual course data available.]
+
+Note: Analysis based on course metadata (Coursera's explanation service unavailable)"""
+
+EXPLANATION_PROMPT = """You are a Coursera course recommendation expert. Analyze this course data and provide a structured explanation of why it matches the search query.
+
+IMPORTANT: Write in objective, third-person style. Do NOT use personal pronouns like "I", "you", "I recommend", or "you should". Write as factual statements and recommendations.
+
+CRITICAL: Include specific numbers, percentages, scores, and metrics from the RAW SEARCH EXPLANATION when available. These provide valuable quantitative insights about the course's relevance.
+
+SEARCH QUERY: "{search_query}"
+
+COURSE DETAILS:
+- Title: {title}
+- Partner: {partner}
+- Description: {description}
+- Skills: {skills}
+- Rating: {rating}
+- URL: {url}
+
+RAW SEARCH EXPLANATION: {raw_explanation}
+
+ADDITIONAL COURSE DATA:
+{details_json}
+
+Please provide a structured analysis in this EXACT format:
+
+📋 Summary: [2-3 sentences explaining why this course matches "{search_query}". Include any numerical relevance scores or percentages from the raw explanation.]
+
+🎯 Relevance: [How specifically this course relates to "{search_query}" - mention exact technologies, concepts, or skills. Include specific numbers, scores, or percentages from the search explanation that demonstrate relevance.]
+
+💡 Key Skills: [List 3-4 specific skills/technologies this course teaches that relate to the search. Include any skill-level scores or competency metrics if available.]
+
+🔍 Topics: [List 3-4 main topics/subjects covered. Include topic relevance scores or coverage percentages if provided in the explanation.]
+
+📚 Content Format: [What type of learning format - hands-on projects, theory, case studies, etc.]
+
+📈 Level: [Beginner/Intermediate/Advanced and why]
+
+💫 Recommendation: [Specific objective recommendation based on the search query - mention what learners will gain, what prerequisites are needed, or what can be accomplished after completing this course. Use phrases like "This course is recommended for..." or "This course provides..." instead of "I recommend" or "You will...". Include any confidence scores or match percentages from the explanation data.]
+
+Focus on being specific rather than generic. Use the actual course data AND numerical metrics from the search explanation to make data-driven, personalized recommendations."""
+
+SECTION_MARKERS = ('📋', '🎯', '💡', '🔍', '📚', '📈', '💫')
+
+
+def build_prompt(raw_explanation, product_details, search_query):
+    """Build the chat prompt for a course; returns ``(prompt, fallback_mode)``"""
+    fallback_mode = raw_explanation == 'FALLBACK_MODE'
+    skills = product_details.get('skills')
+    template = FALLBACK_PROMPT if fallback_mode else EXPLANATION_PROMPT
+    prompt = template.format(
+        search_query=search_query,
+        title=product_details.get('title'),
+        partner=product_details.get('partner'),
+        description=product_details.get('description') or 'Not available',
+        skills=json.dumps(skills) if skills else 'Not available',
+        rating=product_details.get('averageRating'),
+        url=product_details.get('url'),
+        entity_type=product_details.get('entityType'),
+        pricing='Free' if product_details.get('isCourseFree') else 'Paid',
+        raw_explanation=raw_explanation or 'Not available',
+        details_json=json.dumps(product_details, indent=2),
+    )
+    return prompt, fallback_mode
+
+
+def parse_sections(explanation):
+    """Split a structured response into its emoji-headed sections"""
+    sections = {}
+    current_section = ''
+    current_content = ''
+    for line in explanation.split('\n'):
+        if line.startswith(SECTION_MARKERS):
+            if current_section and current_content:
+                sections[current_section] = current_content.strip()
+            parts = line.split(': ')
+            current_section = parts[0].strip()
+            current_content = ': '.join(parts[1:])
+        elif line.strip() and current_section:
+            current_content += ' ' + line.strip()
+    if current_section and current_content:
+        sections[current_section] = current_content.strip()
+    return sections
+
+
+class BackendNotConfigured(Exception):
+    """Raised by ``load_backend`` when no model backend is configured"""
+
+
+class OpenAIBackend:
+    """Chat-completions backend (same model and settings as the extension)"""
+
+    name = 'openai'
+
+    def __init__(self, api_key=None, model='gpt-3.5-turbo', api_base='https://api.openai.com/v1',
+                 timeout=30):
+        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
+        self.model = os.environ.get('OPENAI_MODEL', model)
+        self.api_base = api_base
+        self.timeout = timeout
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY is not set")
+
+    def generate(self, prompt):
+        import requests
+
+        response = requests.post(
+            f"{self.api_base}/chat/completions",
+            headers={
+                'Authorization': f"Bearer {self.api_key}",
+                'Content-Type': 'application/json'
+            },
+            json={
+                'model': self.model,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'max_tokens': 800,
+                'temperature': 0.3
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"OpenAI API error: {response.status_code}")
+        return response.json()['choices'][0]['message']['content']
+
+
+class StubBackend:
+    """Offline backend that answers in the expected format without a network call"""
+
+    name = 'stub'
+
+    def __init__(self, delay=None):
+        self.delay = float(os.environ.get('AI_STUB_DELAY', 0)) if delay is None else delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        query = re.search(r'SEARCH QUERY: "(.*)"', prompt)
+        title = re.search(r'- Title: (.*)', prompt)
+        query = query.group(1) if query else 'the search'
+        title = title.group(1) if title else 'This course'
+        return (
+            f"📋 Summary: {title} matches \"{query}\" based on its title and listed skills.\n\n"
+            f"🎯 Relevance: The course content covers topics searched for with \"{query}\".\n\n"
+            f"💡 Key Skills: {query}\n\n"
+            f"🔍 Topics: {query}\n\n"
+            "📚 Content Format: Video lectures and assignments\n\n"
+            "📈 Level: Beginner\n\n"
+            f"💫 Recommendation: This course is recommended for learners exploring {query}.\n\n"
+            "Note: Generated by the local stub backend"
+        )
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'stub': StubBackend,
+}
+
+
+def load_backend(name=None):
+    """Instantiate the backend named by ``name`` or ``AI_BACKEND``"""
+    name = name or os.environ.get('AI_BACKEND') or ('openai' if os.environ.get('OPENAI_API_KEY') else None)
+    if name is None:
+        raise BackendNotConfigured("No AI backend configured: set OPENAI_API_KEY, or AI_BACKEND "
+                                   "(openai, stub or package.module:Class)")
+    if name in BACKENDS:
+        return BACKENDS[name]()
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown AI backend '{name}'")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def generate_explanation(backend, raw_explanation, product_details, search_query):
+    """Generate a structured explanation in the shape the extension renders"""
+    prompt, fallback_mode = build_prompt(raw_explanation, product_details, search_query)
+    explanation = backend.generate(prompt)
+    return {
+        'sections': parse_sections(explanation),
+        'rawResponse': explanation,
+        'cached': False,
+        'cacheType': 'fresh',
+        'query': search_query,
+        'productId': product_details.get('productId'),
+        'fallbackMode': fallback_mode,
+        'backend': getattr(backend, 'name', type(backend).__name__)
+    }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single execution
+
+    A caller that checked the cache, missed, and only got here after the
+    previous flight for its key had finished would start a second one. Pass
+    ``since`` (``time.monotonic()`` taken before the cache check) and a
+    ``recheck`` callable: when a flight for the key completed after ``since``,
+    the new leader calls ``recheck`` first and returns its result if it is not
+    None.
+    """
+
+    def __init__(self, remember=1024):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # key -> monotonic time its last flight completed (most recent last)
+        self._completed = OrderedDict()
+        self._remember = remember
+
+    def do(self, key, fn, recheck=None, since=None):
+        """Run ``fn`` once per key at a time; returns ``(result, shared)``"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+                completed = self._completed.get(key)
+                stale_check = recheck is not None and completed is not None and \
+                    (since is None or completed >= since)
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        shared = False
+        try:
+            result = recheck() if stale_check else None
+            if result is not None:
+                shared = True
+            else:
+                result = fn()
+            call['result'] = result
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call['error'] is None:
+                    self._completed[key] = time.monotonic()
+                    self._completed.move_to_end(key)
+                    while len(self._completed) > self._remember:
+                        self._completed.popitem(last=False)
+            call['done'].set()
+        return call['result'], shared
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+"""Bounded cache policy for ``ai_explanation:*`` entries.
+
+Explanations used to live for a flat 30 days with no cap. The policy keeps
+per-entry metadata next to the cache and uses it to:
+
+* track access frequency (``ai_explanation_meta:freq``) and recency
+  (``ai_explanation_meta:last``) for every entry,
+* enforce an entry and byte budget by evicting the least valuable entries
+  (fewest hits, decayed by time since last access),
+* drop the metadata of entries that expired through their TTL, checked on a
+  sample when evicting and when reporting stats,
+* adapt TTLs - new entries get a short TTL that doubles each time their hit
+  count reaches a power of two, up to the old 30-day ceiling.
+
+Budgets come from the environment: ``AI_CACHE_MAX_ENTRIES``,
+``AI_CACHE_MAX_BYTES``, ``AI_CACHE_BASE_TTL`` and ``AI_CACHE_MAX_TTL``
+(seconds).
+"""
+
+import os
+import time
+
+from redis.client import NEVER_DECODE
+
+from explanation_store import EXPLANATION_TTL, explanation_key
+
+META_PREFIX = 'ai_explanation_meta:'
+FREQ_KEY = f'{META_PREFIX}freq'
+LAST_ACCESS_KEY = f'{META_PREFIX}last'
+SIZE_KEY = f'{META_PREFIX}size'
+BYTES_KEY = f'{META_PREFIX}bytes'
+COUNTERS_KEY = f'{META_PREFIX}counters'
+META_KEYS = (FREQ_KEY, LAST_ACCESS_KEY, SIZE_KEY, BYTES_KEY, COUNTERS_KEY)
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BASE_TTL = 24 * 60 * 60
+
+# Evict down to this fraction of the budget so evictions happen in batches
+EVICTION_WATERMARK = 0.9
+EVICTION_SAMPLE = 64
+# Hit counts lose half their weight for every this many seconds without access
+DECAY_HALF_LIFE = 3 * 24 * 60 * 60
+
+
+class ExplanationCachePolicy:
+    """LFU-with-decay eviction and adaptive TTLs for the explanation cache"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 base_ttl=DEFAULT_BASE_TTL, max_ttl=EXPLANATION_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.base_ttl = base_ttl
+        self.max_ttl = max_ttl
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get('AI_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(os.environ.get('AI_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            base_ttl=int(os.environ.get('AI_CACHE_BASE_TTL', DEFAULT_BASE_TTL)),
+            max_ttl=int(os.environ.get('AI_CACHE_MAX_TTL', EXPLANATION_TTL)),
+        )
+
+    def ttl_for(self, hits):
+        """TTL for an entry with ``hits`` recorded accesses"""
+        return min(self.max_ttl, self.base_ttl * 2 ** min(int(hits), 32))
+
+    def lookup(self, client, cache_key):
+        """Fetch a stored explanation and record the access in one round trip.
+
+        Returns the raw stored bytes, or ``None`` on a miss.
+        """
+        now = time.time()
+        pipe = client.pipeline(transaction=False)
+        pipe.execute_command('GET', explanation_key(cache_key), **{NEVER_DECODE: True})
+        # XX: only entries the policy already tracks are counted, so misses
+        # never create metadata
+        pipe.zadd(FREQ_KEY, {cache_key: 1}, xx=True, incr=True)
+        pipe.zadd(LAST_ACCESS_KEY, {cache_key: now}, xx=True)
+        stored, hits, _ = pipe.execute()
+
+        if stored is None:
+            return None
+        if hits is None:
+            # Entry written before the policy existed; start tracking it
+            pipe = client.pipeline(transaction=False)
+            self._track(pipe, cache_key, len(stored), now)
+            pipe.execute()
+        elif self._is_promotion(hits):
+            client.expire(explanation_key(cache_key), self.ttl_for(hits))
+        return stored
+
+    def lookup_many(self, client, cache_keys):
+        """Fetch many stored explanations and record the hits in one round trip.
+
+        Returns raw stored bytes (or ``None``) in the order of ``cache_keys``.
+        """
+        if not cache_keys:
+            return []
+        now = time.time()
+        pipe = client.pipeline(transaction=False)
+        pipe.execute_command('MGET', *[explanation_key(key) for key in cache_keys], **{NEVER_DECODE: True})
+        # XX, as in lookup(): misses never create metadata
+        for key in cache_keys:
+            pipe.zadd(FREQ_KEY, {key: 1}, xx=True, incr=True)
+        pipe.zadd(LAST_ACCESS_KEY, {key: now for key in cache_keys}, xx=True)
+        replies = pipe.execute()
+        stored_values, hit_counts = replies[0], replies[1:-1]
+        hits = [(key, count) for key, stored, count in zip(cache_keys, stored_values, hit_counts)
+                if stored is not None]
+        if not hits:
+            return stored_values
+
+        sizes = {key: len(stored) for key, stored in zip(cache_keys, stored_values) if stored is not None}
+        untracked = [key for key, count in hits if count is None]
+        promoted = [(key, count) for key, count in hits
+                    if count is not None and self._is_promotion(count)]
+        if untracked or promoted:
+            pipe = client.pipeline(transaction=False)
+            for key in untracked:
+                self._track(pipe, key, sizes[key], now)
+            for key, count in promoted:
+                pipe.expire(explanation_key(key), self.ttl_for(count))
+            pipe.execute()
+        return stored_values
+
+    def record_write(self, client, cache_key, stored, starting_hits=0):
+        """Store an encoded explanation, update metadata and enforce the budget"""
+        self.record_writes(client, [(cache_key, stored)], starting_hits)
+
+    def record_writes(self, client, writes, starting_hits=0):
+        """Store many ``(cache_key, stored)`` explanations in one round trip, then enforce the budget once
+
+        New entries start with ``starting_hits`` recorded accesses (and the TTL
+        those earn) instead of none, e.g. for pairs known to be popular.
+        """
+        if not writes:
+            return
+        now = time.time()
+        pipe = client.pipeline(transaction=False)
+        for cache_key, stored in writes:
+            pipe.hget(SIZE_KEY, cache_key)
+            pipe.zscore(FREQ_KEY, cache_key)
+            pipe.setex(explanation_key(cache_key), self.ttl_for(starting_hits), stored)
+            pipe.zadd(FREQ_KEY, {cache_key: starting_hits}, nx=True)
+            pipe.zadd(LAST_ACCESS_KEY, {cache_key: now})
+            pipe.hset(SIZE_KEY, cache_key, len(stored))
+            pipe.incrby(BYTES_KEY, len(stored))
+        pipe.zcard(FREQ_KEY)
+        replies = pipe.execute()
+        # The last INCRBY saw every write of the batch
+        total_bytes, total_entries = replies[-2], replies[-1]
+
+        fix = client.pipeline(transaction=False)
+        for index, (cache_key, _) in enumerate(writes):
+            old_size, hits = replies[index * 7], replies[index * 7 + 1]
+            # Overwrite: undo the old size and keep the TTL the entry had earned
+            if old_size is not None:
+                fix.decrby(BYTES_KEY, int(old_size))
+                total_bytes -= int(old_size)
+            if hits is not None and float(hits) < starting_hits:
+                fix.zadd(FREQ_KEY, {cache_key: starting_hits})
+            elif hits and float(hits) > starting_hits:
+                fix.expire(explanation_key(cache_key), self.ttl_for(hits))
+        if len(fix):
+            fix.execute()
+
+        if total_entries > self.max_entries or total_bytes > self.max_bytes:
+            self.evict(client, total_entries, total_bytes)
+
+    def evict(self, client, total_entries, total_bytes):
+        """Evict the least valuable entries until under the watermark
+
+        Candidates are the members with the fewest hits and the ones accessed
+        longest ago. Candidates whose value already expired through its TTL
+        only need their metadata dropped, so they go first; live ones follow
+        in order of decayed value.
+        """
+        target_entries = int(self.max_entries * EVICTION_WATERMARK)
+        target_bytes = int(self.max_bytes * EVICTION_WATERMARK)
+        sample = max(EVICTION_SAMPLE, total_entries - target_entries)
+
+        members = self._sample(client, sample)
+        if not members:
+            return 0
+        expired, live = self._inspect(client, members)
+
+        now = time.time()
+        victims = [member for member, _, _, _ in expired]
+        expired_bytes = freed_bytes = sum(size for _, _, _, size in expired)
+        for member, _, _, size in sorted(live, key=lambda item: self._value(item[1], item[2], now)):
+            if total_entries - len(victims) <= target_entries and total_bytes - freed_bytes <= target_bytes:
+                break
+            victims.append(member)
+            freed_bytes += size
+
+        if not victims:
+            return 0
+        evicted = victims[len(expired):]
+        pipe = client.pipeline(transaction=False)
+        if evicted:
+            pipe.unlink(*[explanation_key(member) for member in evicted])
+        self._forget(pipe, victims, freed_bytes)
+        pipe.hincrby(COUNTERS_KEY, 'evictions', len(evicted))
+        pipe.hincrby(COUNTERS_KEY, 'evicted_bytes', freed_bytes - expired_bytes)
+        pipe.hincrby(COUNTERS_KEY, 'expired_cleaned', len(expired))
+        pipe.hincrby(COUNTERS_KEY, 'eviction_runs', 1)
+        pipe.execute()
+        return len(evicted)
+
+    def stats(self, client):
+        """Current entry/byte usage against the budget plus eviction counters
+
+        Sampled entries whose value expired through its TTL are dropped from
+        the metadata and left out of the counts. Costs one extra round trip
+        for the check, and one more if anything expired.
+        """
+        pipe = client.pipeline(transaction=False)
+        pipe.zrange(FREQ_KEY, 0, EVICTION_SAMPLE - 1)
+        pipe.zrange(LAST_ACCESS_KEY, 0, EVICTION_SAMPLE - 1)
+        pipe.zcard(FREQ_KEY)
+        pipe.get(BYTES_KEY)
+        pipe.hgetall(COUNTERS_KEY)
+        by_hits, by_age, entries, used_bytes, counters = pipe.execute()
+        used_bytes = int(used_bytes or 0)
+        counters = {name: int(value) for name, value in counters.items()}
+
+        members = list(dict.fromkeys(by_hits + by_age))
+        expired = self._inspect(client, members)[0] if members else []
+        if expired:
+            expired_bytes = sum(size for _, _, _, size in expired)
+            pipe = client.pipeline(transaction=False)
+            self._forget(pipe, [member for member, _, _, _ in expired], expired_bytes)
+            pipe.hincrby(COUNTERS_KEY, 'expired_cleaned', len(expired))
+            pipe.execute()
+            entries -= len(expired)
+            used_bytes -= expired_bytes
+            counters['expired_cleaned'] = counters.get('expired_cleaned', 0) + len(expired)
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'bytes': used_bytes,
+            'max_bytes': self.max_bytes,
+            'base_ttl': self.base_ttl,
+            'max_ttl': self.max_ttl,
+            'counters': counters,
+        }
+
+    def _sample(self, client, size):
+        """Up to ``size`` least-hit plus ``size`` least recently used members"""
+        pipe = client.pipeline(transaction=False)
+        pipe.zrange(FREQ_KEY, 0, size - 1)
+        pipe.zrange(LAST_ACCESS_KEY, 0, size - 1)
+        by_hits, by_age = pipe.execute()
+        return list(dict.fromkeys(by_hits + by_age))
+
+    def _inspect(self, client, members):
+        """``(expired, live)`` lists of ``(member, hits, last_access, size)``; one round trip"""
+        pipe = client.pipeline(transaction=False)
+        for member in members:
+            pipe.exists(explanation_key(member))
+        pipe.zmscore(FREQ_KEY, members)
+        pipe.zmscore(LAST_ACCESS_KEY, members)
+        pipe.hmget(SIZE_KEY, members)
+        replies = pipe.execute()
+        hits, last_access, sizes = replies[len(members):]
+        expired, live = [], []
+        for member, exists, member_hits, last, size in zip(members, replies, hits, last_access, sizes):
+            (live if exists else expired).append((member, member_hits or 0, last, int(size or 0)))
+        return expired, live
+
+    @staticmethod
+    def _forget(pipe, members, size):
+        """Queue removal of the metadata of ``members`` (holding ``size`` bytes)"""
+        pipe.zrem(FREQ_KEY, *members)
+        pipe.zrem(LAST_ACCESS_KEY, *members)
+        pipe.hdel(SIZE_KEY, *members)
+        pipe.decrby(BYTES_KEY, size)
+
+    def _track(self, pipe, cache_key, size, now):
+        """Queue the metadata for an entry the policy has not seen yet"""
+        pipe.zadd(FREQ_KEY, {cache_key: 1}, nx=True)
+        pipe.zadd(LAST_ACCESS_KEY, {cache_key: now})
+        pipe.hset(SIZE_KEY, cache_key, size)
+        pipe.incrby(BYTES_KEY, size)
+
+    def _is_promotion(self, hits):
+        hits = int(hits)
+        # Powers of two; the previous promotion (at hits // 2) set ttl_for(hits // 2)
+        return hits & (hits - 1) == 0 and self.ttl_for(hits // 2) < self.max_ttl
+
+    @staticmethod
+    def _value(hits, last_access, now):
+        age = max(0.0, now - (last_access or 0))
+        return (hits + 1) * 0.5 ** (age / DECAY_HALF_LIFE)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+"""Compressed storage for cached AI explanations.
+
+Values under ``ai_explanation:`` are stored as raw-deflate streams, optionally
+primed with a shared dictionary trained on existing explanations (zlib's
+``zdict``). Every compressed value starts with a small header naming the
+dictionary it was built with, so dictionaries can be retrained without
+invalidating older entries. Plain JSON values written before compression was
+introduced are still read transparently.
+
+Usage:
+    python3 src/shared/explanation_store.py report   # compressed vs raw bytes (every entry)
+    python3 src/shared/explanation_store.py train    # train + activate a dictionary
+"""
+
+import json
+import re
+import struct
+import sys
+import zlib
+from collections import Counter
+
+from redis.client import NEVER_DECODE
+
+EXPLANATION_PREFIX = 'ai_explanation:'
+DICTIONARY_PREFIX = 'ai_explanation_dict:'
+ACTIVE_DICTIONARY_KEY = f'{DICTIONARY_PREFIX}active'
+EXPLANATION_TTL = 30 * 24 * 60 * 60
+
+# b'AZ' + format version + 4-byte dictionary id (0 means no dictionary)
+HEADER = struct.Struct('>2sBI')
+MAGIC = b'AZ'
+FORMAT_VERSION = 1
+
+DICTIONARY_SIZE = 32 * 1024
+COMPRESSION_LEVEL = 9
+# Bounds the SCAN work of a sampled footprint report
+SAMPLE_SCAN_PAGES = 10
+
+# Boilerplate every explanation shares; seeds the dictionary before training
+DICTIONARY_SEED = (
+    '{"sections": {"📋 Summary": "", "🎯 Relevance": "", "💡 Key Skills": "", '
+    '"🔍 Topics": "", "📚 Content Format": "", "📈 Level": "", "💫 Recommendation": ""}, '
+    '"rawResponse": "📋 Summary: \\n\\n🎯 Relevance: \\n\\n💡 Key Skills: \\n\\n🔍 Topics: '
+    '\\n\\n📚 Content Format: \\n\\n📈 Level: \\n\\n💫 Recommendation: This course is recommended for ", '
+    '"cached": false, "cacheType": "fresh", "fallbackMode": false, '
+    '"cached_at": , "query": "", "productId": "", "title": ""}'
+)
+
+
+def explanation_key(cache_key):
+    """Redis key for a ``query:productId`` explanation cache key"""
+    return f"{EXPLANATION_PREFIX}{cache_key}"
+
+
+def dictionary_id(dictionary):
+    return zlib.crc32(dictionary) or 1
+
+
+def get_raw(client, key):
+    """GET a value as bytes, even on a ``decode_responses=True`` client"""
+    return client.execute_command('GET', key, **{NEVER_DECODE: True})
+
+
+def mget_raw(client, keys):
+    """MGET values as bytes, even on a ``decode_responses=True`` client"""
+    if not keys:
+        return []
+    return client.execute_command('MGET', *keys, **{NEVER_DECODE: True})
+
+
+class ExplanationCodec:
+    """Encodes explanation entries for Redis and keeps size accounting"""
+
+    def __init__(self, level=COMPRESSION_LEVEL):
+        self.level = level
+        self.dictionaries = {}
+        self.active_id = 0
+        self.writes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def use_dictionary(self, dictionary):
+        """Make ``dictionary`` the one new entries are compressed with"""
+        self.active_id = dictionary_id(dictionary)
+        self.dictionaries[self.active_id] = dictionary
+        return self.active_id
+
+    def load_dictionaries(self, client):
+        """Load the active dictionary from Redis (if one has been trained)"""
+        active = client.get(ACTIVE_DICTIONARY_KEY)
+        if active and self._fetch_dictionary(client, int(active)):
+            self.active_id = int(active)
+        return self.active_id
+
+    def _fetch_dictionary(self, client, dict_id):
+        if dict_id not in self.dictionaries:
+            dictionary = get_raw(client, f"{DICTIONARY_PREFIX}{dict_id}")
+            if dictionary is None:
+                return False
+            self.dictionaries[dict_id] = dictionary
+        return True
+
+    def encode(self, entry):
+        raw = json.dumps(entry).encode('utf-8')
+        dictionary = self.dictionaries.get(self.active_id)
+        if dictionary:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        stored = HEADER.pack(MAGIC, FORMAT_VERSION, self.active_id if dictionary else 0)
+        stored += compressor.compress(raw) + compressor.flush()
+
+        self.writes += 1
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(stored)
+        return stored
+
+    def decode(self, stored, client=None):
+        """Decode a stored value; unknown dictionaries are fetched via ``client``"""
+        if stored is None:
+            return None
+        if isinstance(stored, str):
+            stored = stored.encode('utf-8')
+        if not stored.startswith(MAGIC):
+            return json.loads(stored)
+        return json.loads(self.decompress(stored, client))
+
+    def decompress(self, stored, client=None):
+        _, version, dict_id = HEADER.unpack_from(stored)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported explanation format version {version}")
+        if dict_id:
+            if client is not None:
+                self._fetch_dictionary(client, dict_id)
+            if dict_id not in self.dictionaries:
+                raise ValueError(f"Missing compression dictionary {dict_id}")
+            decompressor = zlib.decompressobj(-15, zdict=self.dictionaries[dict_id])
+        else:
+            decompressor = zlib.decompressobj(-15)
+        return decompressor.decompress(stored[HEADER.size:]) + decompressor.flush()
+
+    def session_stats(self):
+        return {
+            'writes': self.writes,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+            'compression_ratio': round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else None,
+            'active_dictionary': self.active_id or None,
+        }
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """Build a zlib preset dictionary from sample explanation JSON strings.
+
+    Phrases (4-word shingles) that recur across samples are ranked by how many
+    bytes they would save; the most valuable ones end up closest to the end of
+    the dictionary, where deflate back-references are cheapest.
+    """
+    doc_counts = Counter()
+    for sample in samples:
+        words = re.findall(r'\S+\s*', sample)
+        shingles = {''.join(words[i:i + 4]) for i in range(max(len(words) - 3, 0))}
+        doc_counts.update(shingles)
+
+    ranked = sorted(
+        (phrase for phrase, count in doc_counts.items() if count > 1),
+        key=lambda phrase: doc_counts[phrase] * len(phrase),
+        reverse=True,
+    )
+
+    chosen = []
+    budget = size - len(DICTIONARY_SEED.encode('utf-8'))
+    joined = ''
+    for phrase in ranked:
+        encoded_len = len(phrase.encode('utf-8'))
+        if encoded_len > budget:
+            continue
+        if phrase in joined:
+            continue
+        chosen.append(phrase)
+        joined += phrase
+        budget -= encoded_len
+
+    return (DICTIONARY_SEED + ''.join(reversed(chosen))).encode('utf-8')
+
+
+def iter_explanation_values(client, batch_size=500):
+    """Yield ``(key, stored_bytes)`` for every cached explanation"""
+    batch = []
+    for key in client.scan_iter(match=f"{EXPLANATION_PREFIX}*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            yield from zip(batch, mget_raw(client, batch))
+            batch = []
+    if batch:
+        yield from zip(batch, mget_raw(client, batch))
+
+
+def sample_explanation_values(client, sample, max_pages=SAMPLE_SCAN_PAGES):
+    """``(key, stored_bytes)`` of up to ``sample`` explanations from at most ``max_pages`` SCAN pages"""
+    keys = []
+    cursor = 0
+    for _ in range(max_pages):
+        cursor, page = client.scan(cursor, match=f"{EXPLANATION_PREFIX}*", count=sample)
+        keys = list(dict.fromkeys(keys + page))
+        if not cursor or len(keys) >= sample:
+            break
+    keys = keys[:sample]
+    return list(zip(keys, mget_raw(client, keys)))
+
+
+def train_from_cache(client, codec, sample_limit=1000, size=DICTIONARY_SIZE):
+    """Train a dictionary on cached explanations, store it and make it active"""
+    samples = []
+    for _, stored in iter_explanation_values(client):
+        if stored is None:
+            continue
+        samples.append(json.dumps(codec.decode(stored, client)))
+        if len(samples) >= sample_limit:
+            break
+
+    dictionary = train_dictionary(samples, size)
+    dict_id = codec.use_dictionary(dictionary)
+    client.set(f"{DICTIONARY_PREFIX}{dict_id}", dictionary)
+    client.set(ACTIVE_DICTIONARY_KEY, dict_id)
+    return dict_id, len(samples)
+
+
+def footprint_report(client, codec, sample=None, total_entries=None):
+    """Report compressed vs raw sizes of the explanation cache
+
+    Walks every entry by default. With ``sample``, reads at most ``sample``
+    entries from a bounded number of SCAN pages and scales the byte totals up
+    to ``total_entries`` (e.g. the policy's entry count), so the report costs
+    the same however large the cache is.
+    """
+    entries = compressed = legacy = 0
+    raw_bytes = stored_bytes = key_bytes = 0
+    values = sample_explanation_values(client, sample) if sample else iter_explanation_values(client)
+    for key, stored in values:
+        if stored is None:
+            continue
+        entries += 1
+        key_bytes += len(key.encode('utf-8'))
+        stored_bytes += len(stored)
+        if stored.startswith(MAGIC):
+            compressed += 1
+            raw_bytes += len(codec.decompress(stored, client))
+        else:
+            legacy += 1
+            raw_bytes += len(stored)
+
+    sampled = entries
+    if sample and total_entries is not None and total_entries > entries:
+        scale = total_entries / entries if entries else 0
+        entries = total_entries
+        compressed, legacy = round(compressed * scale), round(legacy * scale)
+        raw_bytes, stored_bytes, key_bytes = (round(value * scale) for value in (raw_bytes, stored_bytes, key_bytes))
+
+    dictionary_bytes = sum(len(d) for d in codec.dictionaries.values())
+    return {
+        'entries': entries,
+        'sampled_entries': sampled,
+        'estimated': entries != sampled,
+        'compressed_entries': compressed,
+        'uncompressed_entries': legacy,
+        'raw_bytes': raw_bytes,
+        'stored_bytes': stored_bytes,
+        'bytes_saved': raw_bytes - stored_bytes,
+        'compression_ratio': round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+        'key_bytes': key_bytes,
+        'dictionary_bytes': dictionary_bytes,
+        'total_footprint_bytes': stored_bytes + key_bytes + dictionary_bytes,
+        'active_dictionary': codec.active_id or None,
+    }
+
+
+def main():
+    import redis
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    client = redis.Redis(host='localhost', port=6379, decode_responses=True, socket_timeout=5)
+    codec = ExplanationCodec()
+    codec.load_dictionaries(client)
+
+    if command == 'train':
+        dict_id, sample_count = train_from_cache(client, codec)
+        print(f"✅ Trained dictionary {dict_id} on {sample_count} cached explanations")
+        print("   New explanations will be compressed with it; older entries stay readable")
+    elif command == 'report':
+        report = footprint_report(client, codec)
+        print("🧠 AI explanation cache footprint")
+        print("=" * 35)
+        for field, value in report.items():
+            print(f"   {field}: {value:,}" if isinstance(value, int) else f"   {field}: {value}")
+    else:
+        print(f"Unknown command '{command}'. Use 'report' or 'train'.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
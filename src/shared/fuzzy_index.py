@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+"""Trigram index for resolving unknown search queries to known ones.
+
+Coursera's URL query does not always match a ``searched_query`` from the CSV
+exactly (typos, plurals, word order). The loader builds a trigram inverted
+index over the query vocabulary and stores it as one blob under
+``{query_index}:trigram``; the API process loads it into memory once and
+answers fuzzy lookups from numpy arrays without touching Redis per candidate.
+
+Trigrams are taken per word with pg_trgm-style padding (``"  ml "``) so word
+order barely matters, and candidates are scored with the trigram Jaccard
+similarity ``shared / (|query| + |candidate| - shared)``.
+"""
+
+import json
+import struct
+import zlib
+
+import numpy as np
+from redis.client import NEVER_DECODE
+
+from query_index import INDEX_PREFIX, query_totals
+from query_normalizer import fold_text
+
+FUZZY_INDEX_KEY = f'{INDEX_PREFIX}trigram'
+
+MAGIC = b'TG'
+FORMAT_VERSION = 1
+# magic, version, header length, gram count, posting count
+BLOB_HEADER = struct.Struct('>2sBIII')
+
+DEFAULT_MIN_SCORE = 0.3
+DEFAULT_LIMIT = 5
+
+
+def trigrams(text):
+    """Padded per-word trigrams of the normalized text"""
+    grams = set()
+    for word in fold_text(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """In-memory trigram postings over the known query vocabulary"""
+
+    def __init__(self, queries, viewers, grams, offsets, postings):
+        self.queries = list(queries)
+        self.viewers = np.asarray(viewers, dtype=np.int64)
+        self.gram_ids = {gram: i for i, gram in enumerate(grams)}
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.postings = np.asarray(postings, dtype=np.int32)
+        # Trigram count per query, needed for the similarity denominator
+        self.sizes = np.bincount(self.postings, minlength=len(self.queries)).astype(np.int32)
+
+    def __len__(self):
+        return len(self.queries)
+
+    @classmethod
+    def build(cls, queries, viewers=None):
+        queries = list(queries)
+        viewers = list(viewers) if viewers is not None else [0] * len(queries)
+        by_gram = {}
+        for query_id, query in enumerate(queries):
+            for gram in trigrams(query):
+                by_gram.setdefault(gram, []).append(query_id)
+        grams = sorted(by_gram)
+        offsets = np.zeros(len(grams) + 1, dtype=np.int32)
+        offsets[1:] = np.cumsum([len(by_gram[gram]) for gram in grams])
+        postings = np.fromiter((query_id for gram in grams for query_id in by_gram[gram]),
+                               dtype=np.int32, count=int(offsets[-1]))
+        return cls(queries, viewers, grams, offsets, postings)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        queries, viewers, _ = zip(*query_totals(df)) if len(df) else ((), (), ())
+        return cls.build(queries, [int(v) for v in viewers])
+
+    def search(self, query, limit=DEFAULT_LIMIT, min_score=DEFAULT_MIN_SCORE):
+        """Closest known queries as ``[{'query', 'score'}]``, best first"""
+        grams = trigrams(query)
+        gram_ids = [self.gram_ids[gram] for gram in grams if gram in self.gram_ids]
+        if not gram_ids:
+            return []
+        hits = np.concatenate([self.postings[self.offsets[i]:self.offsets[i + 1]] for i in gram_ids])
+        # bincount is linear; sorting the hits (np.unique) dominated on common trigrams
+        shared = np.bincount(hits, minlength=len(self.queries))
+        # A candidate needs this many shared trigrams to reach min_score at all
+        candidates = np.flatnonzero(shared >= min_score * len(grams))
+        shared = shared[candidates]
+        scores = shared / (len(grams) + self.sizes[candidates] - shared)
+        keep = scores >= min_score
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        # Best score first; more viewers breaks ties between equally close queries
+        order = np.lexsort((-self.viewers[candidates], -scores))
+        return [{'query': self.queries[candidates[i]], 'score': round(float(scores[i]), 4)} for i in order]
+
+    def to_bytes(self):
+        grams = sorted(self.gram_ids, key=self.gram_ids.get)
+        header = json.dumps({'queries': self.queries, 'viewers': self.viewers.tolist(),
+                             'grams': grams}).encode('utf-8')
+        body = (BLOB_HEADER.pack(MAGIC, FORMAT_VERSION, len(header), len(grams), len(self.postings))
+                + header + self.offsets.astype('>i4').tobytes() + self.postings.astype('>i4').tobytes())
+        return zlib.compress(body, 6)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        body = zlib.decompress(blob)
+        magic, version, header_len, gram_count, posting_count = BLOB_HEADER.unpack_from(body)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported trigram index format {magic!r} v{version}")
+        start = BLOB_HEADER.size
+        header = json.loads(body[start:start + header_len])
+        start += header_len
+        offsets = np.frombuffer(body, dtype='>i4', count=gram_count + 1, offset=start)
+        start += (gram_count + 1) * 4
+        postings = np.frombuffer(body, dtype='>i4', count=posting_count, offset=start)
+        return cls(header['queries'], header['viewers'], header['grams'], offsets, postings)
+
+
+def build_fuzzy_index(client, df):
+    """Build the trigram index from the metrics DataFrame and store it in Redis"""
+    index = TrigramIndex.from_dataframe(df)
+    client.set(FUZZY_INDEX_KEY, index.to_bytes())
+    return len(index)
+
+
+def load_fuzzy_index(client):
+    """Load the stored trigram index, or ``None`` if the loader has not built one"""
+    blob = client.execute_command('GET', FUZZY_INDEX_KEY, **{NEVER_DECODE: True})
+    return TrigramIndex.from_bytes(blob) if blob else None
@@ -10,6 +10,31 @@
   // Flag to disable query modification if we detect schema errors
   let queryModificationEnabled = true;
   
+  // Only these operations are parsed, modified and forwarded; other GraphQL traffic passes straight through
+  const INTERCEPTED_OPERATIONS = new Set(['Search']);
+  
+  // Full request/response dumps: localStorage.setItem('courseraInterceptorDebug', '1') and reload
+  const DEBUG = (() => {
+    try {
+      return window.localStorage.getItem('courseraInterceptorDebug') === '1';
+    } catch (e) {
+      return false;
+    }
+  })();
+  
+  // Time the interceptor adds to the page's own requests (request rewrite) and to response handling
+  const overhead = {
+    intercepted: 0,
+    skipped: 0,
+    requestMs: 0,
+    maxRequestMs: 0,
+    responseMs: 0
+  };
+  window.__courseraInterceptorStats = () => ({
+    ...overhead,
+    avgRequestMs: overhead.intercepted ? overhead.requestMs / overhead.intercepted : 0
+  });
+  
   // Reset query modification to enabled with the working cookie
   console.log('🔄 Resetting query modification to enabled with working ASG_PREFERENCE cookie');
 
@@ -52,7 +77,9 @@
           }
           
           console.log('✅ Confirmed this is Search_ProductHit type fragment');
-          console.log('🔍 SearchProductHit fragment:', searchProductHitFragment.substring(0, 300) + '...');
+          if (DEBUG) {
+            console.log('🔍 SearchProductHit fragment:', searchProductHitFragment.substring(0, 300) + '...');
+          }
           
           // Ensure we don't already have searchExplanation in this fragment
           if (searchProductHitFragment.includes('searchExplanation')) {
@@ -104,7 +131,9 @@
                    } else {
             console.log('❌ SearchProductHit fragment not found with expected pattern');
             // Log the query structure for debugging
-            console.log('🔍 Full query for analysis:', queryString);
+            if (DEBUG) {
+              console.log('🔍 Full query for analysis:', queryString);
+            }
           }
       } else {
         console.log('⚠️ No Search_ProductHit found in query');
@@ -151,16 +180,139 @@
     return false;
   }
 
+  // Operation names from the opname URL parameter, else a scan of the raw body (no JSON.parse)
+  function graphQLOperationNames(url, body) {
+    const opname = url.match(/[?&]opname=([^&#]+)/);
+    if (opname) {
+      return [decodeURIComponent(opname[1])];
+    }
+    if (typeof body !== 'string') {
+      return [];
+    }
+    return Array.from(body.matchAll(/"operationName"\s*:\s*"([^"]+)"/g), match => match[1]);
+  }
+
+  function isInterceptedOperation(url, body) {
+    if (!url || !url.includes('graphql')) {
+      return false;
+    }
+    if (graphQLOperationNames(url, body).some(name => INTERCEPTED_OPERATIONS.has(name))) {
+      return true;
+    }
+    overhead.skipped++;
+    return false;
+  }
+
+  function recordRequestOverhead(started, transport, url) {
+    const elapsed = performance.now() - started;
+    overhead.intercepted++;
+    overhead.requestMs += elapsed;
+    overhead.maxRequestMs = Math.max(overhead.maxRequestMs, elapsed);
+    console.log(`⏱️ Interceptor overhead (${transport}): ${elapsed.toFixed(2)}ms, ` +
+      `avg ${(overhead.requestMs / overhead.intercepted).toFixed(2)}ms over ${overhead.intercepted} requests ` +
+      `(${overhead.skipped} skipped):`, url);
+  }
+
+  // Add searchExplanation to the request's operations; the new body, or null if nothing changed
+  function modifyRequestBody(body, transport) {
+    if (typeof body !== 'string') {
+      return null;
+    }
+    try {
+      const bodyData = JSON.parse(body);
+      if (DEBUG) {
+        console.log(`📦 ORIGINAL ${transport} REQUEST BODY:`, JSON.stringify(bodyData, null, 2));
+      }
+      
+      // Handle array of GraphQL operations (Coursera's format)
+      if (Array.isArray(bodyData)) {
+        let modified = false;
+        const modifiedBodyData = bodyData.map(operation => {
+          if (operation.query) {
+            const modifiedQuery = addSearchExplanationToQuery(operation.query);
+            if (modifiedQuery !== operation.query) {
+              console.log(`🚀 Modified GraphQL ${transport} operation:`, operation.operationName);
+              console.log('🔧 Adding devGatewayGql context for schema access');
+              checkCourserianCookie();
+              modified = true;
+              return {
+                ...operation,
+                query: modifiedQuery,
+                context: {
+                  ...operation.context,
+                  clientName: 'devGatewayGql',
+                  schemaVersion: 'cluster:search-application-vpcprodpreview-1685'
+                }
+              };
+            }
+          }
+          return operation;
+        });
+        
+        if (modified) {
+          console.log(`🚀 Sending modified GraphQL ${transport} request with searchExplanation`);
+          const modifiedBody = JSON.stringify(modifiedBodyData);
+          if (DEBUG) {
+            console.log(`📦 EXACT MODIFIED ${transport} REQUEST BODY:`, JSON.stringify(modifiedBodyData, null, 2));
+          }
+          return modifiedBody;
+        }
+      }
+      // Handle single GraphQL operation (standard format)
+      else if (bodyData.query) {
+        const modifiedQuery = addSearchExplanationToQuery(bodyData.query);
+        if (modifiedQuery !== bodyData.query) {
+          console.log(`🚀 Sending modified GraphQL ${transport} query with searchExplanation`);
+          console.log('🔧 Adding devGatewayGql context for schema access');
+          return JSON.stringify({
+            ...bodyData,
+            query: modifiedQuery,
+            context: {
+              ...bodyData.context,
+              clientName: 'devGatewayGql',
+              schemaVersion: 'cluster:search-application-vpcprodpreview-1685'
+            }
+          });
+        }
+      }
+    } catch (e) {
+      console.log(`⚠️ Could not parse ${transport} request body:`, e);
+    }
+    return null;
+  }
+
+  // Check for GraphQL errors, especially related to searchExplanation
+  function checkSearchExplanationErrors(data) {
+    if (!data.errors) {
+      return;
+    }
+    console.log('🚨 GraphQL Errors detected:');
+    data.errors.forEach((error, index) => {
+      console.log(`  Error ${index + 1}:`, error.message);
+      if (error.message.includes('searchExplanation')) {
+        console.log('  🎯 This error is related to searchExplanation field!');
+        console.log('  💡 The field might not be available in production schema yet.');
+        console.log('  🔧 Disabling query modification to prevent further errors.');
+        queryModificationEnabled = false;
+      }
+    });
+  }
+
   // Override fetch
   window.fetch = function(...args) {
-    const [url, options] = args;
+    const [resource, options] = args;
+    const url = typeof resource === 'string' ? resource : (resource && resource.url) || String(resource);
+    
+    if (!isInterceptedOperation(url, options && options.body)) {
+      return originalFetch.apply(this, args);
+    }
     
+    const started = performance.now();
     // Intercept outgoing GraphQL requests
-    if (url && url.includes('graphql') && options && options.body) {
+    if (options && options.body) {
       
       // Add ASG_PREFERENCE cookie to ensure we hit the right deployment
       const asgPreference = getASGPreferenceCookie();
-      console.log('🍪 ASG_PREFERENCE cookie value:', asgPreference);
       
       if (asgPreference && options.headers) {
         // Make sure the cookie is included in the request
@@ -170,103 +322,39 @@
           console.log('🍪 Added ASG_PREFERENCE to request headers');
         }
       }
-      try {
-        const bodyData = JSON.parse(options.body);
-        console.log('🔍 Request body structure:', bodyData);
-        console.log('📦 ORIGINAL REQUEST BODY:', JSON.stringify(bodyData, null, 2));
-        
-        // Handle array of GraphQL operations (Coursera's format)
-        if (Array.isArray(bodyData)) {
-          let modified = false;
-          const modifiedBodyData = bodyData.map(operation => {
-            if (operation.query) {
-              const modifiedQuery = addSearchExplanationToQuery(operation.query);
-              if (modifiedQuery !== operation.query) {
-                console.log('🚀 Modified GraphQL operation:', operation.operationName);
-                console.log('🔧 Adding devGatewayGql context for schema access');
-                checkCourserianCookie();
-                modified = true;
-                return {
-                  ...operation,
-                  query: modifiedQuery,
-                  context: {
-                    ...operation.context,
-                    clientName: 'devGatewayGql',
-                    schemaVersion: 'cluster:search-application-vpcprodpreview-1685'
-                  }
-                };
-              }
-            }
-            return operation;
-          });
-          
-          if (modified) {
-            console.log('🚀 Sending modified GraphQL request with searchExplanation');
-            console.log('📦 EXACT MODIFIED REQUEST BODY:', JSON.stringify(modifiedBodyData, null, 2));
-            console.log('📦 EXACT MODIFIED REQUEST (stringified):', JSON.stringify(modifiedBodyData));
-            console.log('🍪 FINAL REQUEST COOKIES:', options.headers?.cookie || options.headers?.Cookie || 'No cookies');
-            options.body = JSON.stringify(modifiedBodyData);
-          }
-        }
-        // Handle single GraphQL operation (standard format)
-        else if (bodyData.query) {
-          const modifiedQuery = addSearchExplanationToQuery(bodyData.query);
-          if (modifiedQuery !== bodyData.query) {
-            console.log('🚀 Sending modified GraphQL query with searchExplanation');
-            console.log('🔧 Adding devGatewayGql context for schema access');
-            options.body = JSON.stringify({
-              ...bodyData,
-              query: modifiedQuery,
-              context: {
-                ...bodyData.context,
-                clientName: 'devGatewayGql',
-                schemaVersion: 'cluster:search-application-vpcprodpreview-1685'
-              }
-            });
-          }
-        }
-      } catch (e) {
-        console.log('⚠️ Could not parse request body:', e);
+      
+      const modifiedBody = modifyRequestBody(options.body, 'fetch');
+      if (modifiedBody !== null) {
+        options.body = modifiedBody;
       }
     }
+    recordRequestOverhead(started, 'fetch', url);
     
     return originalFetch.apply(this, args).then(response => {
-      // Check if this is a GraphQL request
-      if (url && url.includes('graphql')) {
-        console.log('🎯 Intercepted GraphQL fetch response:', url);
-        
-        // Clone response to read it
-        const clonedResponse = response.clone();
-        
-        clonedResponse.json().then(data => {
+      console.log('🎯 Intercepted GraphQL fetch response:', url);
+      
+      // Clone response to read it
+      const clonedResponse = response.clone();
+      
+      clonedResponse.json().then(data => {
+        const handled = performance.now();
+        if (DEBUG) {
           console.log('📦 GraphQL fetch response data:', data);
-          
-          // Check for GraphQL errors, especially related to searchExplanation
-          if (data.errors) {
-            console.log('🚨 GraphQL Errors detected:');
-            data.errors.forEach((error, index) => {
-              console.log(`  Error ${index + 1}:`, error.message);
-              if (error.message.includes('searchExplanation')) {
-                console.log('  🎯 This error is related to searchExplanation field!');
-                console.log('  💡 The field might not be available in production schema yet.');
-                console.log('  🔧 Disabling query modification to prevent further errors.');
-                queryModificationEnabled = false;
-              }
-            });
-          }
-          
-          // Send to content script
-          window.postMessage({
-            type: 'GRAPHQL_RESPONSE_INTERCEPTED',
-            url: url,
-            response: data,
-            method: 'fetch',
-            timestamp: Date.now()
-          }, '*');
-        }).catch(err => {
-          console.log('❌ Error reading fetch response:', err);
-        });
-      }
+        }
+        checkSearchExplanationErrors(data);
+        
+        // Send to content script
+        window.postMessage({
+          type: 'GRAPHQL_RESPONSE_INTERCEPTED',
+          url: url,
+          response: data,
+          method: 'fetch',
+          timestamp: Date.now()
+        }, '*');
+        overhead.responseMs += performance.now() - handled;
+      }).catch(err => {
+        console.log('❌ Error reading fetch response:', err);
+      });
       
       return response;
     });
@@ -280,14 +368,18 @@
   };
 
   XMLHttpRequest.prototype.send = function(body) {
-    const url = this._interceptor_url;
+    const url = this._interceptor_url ? String(this._interceptor_url) : '';
+    
+    if (!isInterceptedOperation(url, body)) {
+      return originalXHRSend.apply(this, arguments);
+    }
     
+    const started = performance.now();
     // Intercept outgoing GraphQL requests
-    if (url && url.includes('graphql') && body) {
+    if (body) {
       
       // Add ASG_PREFERENCE cookie to ensure we hit the right deployment
       const asgPreference = getASGPreferenceCookie();
-      console.log('🍪 XHR ASG_PREFERENCE cookie value:', asgPreference);
       
       if (asgPreference) {
         // Get existing cookie header or create new one
@@ -298,93 +390,43 @@
           console.log('🍪 Added ASG_PREFERENCE to XHR request headers');
         }
       }
-      try {
-        const bodyData = JSON.parse(body);
-        console.log('🔍 XHR Request body structure:', bodyData);
-        console.log('📦 ORIGINAL XHR REQUEST BODY:', JSON.stringify(bodyData, null, 2));
-        
-        // Handle array of GraphQL operations (Coursera's format)
-        if (Array.isArray(bodyData)) {
-          let modified = false;
-          const modifiedBodyData = bodyData.map(operation => {
-            if (operation.query) {
-              const modifiedQuery = addSearchExplanationToQuery(operation.query);
-              if (modifiedQuery !== operation.query) {
-                console.log('🚀 Modified GraphQL XHR operation:', operation.operationName);
-                console.log('🔧 Adding devGatewayGql context for schema access');
-                modified = true;
-                return {
-                  ...operation,
-                  query: modifiedQuery,
-                  context: {
-                    ...operation.context,
-                    clientName: 'devGatewayGql',
-                    schemaVersion: 'cluster:search-application-vpcprodpreview-1685'
-                  }
-                };
-              }
-            }
-            return operation;
-          });
-          
-          if (modified) {
-            console.log('🚀 Sending modified GraphQL XHR request with searchExplanation');
-            console.log('📦 EXACT MODIFIED XHR REQUEST BODY:', JSON.stringify(modifiedBodyData, null, 2));
-            console.log('📦 EXACT MODIFIED XHR REQUEST (stringified):', JSON.stringify(modifiedBodyData));
-            console.log('🍪 FINAL XHR REQUEST COOKIES:', this.getRequestHeader('Cookie') || 'No cookies');
-            arguments[0] = JSON.stringify(modifiedBodyData);
-          }
-        }
-        // Handle single GraphQL operation (standard format)
-        else if (bodyData.query) {
-          const modifiedQuery = addSearchExplanationToQuery(bodyData.query);
-          if (modifiedQuery !== bodyData.query) {
-            console.log('🚀 Sending modified GraphQL XHR query with searchExplanation');
-            console.log('🔧 Adding devGatewayGql context for schema access');
-            // Modify the body for this request
-            arguments[0] = JSON.stringify({
-              ...bodyData,
-              query: modifiedQuery,
-              context: {
-                ...bodyData.context,
-                clientName: 'devGatewayGql',
-                schemaVersion: 'cluster:search-application-vpcprodpreview-1685'
-              }
-            });
-          }
-        }
-      } catch (e) {
-        console.log('⚠️ Could not parse XHR request body:', e);
+      
+      const modifiedBody = modifyRequestBody(body, 'XHR');
+      if (modifiedBody !== null) {
+        arguments[0] = modifiedBody;
       }
     }
+    recordRequestOverhead(started, 'XHR', url);
     
-    if (url && url.includes('graphql')) {
-      console.log('🎯 Intercepted GraphQL XHR request:', url);
-      
-      // Hook into response
-      this.addEventListener('load', () => {
-        try {
-          if (this.responseText) {
-            const data = JSON.parse(this.responseText);
+    console.log('🎯 Intercepted GraphQL XHR request:', url);
+    
+    // Hook into response
+    this.addEventListener('load', () => {
+      const handled = performance.now();
+      try {
+        if (this.responseText) {
+          const data = JSON.parse(this.responseText);
+          if (DEBUG) {
             console.log('📦 GraphQL XHR response data:', data);
-            
-            // Send to content script
-            window.postMessage({
-              type: 'GRAPHQL_RESPONSE_INTERCEPTED',
-              url: url,
-              response: data,
-              method: 'xhr',
-              timestamp: Date.now()
-            }, '*');
           }
-        } catch (e) {
-          console.log('❌ Error parsing XHR response:', e);
+          
+          // Send to content script
+          window.postMessage({
+            type: 'GRAPHQL_RESPONSE_INTERCEPTED',
+            url: url,
+            response: data,
+            method: 'xhr',
+            timestamp: Date.now()
+          }, '*');
         }
-      });
-    }
+      } catch (e) {
+        console.log('❌ Error parsing XHR response:', e);
+      }
+      overhead.responseMs += performance.now() - handled;
+    });
     
     return originalXHRSend.apply(this, arguments);
   };
 
-  console.log('✅ GraphQL request/response interceptor ready');
-})(); 
\ No newline at end of file
+  console.log(`✅ GraphQL request/response interceptor ready (operations: ${[...INTERCEPTED_OPERATIONS].join(', ')}${DEBUG ? ', debug' : ''})`);
+})();
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+"""Key prefixes of everything stored next to the metric documents.
+
+Metric documents are ``<query>:<product_id>``. Every other key the servers
+and loaders write starts with one of ``INTERNAL_PREFIXES``, so code walking
+the keyspace for metrics skips those with ``is_metric_key``. A new kind of
+key gets its prefix added here, and every walker picks it up.
+"""
+
+from explanation_policy import META_PREFIX
+from explanation_store import DICTIONARY_PREFIX, EXPLANATION_PREFIX
+from metric_history import METRIC_HISTORY_PREFIX
+from product_rollups import PRODUCT_ROLLUP_PREFIX
+from query_index import INDEX_PREFIX
+from redis_scripts import RATE_LIMIT_PREFIX
+
+INTERNAL_PREFIXES = (
+    EXPLANATION_PREFIX,
+    DICTIONARY_PREFIX,
+    META_PREFIX,
+    INDEX_PREFIX,
+    PRODUCT_ROLLUP_PREFIX,
+    RATE_LIMIT_PREFIX,
+    METRIC_HISTORY_PREFIX,
+)
+
+
+def is_metric_key(key):
+    """True for ``<query>:<product_id>`` metric documents"""
+    return ':' in key and not key.startswith(INTERNAL_PREFIXES)
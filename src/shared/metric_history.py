@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+"""Compact multi-day history of the query -> product metrics.
+
+A load replaces the live ``<query>:<product_id>`` documents, so on its own
+only the latest export is kept. With ``METRIC_HISTORY=1`` the loaders also
+append the day to one packed series per pair under
+``metric_history:<query>:<product_id>``. A series costs a few bytes per day
+instead of a JSON copy:
+
+* header - format version, first day (days since 1970-01-01), entry count
+* per entry - days since the previous entry, then one zigzag varint per metric
+  holding its change from the previous entry. Counts are stored as they are;
+  rates are fixed-point hundredths (``12.5`` -> ``1250``)
+
+The bytes are base64-encoded so clients with ``decode_responses=True`` can
+read them. Each append drops entries more than ``METRIC_HISTORY_DAYS``
+(default 90) before the newest day, and the key expires that long after its
+last append, so pairs that leave the export age out as well. Loading the same
+day again replaces that day's entry.
+
+``/trend/<query>/<product_id>?days=N`` reads one key and decodes it.
+"""
+
+import base64
+import datetime
+import os
+import struct
+
+METRIC_HISTORY_PREFIX = 'metric_history:'
+FORMAT_VERSION = 1
+DEFAULT_RETENTION_DAYS = 90
+RATE_SCALE = 100
+WEEK = 7
+
+COUNT_COLUMNS = ['viewers', 'clickers', 'enrollers', 'paid_enrollers']
+RATE_COLUMNS = ['ctr', 'enrollment_rate', 'paid_conversion_rate']
+METRIC_COLUMNS = COUNT_COLUMNS + RATE_COLUMNS
+
+_HEADER = struct.Struct('>BIH')
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def history_key(query, product_id):
+    return f"{METRIC_HISTORY_PREFIX}{query}:{product_id}"
+
+
+def history_retention_from_env():
+    """Retention in days when ``METRIC_HISTORY`` is on, else None"""
+    if os.environ.get('METRIC_HISTORY', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    return int(os.environ.get('METRIC_HISTORY_DAYS', DEFAULT_RETENTION_DAYS))
+
+
+def day_number(version):
+    """Day number of a ``YYYY-MM-DD`` dataset version (today if it is not a date)"""
+    try:
+        day = datetime.date.fromisoformat(version)
+    except (TypeError, ValueError):
+        day = datetime.datetime.now(datetime.timezone.utc).date()
+    return (day - _EPOCH).days
+
+
+def day_string(day):
+    return (_EPOCH + datetime.timedelta(days=day)).isoformat()
+
+
+def pack_values(metrics):
+    """Integer tuple for one day: counts as-is, rates in fixed point"""
+    return tuple(
+        [int(metrics.get(column) or 0) for column in COUNT_COLUMNS]
+        + [int(round(float(metrics.get(column) or 0) * RATE_SCALE)) for column in RATE_COLUMNS]
+    )
+
+
+def unpack_values(values):
+    metrics = dict(zip(COUNT_COLUMNS, values))
+    for column, value in zip(RATE_COLUMNS, values[len(COUNT_COLUMNS):]):
+        metrics[column] = value / RATE_SCALE
+    return metrics
+
+
+def _put_varint(out, value):
+    # Zigzag first so small negative deltas stay small
+    value = (value << 1) ^ (value >> 63)
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return (value >> 1) ^ -(value & 1), pos
+        shift += 7
+
+
+def encode_series(entries):
+    """Pack ``[(day, values), ...]`` (sorted by day) into a base64 string"""
+    if not entries:
+        return ''
+    out = bytearray(_HEADER.pack(FORMAT_VERSION, entries[0][0], len(entries)))
+    previous_day, previous = entries[0][0], (0,) * len(METRIC_COLUMNS)
+    for day, values in entries:
+        _put_varint(out, day - previous_day)
+        for value, before in zip(values, previous):
+            _put_varint(out, value - before)
+        previous_day, previous = day, values
+    return base64.b64encode(bytes(out)).decode('ascii')
+
+
+def decode_series(blob):
+    """``[(day, values), ...]`` from ``encode_series`` output (``[]`` for None/empty)"""
+    if not blob:
+        return []
+    data = base64.b64decode(blob)
+    version, day, count = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown metric history format {version}")
+    pos = _HEADER.size
+    entries = []
+    previous = (0,) * len(METRIC_COLUMNS)
+    for _ in range(count):
+        gap, pos = _get_varint(data, pos)
+        day += gap
+        values = []
+        for before in previous:
+            delta, pos = _get_varint(data, pos)
+            values.append(before + delta)
+        previous = tuple(values)
+        entries.append((day, previous))
+    return entries
+
+
+def append_day(entries, day, values, retention_days=DEFAULT_RETENTION_DAYS):
+    """Series with ``day`` set to ``values``, trimmed to the retention window"""
+    entries = sorted([entry for entry in entries if entry[0] != day] + [(day, tuple(values))])
+    oldest = entries[-1][0] - retention_days + 1
+    return [entry for entry in entries if entry[0] >= oldest]
+
+
+def series_points(entries, days=None):
+    """Decoded points of the last ``days`` days (up to the newest entry), oldest first"""
+    if entries and days:
+        oldest = entries[-1][0] - days + 1
+        entries = [entry for entry in entries if entry[0] >= oldest]
+    return [{'date': day_string(day), **unpack_values(values)} for day, values in entries]
+
+
+def week_over_week(entries):
+    """Change of each metric against the newest entry at least a week older, or None"""
+    if not entries:
+        return None
+    day, latest = entries[-1]
+    earlier = [entry for entry in entries if entry[0] <= day - WEEK]
+    if not earlier:
+        return None
+    previous_day, previous = earlier[-1]
+    current, before = unpack_values(latest), unpack_values(previous)
+    changes = {}
+    for column in METRIC_COLUMNS:
+        change = current[column] - before[column]
+        changes[column] = {
+            'current': current[column],
+            'previous': before[column],
+            'change': round(change, 2),
+            'change_pct': round(change / before[column] * 100, 1) if before[column] else None,
+        }
+    return {'compared_to': day_string(previous_day), 'metrics': changes}
+
+
+def append_history(client, df, version, retention_days=DEFAULT_RETENTION_DAYS, chunk_size=1000):
+    """Append one day's rows to every pair's series; returns the number of pairs written
+
+    Each chunk is one pipelined read of the current series and one pipelined
+    write, so this works the same on a single node and on a cluster.
+    """
+    day = day_number(version)
+    ttl = retention_days * 24 * 3600
+    df = df.dropna(subset=['searched_query', 'clicked_product'])
+    df = df.assign(**{column: df[column].fillna(0) for column in METRIC_COLUMNS})
+    rows = [
+        (history_key(query, product_id), pack_values(dict(zip(METRIC_COLUMNS, metrics))))
+        for query, product_id, *metrics in zip(
+            df['searched_query'], df['clicked_product'], *(df[column] for column in METRIC_COLUMNS))
+    ]
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        pipe = client.pipeline(transaction=False)
+        for key, _ in chunk:
+            pipe.get(key)
+        current = pipe.execute()
+
+        pipe = client.pipeline(transaction=False)
+        for (key, values), blob in zip(chunk, current):
+            try:
+                entries = decode_series(blob)
+            except (ValueError, struct.error, IndexError):
+                # Unreadable series: start it over rather than fail the load
+                entries = []
+            pipe.set(key, encode_series(append_day(entries, day, values, retention_days)), ex=ttl)
+        pipe.execute()
+    return len(rows)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""Read-only, memory-mapped snapshot of the query/product metrics.
+
+For read-only deployments the daily CSV can be served without Redis: the
+snapshot builder writes one compact file, and every API worker memory-maps it.
+Opening a snapshot only parses a fixed header, so startup is near instant,
+and all workers share the same pages through the OS page cache.
+
+File layout (native byte order, every section 8-byte aligned)::
+
+    header          magic, version, byte order, row/query/product/slot counts
+    section table   (offset, length) of each section below
+    string_offsets  uint32[strings + 1]  - queries first, then products
+    string_blob     UTF-8 bytes
+    row_query       uint32[rows]         - string id of each row's query
+    row_product     uint32[rows]         - string id of each row's product
+    viewers .. paid_enrollers            int64[rows]
+    ctr .. paid_conversion_rate          float64[rows]
+    query_rows      uint32[queries + 1]  - rows are grouped by query
+    key_slots       uint32[slots]        - open-addressing table, row + 1
+    query_slots     uint32[query slots]  - open-addressing table, query + 1
+
+Both hash tables use CRC-32 (stable across processes, unlike ``hash()``) with
+linear probing; a slot of 0 is empty.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+DEFAULT_SNAPSHOT_PATH = 'metrics.snapshot'
+
+MAGIC = b'MSNP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHcxIIIII')
+
+COUNT_COLUMNS = ('viewers', 'clickers', 'enrollers', 'paid_enrollers')
+RATE_COLUMNS = ('ctr', 'enrollment_rate', 'paid_conversion_rate')
+SECTIONS = ('string_offsets', 'string_blob', 'row_query', 'row_product') + COUNT_COLUMNS + RATE_COLUMNS + (
+    'query_rows', 'key_slots', 'query_slots')
+SECTION_TABLE = struct.Struct(f'<{len(SECTIONS) * 2}Q')
+SECTION_FORMATS = {
+    'string_offsets': 'I', 'row_query': 'I', 'row_product': 'I', 'query_rows': 'I',
+    'key_slots': 'I', 'query_slots': 'I',
+    **{column: 'q' for column in COUNT_COLUMNS},
+    **{column: 'd' for column in RATE_COLUMNS},
+}
+BYTE_ORDER = b'L' if sys.byteorder == 'little' else b'B'
+
+
+def _slot_count(entries):
+    """Power of two with the table at most half full"""
+    size = 8
+    while size < entries * 2:
+        size *= 2
+    return size
+
+
+def _hash_table(keys, size):
+    import numpy as np
+
+    slots = np.zeros(size, dtype=np.uint32)
+    mask = size - 1
+    for entry, key in enumerate(keys, 1):
+        slot = zlib.crc32(key) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = entry
+    return slots
+
+
+def write_snapshot(df, path):
+    """Write the metrics DataFrame as a snapshot file (atomically replaces ``path``)"""
+    import numpy as np
+    import pandas as pd
+
+    df = df.dropna(subset=['searched_query', 'clicked_product'])
+    df = df.assign(searched_query=df['searched_query'].astype(str),
+                   clicked_product=df['clicked_product'].astype(str))
+    # Later rows win, like repeated SETs of the same key
+    df = df.drop_duplicates(['searched_query', 'clicked_product'], keep='last')
+
+    query_codes, queries = pd.factorize(df['searched_query'], sort=True)
+    product_codes, products = pd.factorize(df['clicked_product'], sort=True)
+    order = np.lexsort((product_codes, query_codes))
+    query_codes, product_codes = query_codes[order], product_codes[order]
+
+    encoded = [s.encode('utf-8') for s in list(queries) + list(products)]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    string_offsets[1:] = np.cumsum([len(s) for s in encoded])
+
+    query_rows = np.searchsorted(query_codes, np.arange(len(queries) + 1)).astype(np.uint32)
+    key_slots = _hash_table(
+        (encoded[q] + b':' + encoded[len(queries) + p] for q, p in zip(query_codes, product_codes)),
+        _slot_count(len(df)),
+    )
+    query_slots = _hash_table(encoded[:len(queries)], _slot_count(len(queries)))
+
+    sections = {
+        'string_offsets': string_offsets.tobytes(),
+        'string_blob': b''.join(encoded),
+        'row_query': query_codes.astype(np.uint32).tobytes(),
+        'row_product': (product_codes + len(queries)).astype(np.uint32).tobytes(),
+        'query_rows': query_rows.tobytes(),
+        'key_slots': key_slots.tobytes(),
+        'query_slots': query_slots.tobytes(),
+    }
+    for column in COUNT_COLUMNS:
+        sections[column] = df[column].fillna(0).to_numpy(dtype=np.int64)[order].tobytes()
+    for column in RATE_COLUMNS:
+        sections[column] = df[column].fillna(0).to_numpy(dtype=np.float64)[order].tobytes()
+
+    tmp_path = f"{path}.tmp"
+    table = []
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * (HEADER.size + SECTION_TABLE.size))
+        for name in SECTIONS:
+            f.write(b'\0' * (-f.tell() % 8))
+            table.extend((f.tell(), len(sections[name])))
+            f.write(sections[name])
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER, len(df), len(queries), len(products),
+                            len(key_slots), len(query_slots)))
+        f.write(SECTION_TABLE.pack(*table))
+    # Servers that already mapped the old file keep reading its inode
+    os.replace(tmp_path, path)
+    return len(df)
+
+
+class MetricsSnapshot:
+    """Memory-mapped snapshot answering the ``/metrics`` and ``/search`` lookups"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, byte_order, self.rows, self.query_count, self.product_count, \
+            key_slots, query_slots = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a v{FORMAT_VERSION} metrics snapshot")
+        if byte_order != BYTE_ORDER:
+            raise ValueError(f"{path} was built on a machine with a different byte order")
+
+        table = SECTION_TABLE.unpack_from(view, HEADER.size)
+        self._sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = table[2 * i], table[2 * i + 1]
+            section = view[offset:offset + length]
+            fmt = SECTION_FORMATS.get(name)
+            self._sections[name] = section.cast(fmt) if fmt else section
+        self._offsets = self._sections['string_offsets']
+        self._blob = self._sections['string_blob']
+        self._key_slots = self._sections['key_slots']
+        self._query_slots = self._sections['query_slots']
+
+    def close(self):
+        for section in self._sections.values():
+            section.release()
+        self._sections = {}
+        self._mmap.close()
+
+    def _string_bytes(self, string_id):
+        return self._blob[self._offsets[string_id]:self._offsets[string_id + 1]]
+
+    def _string(self, string_id):
+        return bytes(self._string_bytes(string_id)).decode('utf-8')
+
+    def _row_metrics(self, row):
+        sections = self._sections
+        metrics = {column: sections[column][row] for column in COUNT_COLUMNS}
+        metrics.update((column, sections[column][row]) for column in RATE_COLUMNS)
+        return metrics
+
+    def _find_row(self, query, product_id):
+        query, product_id = query.encode('utf-8'), product_id.encode('utf-8')
+        slots = self._key_slots
+        mask = len(slots) - 1
+        slot = zlib.crc32(query + b':' + product_id) & mask
+        row_query, row_product = self._sections['row_query'], self._sections['row_product']
+        while slots[slot]:
+            row = slots[slot] - 1
+            if (self._string_bytes(row_query[row]) == query
+                    and self._string_bytes(row_product[row]) == product_id):
+                return row
+            slot = (slot + 1) & mask
+        return None
+
+    def _find_query(self, query):
+        query = query.encode('utf-8')
+        slots = self._query_slots
+        mask = len(slots) - 1
+        slot = zlib.crc32(query) & mask
+        while slots[slot]:
+            query_id = slots[slot] - 1
+            if self._string_bytes(query_id) == query:
+                return query_id
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, query, product_id):
+        """Metrics for one query/product pair, or ``None``"""
+        row = self._find_row(query, product_id)
+        return None if row is None else self._row_metrics(row)
+
+    def get_key(self, key):
+        """Metrics for a Redis-style ``query:productId`` key, or ``None``"""
+        query, sep, product_id = key.rpartition(':')
+        return self.get(query, product_id) if sep else None
+
+    def search(self, query):
+        """``{product_id: metrics}`` for every product recorded under ``query``"""
+        query_id = self._find_query(query)
+        if query_id is None:
+            return {}
+        query_rows, row_product = self._sections['query_rows'], self._sections['row_product']
+        return {self._string(row_product[row]): self._row_metrics(row)
+                for row in range(query_rows[query_id], query_rows[query_id + 1])}
+
+    def sample_queries(self, count=5):
+        return [self._string(i) for i in range(min(count, self.query_count))]
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'rows': self.rows,
+            'queries': self.query_count,
+            'products': self.product_count,
+            'file_bytes': len(self._mmap),
+        }
+
+
+def open_snapshot_from_env():
+    """Open the snapshot when ``METRICS_BACKEND=snapshot`` (``None`` for Redis)"""
+    if os.environ.get('METRICS_BACKEND', 'redis').lower() != 'snapshot':
+        return None
+    return MetricsSnapshot(os.environ.get('METRICS_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH))
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""Per-product rollups: the reverse view of the query -> product metrics.
+
+The loader aggregates every row of the metrics CSV by ``clicked_product``
+with vectorized pandas operations and stores one JSON document per product
+under ``product_rollup:<product_id>``, so ``/product/<product_id>`` is a
+single GET. Counts are summed; rates are viewer-weighted averages of the
+per-query rates (in the same percent units as the CSV). Exports that carry
+course metadata columns (title, partner, ...) also get them in the rollup
+under ``metadata``, in the ``productDetails`` shape the extension sends.
+
+The ids of the stored rollups are kept in a set next to the query index
+(``{query_index}:products``), so a reload deletes the rollups of products
+that left the dataset instead of serving them as current.
+"""
+
+import json
+
+from query_index import BUILD_SUFFIX, INDEX_PREFIX
+
+PRODUCT_ROLLUP_PREFIX = 'product_rollup:'
+PRODUCT_SET_KEY = f'{INDEX_PREFIX}products'
+TOP_QUERIES = 10
+
+COUNT_COLUMNS = ['viewers', 'clickers', 'enrollers', 'paid_enrollers']
+RATE_COLUMNS = ['ctr', 'enrollment_rate', 'paid_conversion_rate']
+# Optional metadata columns of an export -> productDetails field
+METADATA_COLUMNS = {
+    'product_title': 'title',
+    'product_name': 'title',
+    'title': 'title',
+    'partner_name': 'partner',
+    'partner': 'partner',
+    'description': 'description',
+    'skills': 'skills',
+    'url': 'url',
+    'entity_type': 'entityType',
+    'product_type': 'entityType',
+}
+
+
+def product_rollup_key(product_id):
+    return f"{PRODUCT_ROLLUP_PREFIX}{product_id}"
+
+
+def product_metadata(df):
+    """``{product_id: productDetails fields}`` from whichever metadata columns ``df`` has"""
+    columns = [column for column in METADATA_COLUMNS if column in df.columns]
+    if not columns:
+        return {}
+    first = df.dropna(subset=['clicked_product'])[['clicked_product'] + columns] \
+        .groupby('clicked_product', sort=False).first()
+    metadata = {}
+    for product_id, row in zip(first.index, first.itertuples(index=False)):
+        details = {}
+        for column, value in zip(columns, row):
+            field = METADATA_COLUMNS[column]
+            if field not in details and isinstance(value, str) and value.strip():
+                details[field] = value.strip()
+        if details:
+            metadata[str(product_id)] = details
+    return metadata
+
+
+def compute_rollups(df, top_k=TOP_QUERIES):
+    """Return ``{product_id: rollup}`` for every product in the metrics DataFrame"""
+    df = df.dropna(subset=['searched_query', 'clicked_product'])
+    df = df.assign(**{column: df[column].fillna(0) for column in COUNT_COLUMNS + RATE_COLUMNS})
+    weighted = df[RATE_COLUMNS].mul(df['viewers'], axis=0).add_suffix('_weighted')
+    grouped = (
+        df[['clicked_product'] + COUNT_COLUMNS]
+        .join(weighted)
+        .assign(queries=1)
+        .groupby('clicked_product', sort=False)
+        .sum()
+    )
+    for column in RATE_COLUMNS:
+        # Products nobody viewed get 0 instead of a NaN rate
+        grouped[column] = (grouped[f'{column}_weighted'] / grouped['viewers'].where(grouped['viewers'] > 0)).fillna(0)
+
+    top = (
+        df.sort_values(['clicked_product', 'viewers'], ascending=[True, False], kind='stable')
+        .groupby('clicked_product', sort=False)
+        .head(top_k)
+    )
+    top_queries = {}
+    for product_id, query, viewers, clickers, enrollers, ctr, enrollment_rate in zip(
+            top['clicked_product'], top['searched_query'], top['viewers'], top['clickers'],
+            top['enrollers'], top['ctr'], top['enrollment_rate']):
+        top_queries.setdefault(product_id, []).append({
+            'query': str(query),
+            'viewers': int(viewers),
+            'clickers': int(clickers),
+            'enrollers': int(enrollers),
+            'ctr': round(float(ctr), 2),
+            'enrollment_rate': round(float(enrollment_rate), 2),
+        })
+
+    metadata = product_metadata(df)
+    rollups = {}
+    for row in grouped.itertuples():
+        product_id = str(row.Index)
+        rollups[product_id] = {
+            'product_id': product_id,
+            'queries': int(row.queries),
+            'viewers': int(row.viewers),
+            'clickers': int(row.clickers),
+            'enrollers': int(row.enrollers),
+            'paid_enrollers': int(row.paid_enrollers),
+            'ctr': round(float(row.ctr), 2),
+            'enrollment_rate': round(float(row.enrollment_rate), 2),
+            'paid_conversion_rate': round(float(row.paid_conversion_rate), 2),
+            'top_queries': top_queries.get(row.Index, []),
+        }
+        if product_id in metadata:
+            rollups[product_id]['metadata'] = metadata[product_id]
+    return rollups
+
+
+def stored_product_ids(client):
+    """Ids of the rollups the previous load stored"""
+    if client.exists(PRODUCT_SET_KEY):
+        return set(client.smembers(PRODUCT_SET_KEY))
+    # Loaded before the id set existed: find the rollups by prefix
+    prefix_length = len(PRODUCT_ROLLUP_PREFIX)
+    return {key[prefix_length:] for key in client.scan_iter(match=f"{PRODUCT_ROLLUP_PREFIX}*", count=1000)}
+
+
+def build_product_rollups(client, df, top_k=TOP_QUERIES, chunk_size=1000):
+    """Compute the rollups, store one JSON document per product and drop stale ones"""
+    rollups = compute_rollups(df, top_k)
+    stale = [product_id for product_id in stored_product_ids(client) if product_id not in rollups]
+    items = list(rollups.items())
+    for start in range(0, len(items), chunk_size):
+        pipe = client.pipeline(transaction=False)
+        for product_id, rollup in items[start:start + chunk_size]:
+            pipe.set(product_rollup_key(product_id), json.dumps(rollup))
+        pipe.execute()
+    for start in range(0, len(stale), chunk_size):
+        pipe = client.pipeline(transaction=False)
+        for product_id in stale[start:start + chunk_size]:
+            pipe.delete(product_rollup_key(product_id))
+        pipe.execute()
+
+    # Swapped in like the query index: same hash tag, so RENAME works on a cluster
+    building_key = f'{PRODUCT_SET_KEY}{BUILD_SUFFIX}'
+    client.delete(building_key)
+    for start in range(0, len(items), chunk_size):
+        client.sadd(building_key, *[product_id for product_id, _ in items[start:start + chunk_size]])
+    if items:
+        client.rename(building_key, PRODUCT_SET_KEY)
+    else:
+        client.delete(PRODUCT_SET_KEY)
+    return len(rollups)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""Lexicographic prefix index over the search queries in the dataset.
+
+The loaders store one sorted-set member per raw query, all with score 0, so
+``ZRANGEBYLEX`` answers prefix lookups in O(log n + limit) instead of a
+keyspace walk. Each member carries everything a listing needs::
+
+    <normalized query> \\t <total viewers> \\t <product count> \\t <raw query>
+
+The normalized form (see ``query_normalizer.fold_text``) leads, so members
+sort and prefix-match on it; the raw query comes last because it is the key
+prefix used by ``/search`` and ``/metrics``. Both keys share the
+``{query_index}`` hash tag so a rebuild can be swapped in atomically with
+RENAME, on a cluster as well.
+"""
+
+from query_normalizer import fold_text
+
+INDEX_PREFIX = '{query_index}:'
+QUERY_INDEX_KEY = f'{INDEX_PREFIX}lex'
+BUILD_SUFFIX = ':building'
+SEPARATOR = '\t'
+# Sorts after every UTF-8 byte, closing the prefix range
+RANGE_END = b'\xff'
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 500
+
+
+def index_member(query, viewers, products):
+    return SEPARATOR.join((fold_text(query), str(int(viewers)), str(int(products)), str(query)))
+
+
+def parse_member(member):
+    normalized, viewers, products, query = member.split(SEPARATOR, 3)
+    return {
+        'query': query,
+        'normalized': normalized,
+        'viewers': int(viewers),
+        'products': int(products),
+    }
+
+
+def query_totals(df):
+    """Per-query viewer totals and product counts from the metrics DataFrame"""
+    grouped = df.groupby('searched_query', sort=False).agg(
+        viewers=('viewers', 'sum'), products=('clicked_product', 'nunique')
+    )
+    return zip(grouped.index.astype(str), grouped['viewers'].fillna(0), grouped['products'])
+
+
+def build_query_index(client, df, chunk_size=5000):
+    """Rebuild the prefix index from the metrics DataFrame and swap it in"""
+    building_key = f'{QUERY_INDEX_KEY}{BUILD_SUFFIX}'
+    client.delete(building_key)
+    members = [index_member(query, viewers, products) for query, viewers, products in query_totals(df)]
+    for start in range(0, len(members), chunk_size):
+        client.zadd(building_key, {member: 0 for member in members[start:start + chunk_size]})
+    if members:
+        client.rename(building_key, QUERY_INDEX_KEY)
+    else:
+        client.delete(QUERY_INDEX_KEY)
+    return len(members)
+
+
+def prefix_range(prefix):
+    """``ZRANGEBYLEX`` bounds covering every member whose normalized query starts with ``prefix``"""
+    prefix = fold_text(prefix)
+    if not prefix:
+        return '-', '+'
+    return f'[{prefix}'.encode('utf-8'), f'[{prefix}'.encode('utf-8') + RANGE_END
+
+
+def lookup_prefix(client, prefix, limit=DEFAULT_LIMIT, offset=0):
+    """Queries whose normalized form starts with ``prefix``, in lexicographic order"""
+    low, high = prefix_range(prefix)
+    members = client.zrangebylex(QUERY_INDEX_KEY, low, high, start=offset, num=limit)
+    return [parse_member(member) for member in members]
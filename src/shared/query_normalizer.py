@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Canonical forms for search queries and ``query:productId`` cache keys.
+
+The extension keys AI explanations as ``searchQuery.toLowerCase():productId``,
+so "Machine Learning ", "machine-learning" and "machine learning" used to be
+three separate cache entries (and three paid generations). The canonicalizer
+folds such variants onto one key:
+
+* Unicode NFKC normalization, accent stripping and case folding,
+* punctuation folded to spaces (apostrophes dropped, ``+``/``#`` kept so
+  "C++" and "C#" stay distinct from "C"), whitespace collapsed,
+* an optional alias table (``QUERY_SYNONYMS_FILE``, a JSON object mapping
+  alias phrases to their canonical phrase, e.g. ``{"ml": "machine learning"}``),
+* optional light plural stemming (``QUERY_STEMMING=1``),
+* product ids lose their ``course~``/``s12n~`` type prefix.
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+
+KEPT_SYMBOLS = '+#'
+APOSTROPHES = "'’ʼ"
+
+
+def fold_text(text):
+    """Normalize Unicode, strip accents, case-fold and fold punctuation to spaces"""
+    text = unicodedata.normalize('NFKC', str(text))
+    text = ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+    chars = []
+    for ch in text.casefold():
+        if ch in APOSTROPHES:
+            continue
+        if ch not in KEPT_SYMBOLS and unicodedata.category(ch)[0] in 'PSZC':
+            chars.append(' ')
+        else:
+            chars.append(ch)
+    return ' '.join(''.join(chars).split())
+
+
+def stem_token(token):
+    """Light plural stripping (Harman's S-stemmer)"""
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith('ies') and not token.endswith(('eies', 'aies')):
+        return token[:-3] + 'y'
+    if token.endswith('es') and not token.endswith(('aes', 'ees', 'oes')):
+        return token[:-1]
+    if token.endswith('s') and not token.endswith(('us', 'ss')):
+        return token[:-1]
+    return token
+
+
+def clean_product_id(product_id):
+    """Drop the ``type~`` prefix the card data carries (``course~ABC`` -> ``ABC``)"""
+    product_id = str(product_id).strip()
+    return product_id.split('~', 1)[1] if '~' in product_id else product_id
+
+
+class QueryCanonicalizer:
+    """Maps query and cache-key variants onto one canonical form"""
+
+    def __init__(self, synonyms=None, stemming=False):
+        self.stemming = stemming
+        self.synonyms = {}
+        self._alias_pattern = None
+        if synonyms:
+            self.set_synonyms(synonyms)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_env(cls):
+        synonyms = None
+        path = os.environ.get('QUERY_SYNONYMS_FILE')
+        if path:
+            with open(path) as f:
+                synonyms = json.load(f)
+        stemming = os.environ.get('QUERY_STEMMING', '').lower() in ('1', 'true', 'yes')
+        return cls(synonyms=synonyms, stemming=stemming)
+
+    def set_synonyms(self, synonyms):
+        """Install an ``{alias: canonical phrase}`` table"""
+        self.synonyms = {}
+        for alias, canonical in synonyms.items():
+            alias = self._normalize(alias)
+            if alias:
+                self.synonyms[alias] = self._normalize(canonical)
+        if self.synonyms:
+            # Longest aliases first so "deep learning" wins over "learning"
+            aliases = sorted(self.synonyms, key=len, reverse=True)
+            self._alias_pattern = re.compile(
+                r'(?<!\S)(?:' + '|'.join(re.escape(alias) for alias in aliases) + r')(?!\S)'
+            )
+        else:
+            self._alias_pattern = None
+
+    def _normalize(self, text):
+        folded = fold_text(text)
+        if self.stemming:
+            folded = ' '.join(stem_token(token) for token in folded.split())
+        return folded
+
+    def canonical_query(self, query):
+        normalized = self._normalize(query)
+        if self._alias_pattern is not None:
+            normalized = self._alias_pattern.sub(lambda m: self.synonyms[m.group(0)], normalized)
+        return normalized
+
+    def canonical_key(self, cache_key):
+        """Canonical form of a ``query:productId`` explanation cache key"""
+        query, sep, product_id = str(cache_key).rpartition(':')
+        if not sep:
+            return self.canonical_query(cache_key)
+        return f"{self.canonical_query(query)}:{clean_product_id(product_id)}"
+
+    # -- hit-rate accounting ------------------------------------------------
+
+    def reset_stats(self):
+        with self._lock:
+            self.lookups = 0
+            self.hits = 0
+            self.folded_hits = 0
+            self.folded_keys = 0
+
+    def record_lookup(self, requested_key, canonical_key, entry):
+        """Count one lookup.
+
+        ``entry`` is the decoded cache entry (or ``None`` on a miss). A hit is
+        *folded* when the entry was written under a different raw key than the
+        one requested - without canonicalization it would have been a miss.
+        """
+        with self._lock:
+            self.lookups += 1
+            self.folded_keys += requested_key != canonical_key
+            if entry is None:
+                return
+            self.hits += 1
+            written_key = f"{str(entry.get('query', '')).lower()}:{entry.get('productId', '')}"
+            self.folded_hits += written_key != requested_key
+
+    def stats(self):
+        with self._lock:
+            exact_hits = self.hits - self.folded_hits
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'folded_hits': self.folded_hits,
+                'keys_rewritten': self.folded_keys,
+                'hit_rate_before': round(exact_hits / self.lookups, 4) if self.lookups else None,
+                'hit_rate_after': round(self.hits / self.lookups, 4) if self.lookups else None,
+                'stemming': self.stemming,
+                'synonyms': len(self.synonyms),
+            }
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+"""Keep the API responsive when Redis stalls or goes away.
+
+* ``CircuitBreaker`` counts consecutive failed Redis calls. Errors count, and
+  so do calls slower than the latency threshold. Once the count reaches the
+  failure threshold the breaker opens, and calls fail fast with
+  ``CircuitOpenError`` instead of waiting out the socket timeout. After
+  ``reset_timeout`` seconds one call is let through as a half-open probe.
+  Success closes the breaker; failure opens it again.
+* ``GuardedRedis`` is a ``redis.Redis`` whose commands and pipelines all go
+  through a breaker.
+* ``HealthMonitor`` probes Redis from a background thread and caches the
+  result, so ``/health`` answers without touching Redis.
+* ``StaleCache`` keeps a bounded in-memory copy of recently served values.
+  While the breaker is open, routes can answer from it and flag the answer
+  as stale.
+
+Configuration:
+    REDIS_BREAKER_FAILURES      consecutive failures that open the breaker (default 5)
+    REDIS_BREAKER_LATENCY_MS    slower calls count as failures (default 500)
+    REDIS_BREAKER_RESET         seconds before a half-open probe (default 10)
+    REDIS_HEALTH_INTERVAL       seconds between background probes (default 2)
+    REDIS_STALE_READS           1 to serve stale copies while the breaker is open
+    REDIS_STALE_MAX_ENTRIES     stale copies kept (default 5000)
+    REDIS_STALE_MAX_AGE         seconds a stale copy may be served (default 3600)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError, TimeoutError
+
+# Only transport problems say anything about Redis health; a WRONGTYPE or a
+# script error is the caller's bug and must not open the breaker
+HEALTH_ERRORS = (ConnectionError, TimeoutError)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling Redis while the breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Redis circuit open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a latency threshold and half-open probing"""
+
+    def __init__(self, failure_threshold=5, latency_threshold=0.5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_latency_ms = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            failure_threshold=int(os.environ.get('REDIS_BREAKER_FAILURES', 5)),
+            latency_threshold=float(os.environ.get('REDIS_BREAKER_LATENCY_MS', 500)) / 1000,
+            reset_timeout=float(os.environ.get('REDIS_BREAKER_RESET', 10)),
+        )
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def rejecting(self):
+        """Would a call be refused right now? (no state change)"""
+        if self.state == 'open':
+            return self.retry_after() > 0
+        return self.state == 'half_open' and self._probing
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and self.retry_after() > 0:
+                self.rejected += 1
+                return False
+            if self._probing:
+                self.rejected += 1
+                return False
+            # Let exactly one probe through
+            self.state = 'half_open'
+            self._probing = True
+            return True
+
+    def record(self, elapsed, failed):
+        with self._lock:
+            self.last_latency_ms = round(elapsed * 1000, 2)
+            failed = failed or elapsed > self.latency_threshold
+            if self.state == 'half_open':
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state, self.failures, self.opened_at = 'closed', 0, None
+                return
+            if not failed:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == 'closed' and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(self.retry_after())
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except HEALTH_ERRORS:
+            self.record(time.perf_counter() - started, True)
+            raise
+        except Exception:
+            self.record(time.perf_counter() - started, False)
+            raise
+        self.record(time.perf_counter() - started, False)
+        return result
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'times_opened': self.times_opened,
+            'rejected_calls': self.rejected,
+            'retry_after_seconds': round(self.retry_after(), 1) if self.state != 'closed' else 0,
+            'last_latency_ms': self.last_latency_ms,
+        }
+
+
+class GuardedPipeline(Pipeline):
+    def __init__(self, breaker, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute(self, raise_on_error=True):
+        return self.breaker.call(super().execute, raise_on_error)
+
+
+class GuardedRedis(redis.Redis):
+    """``redis.Redis`` whose commands and pipelines go through a ``CircuitBreaker``"""
+
+    def __init__(self, *args, breaker, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker
+
+    def execute_command(self, *args, **options):
+        return self.breaker.call(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return GuardedPipeline(self.breaker, self.connection_pool, self.response_callbacks,
+                               transaction, shard_hint)
+
+
+class HealthMonitor:
+    """Runs ``probe()`` every ``interval`` seconds in the background and caches the result"""
+
+    def __init__(self, probe, interval=2.0):
+        self.probe = probe
+        self.interval = interval
+        self.state = None
+        self.checked_at = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls, probe):
+        return cls(probe, interval=float(os.environ.get('REDIS_HEALTH_INTERVAL', 2)))
+
+    def check(self):
+        started = time.perf_counter()
+        try:
+            state = self.probe()
+        except Exception as e:
+            state = {'redis_connected': False, 'error': str(e)}
+        state['probe_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self.state, self.checked_at = state, time.time()
+        return state
+
+    def current(self):
+        """The cached state; probed inline only if the background thread is not keeping it fresh"""
+        if self.state is None or time.time() - self.checked_at > self.interval * 3:
+            return self.check()
+        return self.state
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='redis-health', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+
+class StaleCache:
+    """Bounded LRU of recently served values, used only while Redis is unavailable"""
+
+    def __init__(self, enabled=False, max_entries=5000, max_age=3600):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.served = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get('REDIS_STALE_READS', '').lower() in ('1', 'true', 'yes'),
+            max_entries=int(os.environ.get('REDIS_STALE_MAX_ENTRIES', 5000)),
+            max_age=float(os.environ.get('REDIS_STALE_MAX_AGE', 3600)),
+        )
+
+    def remember(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """``(value, age_seconds)``, or ``(None, None)`` if there is no usable copy"""
+        if not self.enabled:
+            return None, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age > self.max_age:
+                del self._entries[key]
+                return None, None
+            self.served += 1
+            return value, round(age, 1)
+
+    def stats(self):
+        return {'enabled': self.enabled, 'entries': len(self._entries), 'served': self.served}
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+"""Lua scripts for the multi-step lookups of the single-node API servers.
+
+Scripts only run bounded work - a handful of keys named up front - so they
+never hold up Redis:
+
+* ``lookup_fallback`` - first existing key of an ordered candidate list
+  (exact key, lowercase key, fuzzy candidates)
+* ``token_bucket``    - refill and take from a per-client rate-limit bucket
+  (see ``admission.py``) atomically
+
+Servers load the library once at startup (``SCRIPT LOAD``, one pipeline) and
+call scripts by SHA. If Redis answers NOSCRIPT (restart, failover or
+``SCRIPT FLUSH``), the script is loaded again and the call retried.
+
+Walks over the keyspace stay on the client, one SCAN page at a time, so other
+clients are served between pages:
+
+* ``search_ranked``   - every ``query:*`` value for the first query variant
+  with matches, ranked by viewers and optionally cut to the top N
+* ``delete_matching`` - UNLINK of every key matching a pattern
+
+Each page's MGET/UNLINK is pipelined with the SCAN for the next page, so a
+walk costs one round trip per page plus one. They scan the node the client
+is connected to, so they are for the single-node servers only; the cluster
+server keeps its per-node scans.
+"""
+
+import hashlib
+import json
+
+from redis.exceptions import NoScriptError
+
+LOOKUP_FALLBACK = """
+-- KEYS: candidate keys in order of preference
+-- Returns {index, value} for the first key that exists (1-based), or nil
+for i = 1, #KEYS do
+    local value = redis.call('GET', KEYS[i])
+    if value then
+        return {i, value}
+    end
+end
+return nil
+"""
+
+TOKEN_BUCKET = """
+-- KEYS[1]: bucket hash; ARGV: rate (tokens/s), burst, cost, now (ms)
+-- Returns 0 if the cost was taken, else the milliseconds until it could be
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local cost, now = tonumber(ARGV[3]), tonumber(ARGV[4])
+if not rate or rate <= 0 then
+    return redis.error_reply('ERR token bucket rate must be positive')
+end
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate / 1000)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return wait
+"""
+
+SCRIPTS = {
+    'lookup_fallback': LOOKUP_FALLBACK,
+    'token_bucket': TOKEN_BUCKET,
+}
+
+# SCAN COUNT per page of the client-side keyspace walks
+SCAN_BATCH = 1000
+DELETE_BATCH = 500
+# Rate-limit buckets of the Redis admission store
+RATE_LIMIT_PREFIX = 'rate_limit:'
+
+
+def script_sha(source):
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+class ScriptLibrary:
+    """Registered scripts called by SHA, reloaded when Redis has forgotten them"""
+
+    def __init__(self, sources=SCRIPTS):
+        self.sources = dict(sources)
+        self.shas = {name: script_sha(source) for name, source in self.sources.items()}
+        self.reloads = 0
+
+    def load(self, client):
+        """Load every script in one round trip (call once at startup)"""
+        pipe = client.pipeline(transaction=False)
+        for source in self.sources.values():
+            pipe.script_load(source)
+        pipe.execute()
+
+    def call(self, client, name, keys=(), args=()):
+        sha = self.shas[name]
+        try:
+            return client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            self.reloads += 1
+            client.script_load(self.sources[name])
+            return client.evalsha(sha, len(keys), *keys, *args)
+
+    # Typed wrappers
+
+    def lookup_fallback(self, client, keys):
+        """``(index, value)`` of the first existing key, or ``(None, None)``"""
+        if not keys:
+            return None, None
+        found = self.call(client, 'lookup_fallback', keys)
+        if not found:
+            return None, None
+        return int(found[0]) - 1, found[1]
+
+    def token_bucket(self, client, bucket, rate, burst, cost, now_ms):
+        """Seconds until ``cost`` tokens are available (0: taken now)"""
+        wait_ms = self.call(client, 'token_bucket', [f"{RATE_LIMIT_PREFIX}{bucket}"],
+                            [rate, burst, cost, now_ms])
+        return int(wait_ms) / 1000
+
+
+def _walk(client, pattern, count, queue, pipe=None):
+    """``[(keys, reply), ...]`` of ``queue(pipe, keys)`` run on every SCAN page of ``pattern``
+
+    ``queue`` adds one command for the page; it goes out in one pipeline with
+    the SCAN for the next page. Commands already on ``pipe`` are sent with the
+    first SCAN.
+    """
+    pipe = pipe if pipe is not None else client.pipeline(transaction=False)
+    pipe.scan(0, match=pattern, count=count)
+    cursor, keys = pipe.execute()[-1]
+    seen = set()
+    pages = []
+    while True:
+        # SCAN may return a key more than once
+        keys = [key for key in keys if key not in seen]
+        seen.update(keys)
+        pipe = client.pipeline(transaction=False)
+        if keys:
+            queue(pipe, keys)
+        if cursor:
+            pipe.scan(cursor, match=pattern, count=count)
+        replies = pipe.execute()
+        if keys:
+            pages.append((keys, replies[0]))
+        if not cursor:
+            return pages
+        cursor, keys = replies[-1]
+
+
+def _viewers(value):
+    try:
+        return float(json.loads(value).get('viewers') or 0)
+    except (ValueError, AttributeError):
+        return 0
+
+
+def search_ranked(client, patterns, limit=0, count=SCAN_BATCH):
+    """``(pattern_index, [(key, value), ...])``, best-viewed first; ``(None, [])`` if nothing matched
+
+    Patterns are tried in order; the first one with values wins.
+    """
+    for index, pattern in enumerate(patterns):
+        rows = [
+            (key, value)
+            for keys, values in _walk(client, pattern, count, lambda pipe, keys: pipe.mget(keys))
+            for key, value in zip(keys, values)
+            if value is not None
+        ]
+        if rows:
+            rows.sort(key=lambda row: (-_viewers(row[1]), row[0]))
+            return index, rows[:limit] if limit > 0 else rows
+    return None, []
+
+
+def delete_matching(client, pattern, extra_keys=(), batch=DELETE_BATCH):
+    """Remove every key matching ``pattern`` (plus ``extra_keys``); returns how many matched"""
+    pipe = client.pipeline(transaction=False)
+    if extra_keys:
+        pipe.unlink(*extra_keys)
+    pages = _walk(client, pattern, batch, lambda pipe, keys: pipe.unlink(*keys), pipe)
+    return sum(int(deleted) for _, deleted in pages)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""Spread the cluster API's read-only lookups over the cluster replicas.
+
+``docker-compose.yml`` gives every primary one replica. With a read strategy
+other than ``primary``, the cluster client is created with
+``read_from_replicas=True``, so every connection sends READONLY. The
+``ReplicaReader`` then picks the node for each shard's reads itself:
+
+* ``primary``      - every read goes to the primary (the default, as before)
+* ``round_robin``  - rotate over the primary and its usable replicas
+* ``replicas``     - rotate over the usable replicas; the primary only as a fallback
+* ``random``       - pick any of the primary and its usable replicas
+
+A replica is usable unless it is stale or cooling down after a failure.
+Every ``REDIS_REPLICA_CHECK_INTERVAL`` seconds the reader re-reads the shard
+layout and, in a background thread, ``INFO replication`` from each replica;
+only the very first check runs before a read is served, so requests never
+wait on the replicas otherwise. A replica whose link to its primary is down,
+that is resyncing, or that has heard nothing from its primary for more than
+``REDIS_REPLICA_MAX_LAG`` seconds is skipped until the next check. (Idle
+primaries ping their replicas every 10 seconds, hence the default of 15.) A
+read that fails on a replica is retried on the primary, and that replica is
+skipped for ``REDIS_REPLICA_COOLDOWN`` seconds.
+
+Every command sent is counted per node, so ``stats()`` shows how evenly the
+load is spread.
+
+Configuration:
+    REDIS_READ_STRATEGY           primary | round_robin | replicas | random
+    REDIS_REPLICA_MAX_LAG         seconds (default 15)
+    REDIS_REPLICA_CHECK_INTERVAL  seconds (default 5)
+    REDIS_REPLICA_COOLDOWN        seconds (default 30)
+"""
+
+import itertools
+import os
+import random
+import threading
+import time
+
+from redis.exceptions import ConnectionError, TimeoutError
+
+STRATEGIES = ('primary', 'round_robin', 'replicas', 'random')
+DEFAULT_MAX_LAG = 15
+DEFAULT_CHECK_INTERVAL = 5
+DEFAULT_COOLDOWN = 30
+
+NODE_ERRORS = (ConnectionError, TimeoutError)
+
+
+class ReplicaReader:
+    """Routes reads of a ``RedisCluster`` client to primaries or replicas"""
+
+    def __init__(self, strategy='primary', max_lag=DEFAULT_MAX_LAG, check_interval=DEFAULT_CHECK_INTERVAL,
+                 cooldown=DEFAULT_COOLDOWN):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown read strategy {strategy!r} (expected one of {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._checked_at = None
+        self._checker = None
+        self._stale = {}
+        self._failed_until = {}
+        self._rotation = {}
+        self._reads = {}
+        self._roles = {}
+        self.fallbacks = 0
+        self.stale_skips = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            strategy=os.environ.get('REDIS_READ_STRATEGY', 'primary').lower(),
+            max_lag=float(os.environ.get('REDIS_REPLICA_MAX_LAG', DEFAULT_MAX_LAG)),
+            check_interval=float(os.environ.get('REDIS_REPLICA_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)),
+            cooldown=float(os.environ.get('REDIS_REPLICA_COOLDOWN', DEFAULT_COOLDOWN)),
+        )
+
+    @property
+    def enabled(self):
+        return self.strategy != 'primary'
+
+    def cluster_options(self):
+        """Extra ``RedisCluster`` kwargs (READONLY connections when replicas are read)"""
+        return {'read_from_replicas': True} if self.enabled else {}
+
+    # Topology and replica health
+
+    def _refresh(self, client):
+        """Re-read the shard layout once per check interval and start a replica lag check"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            shards = {}
+            for nodes in client.nodes_manager.slots_cache.values():
+                if nodes:
+                    shards.setdefault(nodes[0].name, list(nodes))
+            self._rotation = {name: self._rotation.get(name) or itertools.count() for name in shards}
+            self._shards = shards
+            self._checked_at = now
+            if self._checker is not None and self._checker.is_alive():
+                return
+            first = self._checker is None
+            checker = self._checker = threading.Thread(target=self._check_replicas, args=(client, shards),
+                                                       daemon=True)
+        if first:
+            checker.run()
+        else:
+            checker.start()
+
+    def _check_replicas(self, client, shards):
+        stale = {}
+        for nodes in shards.values():
+            for replica in nodes[1:]:
+                stale[replica.name] = self._replica_is_stale(client, replica)
+        self._stale = stale
+
+    def _replica_is_stale(self, client, replica):
+        try:
+            info = client.get_redis_connection(replica).info('replication')
+        except NODE_ERRORS:
+            self._mark_failed(replica)
+            return True
+        return (
+            info.get('master_link_status') != 'up'
+            or bool(info.get('master_sync_in_progress'))
+            or info.get('master_last_io_seconds_ago', self.max_lag + 1) > self.max_lag
+        )
+
+    def _mark_failed(self, node):
+        self._failed_until[node.name] = time.monotonic() + self.cooldown
+
+    def _usable(self, replica):
+        if self._stale.get(replica.name, False):
+            self.stale_skips += 1
+            return False
+        return self._failed_until.get(replica.name, 0) <= time.monotonic()
+
+    def _pick(self, primary_name, nodes):
+        primary, replicas = nodes[0], [node for node in nodes[1:] if self._usable(node)]
+        if self.strategy == 'replicas':
+            candidates = replicas or [primary]
+        else:
+            candidates = [primary] + replicas
+        if self.strategy == 'random':
+            return random.choice(candidates)
+        rotation = self._rotation.setdefault(primary_name, itertools.count())
+        return candidates[next(rotation) % len(candidates)]
+
+    def _count(self, node, role):
+        self._reads[node.name] = self._reads.get(node.name, 0) + 1
+        self._roles[node.name] = role
+
+    def _on_shard(self, client, primary_name, read, fallback):
+        """Run ``read(connection)`` on a node of the shard, or ``fallback()`` if it is unknown"""
+        nodes = self._shards.get(primary_name)
+        if nodes is None:
+            # The slot moved to a primary we have not seen; re-read the layout now
+            self._checked_at = None
+            self._refresh(client)
+            nodes = self._shards.get(primary_name)
+        if nodes is None:
+            # Still not in the layout (mid-failover); let the cluster client route the read
+            return fallback()
+        return self._on_nodes(client, primary_name, nodes, read)
+
+    def _on_nodes(self, client, primary_name, nodes, read):
+        """Run ``read(connection)`` on the chosen node, falling back to the primary"""
+        primary = nodes[0]
+        node = self._pick(primary_name, nodes)
+        if node is not primary:
+            try:
+                self._count(node, 'replica')
+                return read(client.get_redis_connection(node))
+            except NODE_ERRORS:
+                self._mark_failed(node)
+                self.fallbacks += 1
+        self._count(primary, 'primary')
+        return read(client.get_redis_connection(primary))
+
+    def _shard_of(self, client, key):
+        return client.nodes_manager.slots_cache[client.keyslot(key)][0].name
+
+    # Read commands used by the API routes
+
+    def get(self, client, key):
+        if not self.enabled:
+            return client.get(key)
+        self._refresh(client)
+        return self._on_shard(client, self._shard_of(client, key), lambda connection: connection.get(key),
+                              lambda: client.get(key))
+
+    def mget(self, client, keys):
+        """Values for ``keys`` in order; one pipeline (MGET per slot) per shard"""
+        if not self.enabled:
+            return client.mget_nonatomic(keys) if keys else []
+        self._refresh(client)
+        by_shard = {}
+        for key in keys:
+            slot = client.keyslot(key)
+            shard = client.nodes_manager.slots_cache[slot][0].name
+            by_shard.setdefault(shard, {}).setdefault(slot, []).append(key)
+
+        values = {}
+        for shard, slots in by_shard.items():
+            def read(connection, slots=slots):
+                pipe = connection.pipeline(transaction=False)
+                for slot_keys in slots.values():
+                    pipe.mget(slot_keys)
+                return pipe.execute()
+            def fallback(slots=slots):
+                return [client.mget_nonatomic(slot_keys) for slot_keys in slots.values()]
+            for slot_keys, slot_values in zip(slots.values(), self._on_shard(client, shard, read, fallback)):
+                values.update(zip(slot_keys, slot_values))
+        return [values.get(key) for key in keys]
+
+    def scan_keys(self, client, match=None, count=None):
+        """Every key matching ``match``, scanning one node per shard"""
+        if not self.enabled:
+            return list(client.scan_iter(match=match, count=count))
+        self._refresh(client)
+        keys = []
+        for shard, nodes in self._shards.items():
+            keys.extend(self._on_nodes(client, shard, nodes,
+                                       lambda connection: list(connection.scan_iter(match=match, count=count))))
+        return keys
+
+    def dbsize(self, client):
+        if not self.enabled:
+            return client.dbsize()
+        self._refresh(client)
+        return sum(self._on_nodes(client, shard, nodes, lambda connection: connection.dbsize())
+                   for shard, nodes in self._shards.items())
+
+    def stats(self):
+        return {
+            'strategy': self.strategy,
+            'max_lag_seconds': self.max_lag,
+            'fallbacks': self.fallbacks,
+            'stale_skips': self.stale_skips,
+            'stale_replicas': sorted(name for name, stale in self._stale.items() if stale),
+            'cooling_down': sorted(name for name, until in self._failed_until.items()
+                                   if until > time.monotonic()),
+            'nodes': {name: {'role': self._roles[name], 'reads': reads}
+                      for name, reads in sorted(self._reads.items())},
+        }
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Persistent self-signed certificate and TLS settings for the HTTPS API server.
+
+The key and certificate are created once and stored in ``TLS_CERT_DIR``
+(default ``~/.cache/mat-search-explainer/tls``). Later starts load them from
+disk and are not regenerated, so a restart is fast and the browser keeps
+trusting the certificate it was told to accept. They are only replaced once
+fewer than ``TLS_RENEW_DAYS`` days of validity remain, or if the files are
+missing, unreadable or do not match each other.
+
+Keys are ECDSA P-256 by default: generating one is much faster than an RSA
+key, and so are the handshakes that sign with it. Set ``TLS_KEY_TYPE=rsa`` for
+a 2048-bit RSA key instead.
+
+``server_context`` builds the ``SSLContext``: TLS 1.2+, session tickets on,
+and resumption within the process lifetime.
+
+Requires the ``cryptography`` package: ``pip install cryptography``.
+
+Configuration:
+    TLS_CERT_DIR     where cert.pem / key.pem are kept
+    TLS_KEY_TYPE     ecdsa | rsa (default ecdsa)
+    TLS_CERT_DAYS    validity of a new certificate (default 365)
+    TLS_RENEW_DAYS   replace the certificate this close to expiry (default 30)
+"""
+
+import datetime
+import ipaddress
+import os
+import ssl
+
+KEY_TYPES = ('ecdsa', 'rsa')
+DEFAULT_CERT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mat-search-explainer', 'tls')
+DEFAULT_CERT_DAYS = 365
+DEFAULT_RENEW_DAYS = 30
+CERT_FILE = 'cert.pem'
+KEY_FILE = 'key.pem'
+# TLS 1.3 tickets issued per handshake (one per parallel connection the client may resume)
+SESSION_TICKETS = 4
+
+HOSTNAMES = ['localhost']
+IP_ADDRESSES = ['127.0.0.1', '::1']
+
+
+def _crypto():
+    try:
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    except ImportError:
+        raise ImportError("cryptography is required for HTTPS. Install with: pip install cryptography")
+    return x509, hashes, serialization, ec, rsa
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _expires(cert):
+    # cryptography < 42 only has the naive UTC ``not_valid_after``
+    expires = getattr(cert, 'not_valid_after_utc', None)
+    return expires or cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+
+
+def generate_key(key_type='ecdsa'):
+    _, _, _, ec, rsa = _crypto()
+    if key_type == 'rsa':
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if key_type == 'ecdsa':
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Unknown key type {key_type!r} (expected one of {', '.join(KEY_TYPES)})")
+
+
+def build_certificate(key, days=DEFAULT_CERT_DAYS):
+    """Self-signed certificate for localhost / 127.0.0.1 / ::1"""
+    x509, hashes, _, _, _ = _crypto()
+    from cryptography.x509.oid import NameOID
+
+    # For a self-signed certificate the subject and issuer are the same
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = _utcnow()
+    san = x509.SubjectAlternativeName(
+        [x509.DNSName(host) for host in HOSTNAMES]
+        + [x509.IPAddress(ipaddress.ip_address(address)) for address in IP_ADDRESSES]
+    )
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        # Allow for clock skew between the server and the browser
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(san, critical=False)
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+
+
+def _write(path, data, mode):
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _load_valid(cert_path, key_path, key_type, renew_days):
+    """The cached certificate if it is usable for at least ``renew_days`` more days, else None"""
+    x509, _, serialization, ec, rsa = _crypto()
+    try:
+        with open(cert_path, 'rb') as f:
+            cert = x509.load_pem_x509_certificate(f.read())
+        with open(key_path, 'rb') as f:
+            key = serialization.load_pem_private_key(f.read(), password=None)
+    except (OSError, ValueError):
+        return None
+
+    expected = ec.EllipticCurvePrivateKey if key_type == 'ecdsa' else rsa.RSAPrivateKey
+    public_format = (serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    if not isinstance(key, expected) or \
+            key.public_key().public_bytes(*public_format) != cert.public_key().public_bytes(*public_format):
+        return None
+    if _expires(cert) - _utcnow() < datetime.timedelta(days=renew_days):
+        return None
+    return cert
+
+
+def load_or_create_certificate(cert_dir=None, key_type=None, days=None, renew_days=None):
+    """``(cert_path, key_path, info)``; the cached pair is reused until it nears expiry"""
+    cert_dir = cert_dir or os.environ.get('TLS_CERT_DIR', DEFAULT_CERT_DIR)
+    key_type = (key_type or os.environ.get('TLS_KEY_TYPE', 'ecdsa')).lower()
+    days = days or int(os.environ.get('TLS_CERT_DAYS', DEFAULT_CERT_DAYS))
+    renew_days = renew_days if renew_days is not None else int(os.environ.get('TLS_RENEW_DAYS',
+                                                                              DEFAULT_RENEW_DAYS))
+    cert_path = os.path.join(cert_dir, CERT_FILE)
+    key_path = os.path.join(cert_dir, KEY_FILE)
+
+    _, hashes, serialization, _, _ = _crypto()
+    cert = _load_valid(cert_path, key_path, key_type, renew_days)
+    created = cert is None
+    if created:
+        os.makedirs(cert_dir, mode=0o700, exist_ok=True)
+        key = generate_key(key_type)
+        cert = build_certificate(key, days)
+        _write(key_path, key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ), 0o600)
+        _write(cert_path, cert.public_bytes(serialization.Encoding.PEM), 0o644)
+
+    info = {
+        'created': created,
+        'key_type': key_type,
+        'expires': _expires(cert).date().isoformat(),
+        'fingerprint': cert.fingerprint(hashes.SHA256()).hex(':'),
+    }
+    return cert_path, key_path, info
+
+
+def server_context(cert_path, key_path):
+    """Server ``SSLContext`` with TLS 1.2+, session tickets and resumption"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(cert_path, key_path)
+    # Stateless resumption: TLS 1.3 tickets, and TLS 1.2 tickets (on unless OP_NO_TICKET)
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = SESSION_TICKETS
+    return context
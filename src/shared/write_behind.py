@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+"""Write-behind queue for AI explanation writes.
+
+``POST /ai-explanation`` used to write to Redis while the client waited. With
+the queue on (``AI_WRITE_BEHIND=1``), the route encodes the entry, queues it
+and answers at once. A background thread flushes queued writes in batches,
+one pipeline per batch (``ExplanationCachePolicy.record_writes``). A batch is
+flushed once ``max_batch`` writes are waiting, or once the oldest write has
+waited ``flush_interval`` seconds.
+
+* Repeated writes of one key are coalesced, and the newest value wins.
+* Reads see queued and in-flight writes (``get``). So a ``GET`` right after a
+  ``POST`` returns the new entry before it reaches Redis.
+* The queue holds at most ``max_pending`` keys. When it is full, ``put``
+  waits up to ``put_timeout`` seconds for room, then raises ``WriteQueueFull``
+  so the caller can answer 503 and the client backs off.
+* A failed batch is retried ``retries`` times and then dropped (and counted).
+* ``clear()`` drops queued and in-flight writes. Every batch belongs to a
+  generation that ``clear()`` bumps, so a batch taken before the clear is
+  neither retried nor served by reads afterwards; ``clear()`` also waits for a
+  batch that is mid-write, so the caller's delete lands after it.
+* ``close()`` flushes everything that is still queued. Servers register it
+  with ``atexit``.
+
+Configuration:
+    AI_WRITE_BEHIND                 1 to queue explanation writes (default off)
+    AI_WRITE_BEHIND_BATCH           writes per pipeline (default 100)
+    AI_WRITE_BEHIND_INTERVAL_MS     longest wait before a flush (default 50)
+    AI_WRITE_BEHIND_MAX_PENDING     queue bound (default 5000)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH = 100
+DEFAULT_INTERVAL = 0.05
+DEFAULT_MAX_PENDING = 5000
+DEFAULT_PUT_TIMEOUT = 1.0
+DEFAULT_RETRIES = 3
+
+
+class WriteQueueFull(Exception):
+    """Raised by ``put`` when the queue stayed full for ``put_timeout`` seconds"""
+
+
+class WriteBehindQueue:
+    """Bounded, coalescing write-behind buffer flushed by one background thread"""
+
+    def __init__(self, flush, max_batch=DEFAULT_BATCH, flush_interval=DEFAULT_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING, put_timeout=DEFAULT_PUT_TIMEOUT, retries=DEFAULT_RETRIES):
+        self.flush_batch = flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.retries = retries
+
+        self._cond = threading.Condition()
+        # key -> (value, queued_at); oldest first
+        self._pending = OrderedDict()
+        # key -> (value, generation) of batches being written
+        self._inflight = {}
+        # Bumped by clear(); batches of older generations are void
+        self._generation = 0
+        # Generations of the batches inside flush_batch right now
+        self._writing = []
+        self._closed = False
+        self._thread = None
+        self.queued = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+        self.discarded = 0
+
+    @classmethod
+    def from_env(cls, flush):
+        if os.environ.get('AI_WRITE_BEHIND', '').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            flush,
+            max_batch=int(os.environ.get('AI_WRITE_BEHIND_BATCH', DEFAULT_BATCH)),
+            flush_interval=float(os.environ.get('AI_WRITE_BEHIND_INTERVAL_MS', DEFAULT_INTERVAL * 1000)) / 1000,
+            max_pending=int(os.environ.get('AI_WRITE_BEHIND_MAX_PENDING', DEFAULT_MAX_PENDING)),
+        )
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+        return self
+
+    def put(self, key, value):
+        """Queue a write; replaces a queued write of the same key"""
+        with self._cond:
+            if self._closed:
+                raise WriteQueueFull('write queue is closed')
+            if key in self._pending:
+                # Keep the original position so coalescing never delays a flush
+                self._pending[key] = (value, self._pending[key][1])
+                self.coalesced += 1
+                return
+            deadline = time.monotonic() + self.put_timeout
+            while len(self._pending) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WriteQueueFull(f'{len(self._pending)} writes already queued')
+                self._cond.wait(remaining)
+            self._pending[key] = (value, time.monotonic())
+            self.queued += 1
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    def _newest(self, key):
+        entry = self._pending.get(key)
+        if entry is not None:
+            return entry[0]
+        entry = self._inflight.get(key)
+        return entry[0] if entry is not None else None
+
+    def get(self, key):
+        """The newest queued or in-flight value for ``key``, or None"""
+        with self._cond:
+            return self._newest(key)
+
+    def get_many(self, keys):
+        """``{key: value}`` for the keys that have a queued or in-flight write"""
+        with self._cond:
+            found = {key: self._newest(key) for key in keys}
+        return {key: value for key, value in found.items() if value is not None}
+
+    def __len__(self):
+        return len(self._pending) + len(self._inflight)
+
+    def _due(self):
+        if not self._pending:
+            return False
+        if self._closed or len(self._pending) >= self.max_batch:
+            return True
+        oldest = next(iter(self._pending.values()))[1]
+        return time.monotonic() - oldest >= self.flush_interval
+
+    def _take_batch(self):
+        batch = []
+        while self._pending and len(batch) < self.max_batch:
+            key, (value, _) = self._pending.popitem(last=False)
+            self._inflight[key] = (value, self._generation)
+            batch.append((key, value))
+        # Room in the queue: wake writers waiting in put()
+        self._cond.notify_all()
+        return self._generation, batch
+
+    def _write(self, generation, batch):
+        for attempt in range(1, self.retries + 1):
+            with self._cond:
+                if generation != self._generation:
+                    # clear() ran since the batch was taken
+                    self.discarded += len(batch)
+                    return
+                self._writing.append(generation)
+            try:
+                self.flush_batch(batch)
+            except Exception as e:
+                self.failed_attempts += 1
+                logger.error(f"🧠 [WRITE-BEHIND] Flush of {len(batch)} writes failed "
+                             f"(attempt {attempt}/{self.retries}): {e}")
+            else:
+                self.flushed += len(batch)
+                self.batches += 1
+                return
+            finally:
+                with self._cond:
+                    self._writing.remove(generation)
+                    self._cond.notify_all()
+            if attempt < self.retries:
+                time.sleep(min(self.flush_interval * 2 ** attempt, 1.0))
+        self.failed_batches += 1
+        self.dropped += len(batch)
+        logger.error(f"🧠 [WRITE-BEHIND] Dropped {len(batch)} writes after {self.retries} attempts")
+
+    def _flush_once(self):
+        with self._cond:
+            generation, batch = self._take_batch()
+        if not batch:
+            return
+        try:
+            self._write(generation, batch)
+        finally:
+            with self._cond:
+                for key, value in batch:
+                    entry = self._inflight.get(key)
+                    if entry is not None and entry[0] is value:
+                        del self._inflight[key]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed and not self._pending:
+                        return
+                    timeout = self.flush_interval
+                    if self._pending:
+                        oldest = next(iter(self._pending.values()))[1]
+                        timeout = max(oldest + self.flush_interval - time.monotonic(), 0.001)
+                    self._cond.wait(timeout)
+            self._flush_once()
+
+    def flush(self):
+        """Write everything queued now, in the caller's thread"""
+        while True:
+            with self._cond:
+                if not self._pending:
+                    return
+            self._flush_once()
+
+    def clear(self, timeout=10.0):
+        """Drop every queued and in-flight write (the cache is being flushed); returns how many
+
+        Waits up to ``timeout`` seconds for a batch that is being written right
+        now, so nothing from before the clear reaches Redis after it returns.
+        """
+        with self._cond:
+            self._generation += 1
+            dropped = len(self._pending) + len(self._inflight)
+            self._pending.clear()
+            self._inflight.clear()
+            self._cond.notify_all()
+            deadline = time.monotonic() + timeout
+            while any(generation < self._generation for generation in self._writing):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return dropped
+
+    def close(self, timeout=10.0):
+        """Stop accepting writes and flush the rest (for shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'in_flight': len(self._inflight),
+            'max_pending': self.max_pending,
+            'queued': self.queued,
+            'coalesced': self.coalesced,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+            'failed_attempts': self.failed_attempts,
+            'dropped': self.dropped,
+            'discarded': self.discarded,
+        }